@@ -4,8 +4,20 @@ import { Link } from "react-router-dom";
 import classes from "./GymItem.module.css";
 import "../../GlobalStyles.css";
 
+// Ширина карточки в каталоге: браузер выбирает из srcset ближайшую копию
+const CARD_IMAGE_SIZES = "(max-width: 600px) 100vw, 320px";
+
 const GymItem = ({ gym }) => {
-  const { id, main_image, name, address, rating, trainers_count } = gym;
+  const {
+    id,
+    main_image,
+    main_image_srcset,
+    main_image_webp_srcset,
+    name,
+    address,
+    rating,
+    trainers_count,
+  } = gym;
 
   return (
     <div className={classes.pro}>
@@ -13,7 +25,18 @@ const GymItem = ({ gym }) => {
         <div className={classes.gym_info_box}>
           <div className={classes.image_box}>
             {main_image ? (
-              <img src={main_image} alt={name} />
+              <picture>
+                {main_image_webp_srcset && (
+                  <source type="image/webp" srcSet={main_image_webp_srcset} sizes={CARD_IMAGE_SIZES} />
+                )}
+                <img
+                  src={main_image}
+                  srcSet={main_image_srcset || undefined}
+                  sizes={CARD_IMAGE_SIZES}
+                  alt={name}
+                  loading="lazy"
+                />
+              </picture>
             ) : (
               <div style={{ width: '100%', height: '100%', background: '#ddd', display: 'flex', alignItems: 'center', justifyContent: 'center' }}>
                 <span>Нет фото</span>
@@ -3,10 +3,15 @@ import { Link } from 'react-router-dom';
 
 import classes from './TrainerItem.module.css'
 
+// Ширина карточки в каталоге: браузер выбирает из srcset ближайшую копию
+const CARD_IMAGE_SIZES = '200px';
+
 const TrainerItem = ({trainer}) => {
   const {
     id,
     image,
+    image_srcset,
+    image_webp_srcset,
     full_name,
     name,
     specialization,
@@ -31,7 +36,18 @@ const TrainerItem = ({trainer}) => {
         <div className={classes.trainer_info_box}>
           <div className={classes.image_box}>
             {image ? (
-              <img src={image} alt={displayName} />
+              <picture>
+                {image_webp_srcset && (
+                  <source type="image/webp" srcSet={image_webp_srcset} sizes={CARD_IMAGE_SIZES} />
+                )}
+                <img
+                  src={image}
+                  srcSet={image_srcset || undefined}
+                  sizes={CARD_IMAGE_SIZES}
+                  alt={displayName}
+                  loading="lazy"
+                />
+              </picture>
             ) : (
               <div style={{ width: '100%', height: '100%', background: '#ddd', display: 'flex', alignItems: 'center', justifyContent: 'center' }}>
                 <span>Нет фото</span>
@@ -1,7 +1,15 @@
+from collections import Counter
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User as DjangoUser
-from .models import UserProfile, Gym, GymImage, Trainer, Record, Review, GymReview
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+from .availability import invalidate_availability
+from .images import image_sources
+from .models import UserProfile, Amenity, Gym, GymImage, Trainer, Record, Review, GymReview, RequestProfile
 
 
 class UserProfileInline(admin.StackedInline):
@@ -72,28 +80,44 @@ class GymImageInline(admin.TabularInline):
     
     def preview(self, obj):
         if obj.image:
-            return f'<img src="{obj.image.url}" style="max-width: 100px; max-height: 100px;" />'
+            src = image_sources(obj.image, obj.variants)['thumbnail'] or obj.image.url
+            return f'<img src="{src}" style="max-width: 100px; max-height: 100px;" />'
         return "Нет изображения"
     preview.short_description = 'Предпросмотр'
     preview.allow_tags = True
 
 
+@admin.register(Amenity)
+class AmenityAdmin(admin.ModelAdmin):
+    """Админка для удобств залов"""
+    list_display = ('id', 'name', 'key')
+    list_display_links = ('id', 'name')
+    search_fields = ('name', 'key')
+    readonly_fields = ('key',)
+    ordering = ('name',)
+
+
 @admin.register(Gym)
 class GymAdmin(admin.ModelAdmin):
     """Админка для спортивных залов"""
-    list_display = ('id', 'name', 'address', 'rating', 'images_count', 'created_at')
+    list_display = ('id', 'name', 'city', 'address', 'rating', 'images_count', 'trainers_count', 'reviews_count', 'created_at')
     list_display_links = ('id', 'name')
     search_fields = ('name', 'address', 'description')
-    list_filter = ('created_at', 'rating')
-    readonly_fields = ('created_at', 'rating')
+    list_filter = ('city', 'created_at', 'rating')
+    readonly_fields = ('created_at', 'city', 'rating', 'reviews_count', 'rating_sum', 'ranking_score', 'trainers_count', 'images_count')
+    filter_horizontal = ('amenities',)
     inlines = [GymImageInline]
     fieldsets = (
         ('Основная информация', {
-            'fields': ('name', 'address')
+            'fields': ('name', 'address', 'city')
         }),
         ('Дополнительная информация', {
             'fields': ('description', 'amenities', 'rating')
         }),
+        ('Счётчики', {
+            'fields': ('reviews_count', 'rating_sum', 'ranking_score', 'trainers_count', 'images_count'),
+            'classes': ('collapse',)
+        }),
         ('Системная информация', {
             'fields': ('created_at',),
             'classes': ('collapse',)
@@ -101,21 +125,17 @@ class GymAdmin(admin.ModelAdmin):
     )
     ordering = ('name',)
     date_hierarchy = 'created_at'
-    
-    def images_count(self, obj):
-        return obj.images.count()
-    images_count.short_description = 'Количество фото'
 
 
 @admin.register(Trainer)
 class TrainerAdmin(admin.ModelAdmin):
     """Админка для тренеров"""
-    list_display = ('id', 'full_name', 'specialization', 'get_gyms', 'created_at')
+    list_display = ('id', 'full_name', 'specialization', 'get_gyms', 'reviews_count', 'created_at')
     list_display_links = ('id', 'full_name')
     search_fields = ('full_name', 'specialization', 'description')
     autocomplete_fields = []
     list_filter = ('specialization', 'gyms', 'created_at')
-    readonly_fields = ('created_at', 'preview_image')
+    readonly_fields = ('created_at', 'preview_image', 'reviews_count', 'rating_sum', 'ranking_score')
     filter_horizontal = ('gyms',)  # Удобный виджет для выбора нескольких залов
     fieldsets = (
         ('Основная информация', {
@@ -125,7 +145,7 @@ class TrainerAdmin(admin.ModelAdmin):
             'fields': ('gyms',)
         }),
         ('Дополнительная информация', {
-            'fields': ('description',)
+            'fields': ('description', 'reviews_count', 'rating_sum', 'ranking_score')
         }),
         ('Системная информация', {
             'fields': ('created_at',),
@@ -141,7 +161,8 @@ class TrainerAdmin(admin.ModelAdmin):
     
     def preview_image(self, obj):
         if obj.image:
-            return f'<img src="{obj.image.url}" style="max-width: 200px; max-height: 200px;" />'
+            src = image_sources(obj.image, obj.image_variants)['thumbnail'] or obj.image.url
+            return f'<img src="{src}" style="max-width: 200px; max-height: 200px;" />'
         return "Нет изображения"
     preview_image.short_description = 'Предпросмотр фото'
     preview_image.allow_tags = True
@@ -173,17 +194,23 @@ class RecordAdmin(admin.ModelAdmin):
     
     @admin.action(description='Подтвердить выбранные записи')
     def mark_as_confirmed(self, request, queryset):
-        updated = queryset.update(status='confirmed')
+        trainer_ids = list(queryset.values_list('trainer_id', flat=True))
+        updated = queryset.update(status='confirmed', updated_at=timezone.now())
+        invalidate_availability(trainer_ids)
         self.message_user(request, f'Подтверждено записей: {updated}')
     
     @admin.action(description='Отменить выбранные записи')
     def mark_as_cancelled(self, request, queryset):
-        updated = queryset.update(status='cancelled')
+        trainer_ids = list(queryset.values_list('trainer_id', flat=True))
+        updated = queryset.update(status='cancelled', updated_at=timezone.now())
+        invalidate_availability(trainer_ids)
         self.message_user(request, f'Отменено записей: {updated}')
     
     @admin.action(description='Отметить как завершенные')
     def mark_as_completed(self, request, queryset):
-        updated = queryset.update(status='completed')
+        trainer_ids = list(queryset.values_list('trainer_id', flat=True))
+        updated = queryset.update(status='completed', updated_at=timezone.now())
+        invalidate_availability(trainer_ids)
         self.message_user(request, f'Завершено записей: {updated}')
 
 
@@ -233,6 +260,78 @@ class GymReviewAdmin(admin.ModelAdmin):
     list_per_page = 25
 
 
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Админка для профилей запросов (fitness.profiling)"""
+    list_display = ('id', 'created_at', 'url_name', 'method', 'status_code', 'duration_ms', 'samples', 'trigger', 'user', 'download_link')
+    list_display_links = ('id', 'created_at')
+    search_fields = ('url_name', 'path', 'user__username')
+    list_filter = ('url_name', 'trigger', 'method', 'created_at')
+    readonly_fields = (
+        'created_at', 'url_name', 'method', 'path', 'status_code', 'user', 'trigger',
+        'duration_ms', 'interval_ms', 'samples', 'download_link', 'hot_functions',
+    )
+    fieldsets = (
+        ('Запрос', {
+            'fields': ('url_name', 'method', 'path', 'status_code', 'user', 'trigger', 'created_at')
+        }),
+        ('Профиль', {
+            'fields': ('duration_ms', 'interval_ms', 'samples', 'download_link', 'hot_functions')
+        }),
+    )
+    ordering = ('-created_at',)
+    date_hierarchy = 'created_at'
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:profile_id>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='fitness_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, profile_id):
+        """Файл профиля (в MEDIA_ROOT его нет - только через админку)"""
+        profile = RequestProfile.objects.filter(pk=profile_id).first()
+        if profile is None or not self.has_view_permission(request, profile) or not profile.file:
+            raise Http404('Профиль не найден')
+        return FileResponse(profile.file.open('rb'), as_attachment=True, filename=profile.file.name.rsplit('/', 1)[-1])
+
+    def download_link(self, obj):
+        url = reverse('admin:fitness_requestprofile_download', args=[obj.pk])
+        return format_html('<a href="{}">скачать .folded</a>', url)
+    download_link.short_description = 'Файл (speedscope.app / flamegraph.pl)'
+
+    def hot_functions(self, obj):
+        """Функции с наибольшим собственным временем (последний кадр стека)"""
+        leaves = Counter()
+        try:
+            with obj.file.open('rb') as profile_file:
+                for line in profile_file.read().decode('utf-8').splitlines():
+                    stack, _, count = line.rpartition(' ')
+                    leaves[stack.rsplit(';', 1)[-1]] += int(count)
+        except (OSError, ValueError):
+            return 'Файл профиля недоступен'
+        total = sum(leaves.values()) or 1
+        return format_html(
+            '<table><tr><th>Выборок</th><th>%</th><th>Функция</th></tr>{}</table>',
+            format_html_join(
+                '',
+                '<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+                ((count, f'{count * 100 / total:.1f}', frame) for frame, count in leaves.most_common(20)),
+            ),
+        )
+    hot_functions.short_description = 'Горячие функции'
+
+
 # Настройка заголовков админки
 admin.site.site_header = "Fitness - Панель администратора"
 admin.site.site_title = "Fitness Admin"
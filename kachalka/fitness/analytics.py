@@ -0,0 +1,227 @@
+"""
+Колоночная выгрузка для аналитики: записи, отзывы на тренеров и отзывы на залы
+в Parquet или Arrow IPC (pyarrow).
+
+Файлы раскладываются по месяцам в стиле Hive, так их читают pandas.read_parquet
+и pyarrow.dataset без дополнительных настроек:
+
+    <root>/records/month=2025-11/part-000000012345.parquet
+
+Месяц определяется по времени тренировки (записи) или дате создания (отзывы)
+в локальном часовом поясе. Выгрузка инкрементальная: в <root>/_state.json
+хранится последний выгруженный id каждого набора, и следующий запуск пишет
+только новые строки в новые файлы, не трогая старые. Строки изменённые после
+выгрузки (отмена записи, правка отзыва) повторно не выгружаются - для полной
+перевыгрузки набора есть режим full.
+
+У записей, кроме status из базы, выгружается effective_status - фактический статус
+на момент выгрузки (Record.with_effective_status): прошедшая тренировка, которую
+фоновая задача ещё не перевела в 'completed', выгружается как completed. Более
+поздние изменения статуса (например, отмена будущей записи) в уже выгруженные
+файлы не попадают.
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from .models import GymReview, Record, Review
+
+
+FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+}
+
+DEFAULT_BATCH_SIZE = 50_000
+
+STATE_FILENAME = '_state.json'
+
+# Набор: (модель, поле для разбиения по месяцам, [(колонка, тип)])
+DATASETS = {
+    'records': (Record, 'datetime', [
+        ('id', 'int64'), ('user_id', 'int64'), ('trainer_id', 'int64'),
+        ('datetime', 'timestamp'), ('ends_at', 'timestamp'), ('status', 'string'),
+        ('effective_status', 'string'), ('created_at', 'timestamp'),
+    ]),
+    'reviews': (Review, 'created_at', [
+        ('id', 'int64'), ('user_id', 'int64'), ('trainer_id', 'int64'), ('rating', 'int8'),
+        ('text', 'string'), ('created_at', 'timestamp'), ('updated_at', 'timestamp'),
+    ]),
+    'gym_reviews': (GymReview, 'created_at', [
+        ('id', 'int64'), ('user_id', 'int64'), ('gym_id', 'int64'), ('rating', 'int8'),
+        ('text', 'string'), ('created_at', 'timestamp'), ('updated_at', 'timestamp'),
+    ]),
+}
+
+
+def _pyarrow():
+    """Модули pyarrow (необязательная зависимость, нужна только для этой выгрузки)"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImproperlyConfigured('Для выгрузки в Parquet/Arrow установите pyarrow: pip install pyarrow') from e
+    return pyarrow
+
+
+def schema(dataset):
+    pa = _pyarrow()
+    types = {
+        'int64': pa.int64(),
+        'int8': pa.int8(),
+        'string': pa.string(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in DATASETS[dataset][2]])
+
+
+def _queryset(dataset):
+    """Все строки набора с аннотациями, которые входят в колонки"""
+    model = DATASETS[dataset][0]
+    if model is Record:
+        return Record.with_effective_status(Record.objects.all())
+    return model.objects.all()
+
+
+def _month(value):
+    return timezone.localtime(value).strftime('%Y-%m')
+
+
+def _month_range(month):
+    """(начало месяца, начало следующего) в локальном часовом поясе для 'ГГГГ-ММ'"""
+    start = datetime.strptime(month, '%Y-%m')
+    following = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return timezone.make_aware(start), timezone.make_aware(following)
+
+
+def _table(dataset, rows):
+    pa = _pyarrow()
+    dataset_schema = schema(dataset)
+    columns = list(zip(*rows)) if rows else [[] for _ in dataset_schema]
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, dataset_schema)],
+        schema=dataset_schema,
+    )
+
+
+def _batches(dataset, queryset, batch_size):
+    """Пачки строк из базы: [(месяц, [строки])], по одной пачке в памяти"""
+    _, partition_field, columns = DATASETS[dataset]
+    names = [name for name, _ in columns]
+    partition_index = names.index(partition_field)
+    batch = {}
+    count = 0
+    for row in queryset.values_list(*names).iterator(chunk_size=min(batch_size, 10_000)):
+        batch.setdefault(_month(row[partition_index]), []).append(row)
+        count += 1
+        if count >= batch_size:
+            yield batch
+            batch = {}
+            count = 0
+    if batch:
+        yield batch
+
+
+def _open_writer(sink, dataset_schema, file_format):
+    pa = _pyarrow()
+    if file_format == 'parquet':
+        return pa.parquet.ParquetWriter(sink, dataset_schema, compression='zstd')
+    return pa.ipc.new_file(sink, dataset_schema)
+
+
+# ==================== Инкрементальная выгрузка в каталог ====================
+
+def _read_state(root):
+    path = os.path.join(root, STATE_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as state_file:
+        return json.load(state_file)
+
+
+def _write_state(root, state):
+    path = os.path.join(root, STATE_FILENAME)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file, indent=2)
+    os.replace(f'{path}.tmp', path)
+
+
+def export_dataset(root, dataset, file_format='parquet', batch_size=DEFAULT_BATCH_SIZE, full=False):
+    """
+    Дописать в root/<dataset>/month=ГГГГ-ММ/ строки с id больше выгруженного в прошлый раз.
+    full=True - удалить ранее выгруженные файлы набора и выгрузить всё заново.
+    Возвращает (количество строк, количество файлов).
+    """
+    extension = FORMATS[file_format][0]
+    dataset_root = os.path.join(root, dataset)
+    state = _read_state(root)
+    if full:
+        shutil.rmtree(dataset_root, ignore_errors=True)
+        state.pop(dataset, None)
+    last_id = state.get(dataset, {}).get('last_id', 0)
+
+    queryset = _queryset(dataset).filter(id__gt=last_id).order_by('id')
+    dataset_schema = schema(dataset)
+    # Файлы пишутся под временными именами и переименовываются только после
+    # успешного завершения, чтобы прерванный запуск не оставил частичных данных
+    writers = {}
+    rows_count = 0
+    max_id = last_id
+    try:
+        for batch in _batches(dataset, queryset, batch_size):
+            for month, rows in batch.items():
+                if month not in writers:
+                    directory = os.path.join(dataset_root, f'month={month}')
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f'part-{last_id + 1:012d}{extension}')
+                    writers[month] = (path, _open_writer(f'{path}.tmp', dataset_schema, file_format))
+                writers[month][1].write_table(_table(dataset, rows))
+                rows_count += len(rows)
+                max_id = max(max_id, rows[-1][0])
+    finally:
+        for _, writer in writers.values():
+            writer.close()
+
+    for path, _ in writers.values():
+        os.replace(f'{path}.tmp', path)
+    # Без новых строк каталоги наборов не создавались, а состояние записать нужно
+    os.makedirs(root, exist_ok=True)
+    state[dataset] = {
+        'last_id': max_id,
+        'format': file_format,
+        'exported_at': timezone.now().isoformat(),
+    }
+    _write_state(root, state)
+    return rows_count, len(writers)
+
+
+# ==================== Выгрузка одного месяца в файл ====================
+
+def month_file(dataset, month, path, file_format='parquet'):
+    """
+    Записать один месяц набора в файл path (для скачивания через API)
+    Пачки пишутся сразу в файл, в памяти держится одна пачка. Возвращает количество строк.
+    """
+    partition_field = DATASETS[dataset][1]
+    start, end = _month_range(month)
+    queryset = _queryset(dataset).filter(**{
+        f'{partition_field}__gte': start,
+        f'{partition_field}__lt': end,
+    }).order_by('id')
+
+    dataset_schema = schema(dataset)
+    writer = _open_writer(path, dataset_schema, file_format)
+    rows_count = 0
+    try:
+        for batch in _batches(dataset, queryset, DEFAULT_BATCH_SIZE):
+            for rows in batch.values():
+                writer.write_table(_table(dataset, rows))
+                rows_count += len(rows)
+    finally:
+        writer.close()
+    return rows_count
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class FitnessConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "fitness"
+
+    def ready(self):
+        # Подключаем сигналы версионированного кэша каталога, поискового индекса, слотов
+        # и создания уменьшенных копий фото
+        from . import availability, cache, images, search  # noqa: F401
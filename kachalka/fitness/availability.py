@@ -0,0 +1,162 @@
+"""
+Свободные слоты тренеров.
+
+День тренера хранится как битовая маска занятых слотов расписания (бит i - слот
+SLOT_TIMES[i]). Маски строятся одним запросом по записям за весь диапазон дат и
+кэшируются по дням; ключ кэша включает версию тренера, которую сигналы Record
+увеличивают при каждой записи и отмене. Поэтому ответ на запрос слотов стоит
+O(количество слотов) и не требует передавать клиенту сырые записи.
+"""
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+from .models import Record
+
+
+# Сетка расписания (локальное время) и длительность одного слота
+SLOT_TIMES = (
+    dt_time(9, 0), dt_time(10, 30), dt_time(12, 0), dt_time(13, 30), dt_time(15, 0),
+    dt_time(16, 30), dt_time(18, 0), dt_time(19, 30), dt_time(21, 0),
+)
+SLOT_DURATION = Record.DURATION
+
+# Максимальная длина запрашиваемого диапазона дат
+MAX_RANGE_DAYS = 31
+
+
+CACHE_TIMEOUT = 24 * 60 * 60
+VERSION_KEY_PREFIX = 'fitness:availability:version:'
+DAY_KEY_PREFIX = 'fitness:availability:day:'
+
+_SLOT_TIME_SET = frozenset(SLOT_TIMES)
+
+
+def is_slot_start(value):
+    """Время value (aware datetime) совпадает с началом слота расписания"""
+    local = timezone.localtime(value)
+    return local.second == 0 and local.microsecond == 0 and local.time() in _SLOT_TIME_SET
+
+
+def slot_labels():
+    """Слоты расписания в виде строк 'ЧЧ:ММ'"""
+    return [slot.strftime('%H:%M') for slot in SLOT_TIMES]
+
+
+def _slot_starts(day):
+    return [timezone.make_aware(datetime.combine(day, slot)) for slot in SLOT_TIMES]
+
+
+# ==================== Версии и кэш ====================
+
+def _version(trainer_id):
+    key = f'{VERSION_KEY_PREFIX}{trainer_id}'
+    version = cache.get(key)
+    if version is None:
+        # Начальная версия от времени, чтобы не совпасть с версией до вытеснения ключа
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_availability(trainer_ids):
+    """Сбросить закэшированные слоты тренеров (после записи, отмены или массового обновления)"""
+    for trainer_id in set(trainer_ids):
+        key = f'{VERSION_KEY_PREFIX}{trainer_id}'
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def _day_key(trainer_id, version, day):
+    return f'{DAY_KEY_PREFIX}{trainer_id}:{version}:{day.isoformat()}'
+
+
+# ==================== Битовые маски ====================
+
+def _busy_mask(starts, bookings):
+    """Маска слотов дня, пересекающихся с интервалами [начало записи, начало + SLOT_DURATION)"""
+    mask = 0
+    for booked in bookings:
+        first = bisect_right(starts, booked - SLOT_DURATION)
+        last = bisect_left(starts, booked + SLOT_DURATION)
+        for index in range(first, last):
+            mask |= 1 << index
+    return mask
+
+
+def _build_masks(trainer_id, days):
+    """Маски занятости для списка дней одним запросом к записям"""
+    if not days:
+        return {}
+    range_start = _slot_starts(days[0])[0] - SLOT_DURATION
+    range_end = _slot_starts(days[-1])[-1] + SLOT_DURATION
+    bookings_by_day = {}
+    for booked in Record.objects.filter(
+        trainer_id=trainer_id,
+        status__in=Record.ACTIVE_STATUSES,
+        datetime__gt=range_start,
+        datetime__lt=range_end,
+    ).order_by().values_list('datetime', flat=True):
+        bookings_by_day.setdefault(timezone.localtime(booked).date(), []).append(booked)
+
+    return {
+        day: _busy_mask(_slot_starts(day), bookings_by_day.get(day, ()))
+        for day in days
+    }
+
+
+def busy_masks(trainer_id, date_from, date_to):
+    """{дата: маска занятых слотов} за диапазон дат включительно"""
+    days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+    version = _version(trainer_id)
+    keys = {day: _day_key(trainer_id, version, day) for day in days}
+    cached = cache.get_many(keys.values())
+
+    masks = {day: cached[key] for day, key in keys.items() if key in cached}
+    missing = [day for day in days if day not in masks]
+    if missing:
+        # Один запрос на всю полосу незакэшированных дней
+        built = _build_masks(trainer_id, missing)
+        cache.set_many({keys[day]: mask for day, mask in built.items()}, CACHE_TIMEOUT)
+        masks.update(built)
+    return masks
+
+
+def free_slots(trainer_id, date_from, date_to, now=None):
+    """
+    Свободные слоты тренера по дням: [{'date': 'ГГГГ-ММ-ДД', 'slots': ['09:00', ...]}]
+    Прошедшие слоты свободными не считаются.
+    """
+    now = now or timezone.now()
+    labels = slot_labels()
+    days = []
+    for day, mask in sorted(busy_masks(trainer_id, date_from, date_to).items()):
+        starts = _slot_starts(day)
+        days.append({
+            'date': day.isoformat(),
+            'slots': [
+                labels[index] for index, start in enumerate(starts)
+                if not mask & (1 << index) and start > now
+            ],
+        })
+    return days
+
+
+# ==================== Сигналы ====================
+
+def _record_changed(sender, instance, **kwargs):
+    trainer_ids = [instance.trainer_id]
+    old_trainer_id = instance.loaded_value('trainer_id')
+    if old_trainer_id is not None:
+        trainer_ids.append(old_trainer_id)
+    invalidate_availability(trainer_ids)
+
+
+post_save.connect(_record_changed, sender=Record, dispatch_uid='availability_record_saved')
+post_delete.connect(_record_changed, sender=Record, dispatch_uid='availability_record_deleted')
@@ -0,0 +1,157 @@
+"""
+Бронирование слотов тренера при высокой конкуренции.
+
+Когда открываются слоты популярного тренера, много пользователей одновременно
+бронируют одни и те же слоты. Режимы (settings.BOOKING_LOCK_MODE):
+
+- 'slot' (по умолчанию, режим можно передать и в book_slots): неблокирующие advisory-блокировки PostgreSQL на каждый
+  слот (pg_try_advisory_xact_lock). Проигравший сразу получает «слот уже занят»
+  и не ждёт в очереди, а бронирования разных слотов одного тренера идут параллельно.
+- 'trainer': блокировка строки тренера SELECT ... FOR UPDATE NOWAIT. Бронирования
+  тренера не идут параллельно, но и не ждут в очереди: если тренер уже заблокирован
+  другой транзакцией, book_slots сразу выбрасывает TrainerBusy (view отвечает 409).
+
+Блокировки есть только в PostgreSQL. В других СУБД (SQLite в разработке) оба режима
+работают без блокировок: SQLite и так выполняет пишущие транзакции по одной.
+
+В обоих режимах корректность гарантирует база: частичный уникальный индекс
+(trainer, datetime) WHERE status = 'scheduled' и ограничения на пересечение
+интервалов. Если гонку всё же выиграл другой запрос, bulk_create получает
+IntegrityError, который view превращает в ответ 409.
+"""
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+
+from .availability import invalidate_availability
+from .models import Record, Trainer
+
+
+LOCK_MODES = ('slot', 'trainer')
+
+# SQLSTATE lock_not_available: строку держит другая транзакция (FOR UPDATE NOWAIT)
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+class TrainerBusy(Exception):
+    """Режим 'trainer': тренера прямо сейчас бронирует другая транзакция"""
+
+
+def _lock_mode(lock_mode=None):
+    if lock_mode is not None:
+        if lock_mode not in LOCK_MODES:
+            raise ValueError(f'Неизвестный режим блокировок: {lock_mode}')
+        return lock_mode
+    mode = getattr(settings, 'BOOKING_LOCK_MODE', 'slot')
+    return mode if mode in LOCK_MODES else 'slot'
+
+
+def _lock_not_available(error):
+    """Ошибка БД - именно «блокировка занята», а не таймаут, разрыв соединения и т.п."""
+    cause = error.__cause__
+    # psycopg 3 - sqlstate, psycopg2 - pgcode
+    code = getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+    return code == LOCK_NOT_AVAILABLE
+
+
+def _slot_lock_key(slot_datetime):
+    """Ключ advisory-блокировки слота: минуты от начала эпохи (помещается в int4)"""
+    return int(slot_datetime.timestamp() // 60) % (2 ** 31)
+
+
+def _try_lock_slots(trainer_id, slots, using):
+    """
+    Захватить advisory-блокировки слотов до конца транзакции, не ожидая.
+    Возвращает множество слотов, которые держит другая транзакция.
+    Вне PostgreSQL блокировок нет - все слоты считаются захваченными.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql' or not slots:
+        return set()
+    keys = [_slot_lock_key(slot) for slot in slots]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT key, pg_try_advisory_xact_lock(%s, key) '
+            'FROM unnest(%s::integer[]) AS key',
+            [trainer_id, keys],
+        )
+        locked = dict(cursor.fetchall())
+    return {slot for slot, key in zip(slots, keys) if not locked[key]}
+
+
+def book_slots(user_profile, trainer_id, requested, using='default', lock_mode=None):
+    """
+    Забронировать слоты тренера для пользователя одной транзакцией.
+    requested - {aware datetime начала слота: исходная строка для сообщений}
+    lock_mode - 'slot' или 'trainer' (по умолчанию settings.BOOKING_LOCK_MODE).
+    Возвращает (trainer, созданные записи, ошибки по слотам); trainer = None, если его нет.
+    В режиме 'trainer' выбрасывает TrainerBusy, если тренер заблокирован другим бронированием.
+    """
+    errors = []
+    mode = _lock_mode(lock_mode)
+    with transaction.atomic(using=using):
+        trainers = Trainer.objects.using(using).prefetch_related('gyms')
+        if mode == 'trainer':
+            # Блокируем тренера без ожидания: проигравший сразу получает отказ, а не стоит в очереди
+            trainers = trainers.select_for_update(nowait=True)
+        try:
+            trainer = trainers.filter(id=trainer_id).first()
+        except DatabaseError as e:
+            # Остальные ошибки (statement_timeout, разрыв соединения) - не «тренер занят»
+            if mode != 'trainer' or not _lock_not_available(e):
+                raise
+            raise TrainerBusy(trainer_id) from e
+        if trainer is None:
+            return None, [], errors
+
+        slots = sorted(requested)
+        if mode == 'slot':
+            # Слоты, которые прямо сейчас бронирует кто-то другой, сразу отдаём как занятые
+            busy = _try_lock_slots(trainer.id, slots, using)
+            for slot_datetime in slots:
+                if slot_datetime in busy:
+                    errors.append(f'Слот уже занят: {requested[slot_datetime]}')
+            slots = [slot_datetime for slot_datetime in slots if slot_datetime not in busy]
+
+        # Пересечения для всей пачки одним запросом: записи тренера и пользователя
+        # в интервале от первого до последнего слота
+        conflicts = []
+        if slots:
+            conflicts = list(
+                Record.overlapping(slots[0], slots[-1] + Record.DURATION)
+                .using(using)
+                .filter(Q(trainer=trainer) | Q(user=user_profile))
+                .values_list('datetime', 'ends_at', 'trainer_id', 'user_id')
+            )
+
+        new_records = []
+        for slot_datetime in slots:
+            slot_datetime_str = requested[slot_datetime]
+            slot_end = slot_datetime + Record.DURATION
+            overlaps = [
+                (other_trainer_id, other_user_id)
+                for start, end, other_trainer_id, other_user_id in conflicts
+                if start < slot_end and end > slot_datetime
+            ]
+            if (trainer.id, user_profile.id) in overlaps:
+                errors.append(f'Вы уже записаны на это время: {slot_datetime_str}')
+            elif any(other_trainer_id == trainer.id for other_trainer_id, _ in overlaps):
+                errors.append(f'Слот уже занят: {slot_datetime_str}')
+            elif overlaps:
+                errors.append(f'У вас уже есть тренировка в это время: {slot_datetime_str}')
+            else:
+                new_records.append(Record(
+                    user=user_profile,
+                    trainer=trainer,
+                    datetime=slot_datetime,
+                    ends_at=slot_end,
+                    status='scheduled'
+                ))
+
+        if new_records:
+            # Пересечения запрещены и на уровне БД (уникальный индекс, exclusion constraint / триггеры)
+            Record.objects.using(using).bulk_create(new_records)
+            # bulk_create не отправляет post_save - сбрасываем кэш слотов вручную
+            transaction.on_commit(lambda: invalidate_availability([trainer.id]), using=using)
+
+    return trainer, new_records, errors
@@ -0,0 +1,161 @@
+"""
+Версионированный кэш ответов каталога (залы, тренеры, справочники).
+
+Для каждой модели в кэше хранится номер версии. Сигналы post_save/post_delete/
+m2m_changed увеличивают версию изменённой модели, а ключ закэшированного ответа
+включает версии всех моделей, от которых зависит view. Поэтому после любой правки
+старые ответы просто перестают находиться - явно удалять их не нужно.
+
+В production несколько воркеров должны использовать общий кэш (Redis/Memcached),
+иначе версии будут расходиться между процессами; LocMemCache подходит для разработки.
+"""
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.http import HttpResponse
+
+from .models import Amenity, Gym, GymImage, Trainer, Review, GymReview
+
+
+VERSION_KEY_PREFIX = 'fitness:version:'
+RESPONSE_KEY_PREFIX = 'fitness:response:'
+
+
+# ==================== Версии моделей ====================
+
+def _version_key(model):
+    return f'{VERSION_KEY_PREFIX}{model._meta.label_lower}'
+
+
+def _initial_version():
+    # Начальная версия от времени: если ключ версии вытеснен из кэша,
+    # новая версия не совпадёт ни с одной из тех, что уже есть в ключах ответов
+    return time.time_ns()
+
+
+def get_versions(models):
+    """Текущие версии моделей (одним запросом к кэшу)"""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    """Увеличить версию модели, сделав устаревшими все зависящие от неё ответы"""
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), None)
+
+
+# ==================== Нормализация параметров запроса ====================
+
+def text_param(value):
+    """Текстовый фильтр без учёта регистра (icontains)"""
+    return value.strip().casefold()
+
+
+def csv_param(value):
+    """Список через запятую: порядок и повторы не важны"""
+    return ','.join(sorted({item.strip().casefold() for item in value.split(',') if item.strip()}))
+
+
+def exact_param(value):
+    """Параметр, значение которого важно как есть (order_by, cursor, id)"""
+    return value.strip()
+
+
+def _response_key(view_name, request, params, models, view_kwargs):
+    normalized = {}
+    for name, normalize in params.items():
+        value = request.GET.get(name)
+        if value is None:
+            continue
+        value = normalize(value)
+        if value != '':
+            normalized[name] = value
+
+    payload = json.dumps(
+        [view_name, sorted(view_kwargs.items()), sorted(normalized.items()), get_versions(models)],
+        ensure_ascii=False,
+        default=str,
+    )
+    return RESPONSE_KEY_PREFIX + hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+# ==================== Декоратор для views ====================
+
+def cached_response(depends_on, params=None):
+    """
+    Кэширует успешные GET-ответы view.
+    depends_on - модели, изменение которых делает ответ устаревшим
+    params - {имя параметра GET: функция нормализации}; остальные параметры игнорируются
+    """
+    params = params or {}
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or not getattr(settings, 'CATALOG_CACHE_ENABLED', True):
+                return view(request, *args, **kwargs)
+
+            key = _response_key(view.__name__, request, params, depends_on, kwargs)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(
+                    key,
+                    (response.content, response['Content-Type']),
+                    getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300),
+                )
+            return response
+        return wrapper
+    return decorator
+
+
+# ==================== Сигналы ====================
+
+def _bump_sender_version(sender, **kwargs):
+    bump_version(sender)
+
+
+def _bump_trainer_gyms_version(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(Trainer)
+        bump_version(Gym)
+
+
+def _bump_gym_amenities_version(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(Gym)
+        bump_version(Amenity)
+
+
+for _model in (Amenity, Gym, Trainer, GymImage, Review, GymReview):
+    post_save.connect(_bump_sender_version, sender=_model, dispatch_uid=f'cache_version_save_{_model.__name__}')
+    post_delete.connect(_bump_sender_version, sender=_model, dispatch_uid=f'cache_version_delete_{_model.__name__}')
+
+m2m_changed.connect(
+    _bump_trainer_gyms_version,
+    sender=Trainer.gyms.through,
+    dispatch_uid='cache_version_trainer_gyms',
+)
+m2m_changed.connect(
+    _bump_gym_amenities_version,
+    sender=Gym.amenities.through,
+    dispatch_uid='cache_version_gym_amenities',
+)
@@ -0,0 +1,139 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для карточек зала и тренера.
+
+Версия ответа вычисляется одним лёгким запросом по служебным полям
+(updated_at, счётчики, границы окна бронирований) - без сериализации
+и без загрузки отзывов и записей. Если клиент прислал совпадающий
+If-None-Match, декоратор django.views.decorators.http.condition
+отвечает 304 ещё до запуска view.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Gym, GymImage, GymReview, Trainer, Review, Record
+
+
+# Окно забронированных слотов, которое отдаёт карточка тренера
+BOOKED_SLOTS_WINDOW = timedelta(days=30)
+
+
+def _related_aggregate(queryset, link_field, aggregate):
+    """Коррелированный подзапрос: агрегат по строкам, связанным с внешним объектом"""
+    return Subquery(
+        queryset.filter(**{link_field: OuterRef('pk')})
+        .order_by()
+        .values(link_field)
+        .annotate(value=aggregate)
+        .values('value')[:1]
+    )
+
+
+def _cached_metadata(request, key, loader):
+    """Метаданные считаются один раз на запрос, хотя нужны и для ETag, и для Last-Modified"""
+    cache = request.__dict__.setdefault('_conditional_metadata', {})
+    if key not in cache:
+        cache[key] = loader()
+    return cache[key]
+
+
+def _etag(prefix, metadata):
+    raw = repr(sorted(metadata.items()))
+    return f'{prefix}-' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+# ==================== Зал ====================
+
+def _gym_metadata(gym_id):
+    return (
+        Gym.objects.filter(pk=gym_id)
+        .annotate(
+            trainers_updated=_related_aggregate(Trainer.objects.all(), 'gyms', Max('updated_at')),
+            reviews_updated=_related_aggregate(GymReview.objects.all(), 'gym', Max('updated_at')),
+            images_created=_related_aggregate(GymImage.objects.all(), 'gym', Max('created_at')),
+        )
+        .values(
+            'updated_at', 'reviews_count', 'trainers_count', 'images_count',
+            'trainers_updated', 'reviews_updated', 'images_created',
+        )
+        .first()
+    )
+
+
+def gym_detail_etag(request, gym_id):
+    """ETag карточки зала (None, если зала нет - тогда view вернёт 404)"""
+    metadata = _cached_metadata(request, ('gym', gym_id), lambda: _gym_metadata(gym_id))
+    return _etag('gym', metadata) if metadata else None
+
+
+def gym_detail_last_modified(request, gym_id):
+    """Время последнего изменения данных карточки зала"""
+    metadata = _cached_metadata(request, ('gym', gym_id), lambda: _gym_metadata(gym_id))
+    if not metadata:
+        return None
+    return _latest(
+        metadata['updated_at'], metadata['trainers_updated'],
+        metadata['reviews_updated'], metadata['images_created'],
+    )
+
+
+# ==================== Тренер ====================
+
+def _trainer_metadata(trainer_id):
+    now = timezone.now()
+    window_end = now + BOOKED_SLOTS_WINDOW
+    scheduled = Record.objects.filter(status='scheduled')
+
+    metadata = (
+        Trainer.objects.filter(pk=trainer_id)
+        .annotate(
+            gyms_updated=_related_aggregate(Gym.objects.all(), 'trainers', Max('updated_at')),
+            reviews_updated=_related_aggregate(Review.objects.all(), 'trainer', Max('updated_at')),
+            # Ответ содержит только слоты окна: изменения записей вне него не учитываем
+            # (индекс trainer, datetime), уход слотов из окна - в last_left_slot
+            records_updated=_related_aggregate(
+                Record.objects.filter(datetime__gte=now, datetime__lte=window_end), 'trainer', Max('updated_at')
+            ),
+            slots_count=_related_aggregate(
+                scheduled.filter(datetime__gte=now, datetime__lte=window_end), 'trainer', Count('id')
+            ),
+            # Слоты покидают окно с течением времени: запоминаем последний ушедший
+            # и последний вошедший, чтобы версия менялась и без записи в базу
+            last_left_slot=_related_aggregate(scheduled.filter(datetime__lt=now), 'trainer', Max('datetime')),
+            last_entered_slot=_related_aggregate(
+                scheduled.filter(datetime__lte=window_end), 'trainer', Max('datetime')
+            ),
+        )
+        .values(
+            'updated_at', 'reviews_count', 'gyms_updated', 'reviews_updated',
+            'records_updated', 'slots_count', 'last_left_slot', 'last_entered_slot',
+        )
+        .first()
+    )
+    return metadata
+
+
+def trainer_detail_etag(request, trainer_id):
+    """ETag карточки тренера (None, если тренера нет - тогда view вернёт 404)"""
+    metadata = _cached_metadata(request, ('trainer', trainer_id), lambda: _trainer_metadata(trainer_id))
+    return _etag('trainer', metadata) if metadata else None
+
+
+def trainer_detail_last_modified(request, trainer_id):
+    """Время последнего изменения данных карточки тренера, включая сдвиг окна слотов"""
+    metadata = _cached_metadata(request, ('trainer', trainer_id), lambda: _trainer_metadata(trainer_id))
+    if not metadata:
+        return None
+    last_entered = metadata['last_entered_slot']
+    return _latest(
+        metadata['updated_at'], metadata['gyms_updated'], metadata['reviews_updated'],
+        metadata['records_updated'], metadata['last_left_slot'],
+        last_entered - BOOKED_SLOTS_WINDOW if last_entered else None,
+    )
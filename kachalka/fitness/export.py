@@ -0,0 +1,81 @@
+"""
+Потоковая выгрузка записей на тренировки в NDJSON или CSV.
+
+Записи читаются через QuerySet.iterator(chunk_size) - на PostgreSQL это серверный
+курсор, связи (пользователь, тренер, залы тренера) догружаются для каждой пачки.
+Строки сериализуются по одной и отдаются генератором, поэтому память не зависит
+от объёма выгрузки. Используется view records_export и командой export_records.
+"""
+import csv
+import json
+
+from .models import Record
+from .serializers import serialize_record, with_relations
+
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Колонки CSV - поля serialize_record
+CSV_FIELDS = (
+    'id', 'user_id', 'user_name', 'user_email', 'trainer_id', 'trainer_name',
+    'trainer_specialization', 'gym_name', 'datetime', 'status', 'status_display', 'created_at',
+)
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Сколько строк склеивать в один кусок ответа (меньше мелких записей в сокет)
+LINES_PER_CHUNK = 500
+
+
+def export_queryset(filter_form):
+    """Записи для выгрузки с фильтрами валидной RecordFilterForm, по времени тренировки"""
+    records = with_relations(Record.with_effective_status(Record.objects.all()), serialize_record)
+    return filter_form.filter_queryset(records).order_by('datetime', 'id')
+
+
+def iter_records(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Сериализованные записи по одной; в памяти не больше chunk_size объектов"""
+    for record in queryset.iterator(chunk_size=chunk_size):
+        yield serialize_record(record)
+
+
+class _Echo:
+    """Файлоподобный объект для csv.writer: writerow возвращает строку, а не пишет её"""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in CSV_FIELDS])
+
+
+def _batched(lines, size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def export_lines(queryset, export_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Генератор кусков текста выгрузки в формате export_format ('ndjson' или 'csv')"""
+    rows = iter_records(queryset, chunk_size)
+    lines = csv_lines(rows) if export_format == 'csv' else ndjson_lines(rows)
+    return _batched(lines, LINES_PER_CHUNK)
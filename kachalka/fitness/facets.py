@@ -0,0 +1,91 @@
+"""
+Фасеты для фильтров каталога: количество залов и тренеров по каждому значению фильтра.
+
+Все счётчики считаются в базе фиксированным числом GROUP BY запросов, независимо
+от количества залов и тренеров. Фасет одиночного выбора (город, зал) считается
+без собственного фильтра, чтобы клиент видел, сколько даст переключение на другое
+значение; удобства комбинируются по И, поэтому их счётчик учитывает все фильтры.
+"""
+from django.db.models import Count
+
+from .forms import GymFilterForm, TrainerFilterForm
+from .models import Gym, Trainer
+
+
+GYM_FILTER_PARAMS = ('search', 'city', 'amenities')
+TRAINER_FILTER_PARAMS = ('gym', 'specialization')
+
+
+def _filtered(form_class, model, params, exclude=()):
+    """queryset модели с фильтрами формы, кроме перечисленных в exclude"""
+    data = {name: value for name, value in params.items() if name not in exclude}
+    queryset = model.objects.all()
+    form = form_class(data)
+    if form.is_valid():
+        queryset = form.filter_queryset(queryset)
+    return queryset.order_by()
+
+
+def _has_filters(params, names):
+    return any((params.get(name) or '').strip() for name in names)
+
+
+def _counts(queryset, field, label='name'):
+    """[{label: значение, 'count': n}] по убыванию количества"""
+    rows = (
+        queryset.order_by()
+        .values(field)
+        .annotate(count=Count('pk', distinct=True))
+        .order_by('-count', field)
+    )
+    return [{label: row[field], 'count': row['count']} for row in rows]
+
+
+def build_facets(params):
+    """
+    Счётчики по городам, удобствам, специализациям и залам для текущих фильтров.
+    params - словарь GET-параметров (фильтры залов и тренеров)
+    """
+    gym_params = {name: params.get(name, '') for name in GYM_FILTER_PARAMS}
+    trainer_params = {name: params.get(name, '') for name in TRAINER_FILTER_PARAMS}
+
+    gyms = _filtered(GymFilterForm, Gym, gym_params)
+    gyms_without_city = _filtered(GymFilterForm, Gym, gym_params, exclude=('city',))
+
+    # Тренеры ограничиваются отфильтрованными залами, только если фильтры залов заданы
+    trainers = Trainer.objects.all()
+    if _has_filters(gym_params, GYM_FILTER_PARAMS):
+        trainers = trainers.filter(gyms__in=gyms.values('pk'))
+    trainers_form = TrainerFilterForm(trainer_params)
+    trainers_without_gym = _filtered(
+        TrainerFilterForm, Trainer, trainer_params, exclude=('gym',)
+    ).filter(pk__in=trainers.values('pk'))
+    trainers_without_specialization = _filtered(
+        TrainerFilterForm, Trainer, trainer_params, exclude=('specialization',)
+    ).filter(pk__in=trainers.values('pk'))
+    if trainers_form.is_valid():
+        trainers = trainers_form.filter_queryset(trainers)
+
+    gym_links = Trainer.gyms.through.objects.filter(
+        gym__in=gyms.values('pk'),
+        trainer__in=trainers_without_gym.values('pk'),
+    )
+
+    return {
+        'gyms_count': gyms.count(),
+        'trainers_count': trainers.order_by().values('pk').distinct().count(),
+        'cities': _counts(gyms_without_city.exclude(city=''), 'city'),
+        'amenities': _counts(
+            Gym.amenities.through.objects.filter(gym__in=gyms.values('pk')),
+            'amenity__name',
+        ),
+        'specializations': _counts(trainers_without_specialization, 'specialization'),
+        'gyms': [
+            {'id': row['gym_id'], 'name': row['gym__name'], 'count': row['count']}
+            for row in (
+                gym_links.values('gym_id', 'gym__name')
+                .annotate(count=Count('trainer_id', distinct=True))
+                .order_by('-count', 'gym__name')
+            )
+        ],
+    }
@@ -0,0 +1,215 @@
+"""
+Раздача статики, ассетов фронта и загруженных файлов (замена django.views.static.serve).
+
+- Кэширование: файлы с хэшем содержимого в имени (ассеты Vite в /assets/, статика
+  после collectstatic с ManifestStaticFilesStorage) отдаются с
+  Cache-Control: public, max-age=31536000, immutable; остальные - с коротким
+  max-age (settings.FILES_MAX_AGE) и ETag/Last-Modified для ответов 304.
+- Предварительно сжатые копии: если рядом с файлом лежит <имя>.br или <имя>.gz
+  (команда compress_static) и клиент их принимает, отдаётся копия с Content-Encoding.
+- Range: один диапазон bytes=... отдаётся как 206 (видео, докачка), с учётом If-Range.
+- Отдача через веб-сервер: settings.FILES_OFFLOAD = 'x-accel-redirect' (nginx, внутренний
+  location FILES_ACCEL_PREFIX<имя точки монтирования>/) или 'x-sendfile' (Apache, lighttpd).
+  Тогда Python только проверяет путь и выставляет заголовки, а байты и Range отдаёт
+  веб-сервер. Без offload полный ответ идёт через FileResponse (wsgi.file_wrapper/sendfile).
+
+Пример для nginx (точки монтирования: assets, static, media, root):
+
+    location /internal/static/ {
+        internal;
+        alias /app/kachalka/staticfiles/;
+    }
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Имя после ManifestStaticFilesStorage: style.3f2a9c0b1d4e.css
+MANIFEST_HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+# Расширение копии: Content-Encoding (в порядке предпочтения)
+PRECOMPRESSED = (('.br', 'br'), ('.gz', 'gzip'))
+
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _select_representation(request, fullpath, source_stat):
+    """(путь к файлу, его stat, Content-Encoding или None, есть ли сжатые копии)"""
+    accepted = _accepted_encodings(request)
+    has_variants = False
+    for suffix, encoding in PRECOMPRESSED:
+        try:
+            variant_stat = os.stat(fullpath + suffix)
+        except OSError:
+            continue
+        # Копия старше оригинала (файл обновили без compress_static) не используется
+        if variant_stat.st_mtime < source_stat.st_mtime:
+            continue
+        has_variants = True
+        if encoding in accepted:
+            return fullpath + suffix, variant_stat, encoding, True
+    return fullpath, source_stat, None, has_variants
+
+
+def _parse_range(header, size):
+    """(начало, конец включительно) для одного диапазона; None - отдать файл целиком; ValueError - 416"""
+    match = RANGE_HEADER.match(header.replace(' ', ''))
+    if not match:
+        # Несколько диапазонов или другие единицы - по RFC 9110 можно отдать весь файл
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end or int(end) == 0:
+            raise ValueError(header)
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/"')):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        while length > 0:
+            block = stream.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _offload(response, path, document_root, location):
+    """Передать отдачу файла веб-серверу (settings.FILES_OFFLOAD); False, если offload выключен"""
+    mode = getattr(settings, 'FILES_OFFLOAD', '')
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'FILES_ACCEL_PREFIX', '/internal/')
+        relative = os.path.relpath(path, document_root).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = f'{prefix}{location}/{relative}'
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        return False
+    return True
+
+
+def serve(request, path, document_root, location, immutable=False):
+    """
+    Отдать файл path из document_root
+    location - имя точки монтирования (assets, static, media) для X-Accel-Redirect;
+    immutable - все файлы каталога имеют хэш в имени (True) или 'manifest' -
+    только имена вида name.<12 hex>.ext.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        fullpath = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Файл не найден')
+    try:
+        source_stat = os.stat(fullpath)
+    except OSError:
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(source_stat.st_mode):
+        raise Http404('Файл не найден')
+
+    content_type, _ = mimetypes.guess_type(fullpath)
+    filepath, file_stat, encoding, has_variants = _select_representation(request, fullpath, source_stat)
+    size = file_stat.st_size
+    last_modified = int(file_stat.st_mtime)
+    etag = quote_etag(f'{file_stat.st_mtime_ns:x}-{size:x}' + (f'-{encoding}' if encoding else ''))
+
+    if immutable is True or (immutable == 'manifest' and MANIFEST_HASHED_NAME.search(path)):
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        cache_control = f'public, max-age={getattr(settings, "FILES_MAX_AGE", 3600)}'
+
+    headers = {
+        'Cache-Control': cache_control,
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+    }
+    if has_variants:
+        headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        for name in ('Cache-Control', 'ETag', 'Last-Modified', 'Vary'):
+            if name in headers:
+                not_modified.setdefault(name, headers[name])
+        return not_modified
+
+    content_type = content_type or 'application/octet-stream'
+    response = HttpResponse(content_type=content_type)
+    if _offload(response, filepath, document_root, location):
+        # Байты, Content-Length и Range - забота веб-сервера
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416, content_type=content_type)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _read_range(filepath, start, length) if request.method == 'GET' else [],
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(length)
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        response = FileResponse(open(filepath, 'rb'), content_type=content_type)
+        # FileResponse добавляет inline-имя файла (для сжатой копии - с .br/.gz)
+        del response['Content-Disposition']
+
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -3,11 +3,14 @@ Django формы для валидации и обработки бизнес-
 Используем ModelForm для работы с моделями
 """
 from django import forms
+from django.db.models import Count
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.contrib.auth.models import User as DjangoUser
-from .models import Gym, Trainer, UserProfile, Record, Review, GymReview
+from .models import Amenity, Gym, Trainer, UserProfile, Record, Review, GymReview
+from .availability import is_slot_start, slot_labels
+from .search import search_queryset
 import re
 
 
@@ -37,24 +40,27 @@ class GymFilterForm(forms.Form):
 
         data = self.cleaned_data
 
-        # Поиск по названию или адресу
-        if data.get('search'):
-            from django.db.models import Q
-            search = data['search'].strip()
-            queryset = queryset.filter(
-                Q(name__icontains=search) | Q(address__icontains=search)
-            )
+        # Полнотекстовый поиск по названию и адресу (добавляет аннотацию search_rank)
+        if data.get('search', '').strip():
+            queryset = search_queryset(queryset, data['search'])
 
-        # Фильтр по городу
-        if data.get('city'):
-            city = data['city'].strip()
-            queryset = queryset.filter(address__icontains=city)
+        # Фильтр по городу (точное совпадение по индексированному полю)
+        if data.get('city', '').strip():
+            queryset = queryset.filter(city=' '.join(data['city'].split()))
 
-        # Фильтр по удобствам
+        # Фильтр по удобствам: залы, у которых есть все перечисленные удобства
         if data.get('amenities'):
-            amenities_list = [a.strip() for a in data['amenities'].split(',') if a.strip()]
-            for amenity in amenities_list:
-                queryset = queryset.filter(amenities__icontains=amenity)
+            keys = {Amenity.normalize(name) for name in Amenity.parse(data['amenities'])}
+            if keys:
+                matching_gyms = (
+                    Gym.amenities.through.objects
+                    .filter(amenity__key__in=keys)
+                    .values('gym_id')
+                    .annotate(matched=Count('amenity_id'))
+                    .filter(matched=len(keys))
+                    .values('gym_id')
+                )
+                queryset = queryset.filter(pk__in=matching_gyms)
 
         return queryset
 
@@ -91,10 +97,9 @@ class TrainerFilterForm(forms.Form):
 
         data = self.cleaned_data
 
-        # Поиск по имени
-        if data.get('search'):
-            search = data['search'].strip()
-            queryset = queryset.filter(full_name__icontains=search)
+        # Полнотекстовый поиск по имени и специализации (добавляет аннотацию search_rank)
+        if data.get('search', '').strip():
+            queryset = search_queryset(queryset, data['search'])
 
         # Фильтр по залу
         if data.get('gym'):
@@ -212,9 +217,9 @@ class RecordFilterForm(forms.Form):
         if data.get('trainer'):
             queryset = queryset.filter(trainer_id=data['trainer'])
 
-        # Фильтр по статусу
+        # Фильтр по фактическому статусу (закончившиеся назначенные считаются завершёнными)
         if data.get('status'):
-            queryset = queryset.filter(status=data['status'])
+            queryset = queryset.filter(Record.effective_status_filter(data['status']))
 
         # Фильтр по диапазону дат
         if data.get('date_from'):
@@ -247,11 +252,7 @@ class GymForm(forms.ModelForm):
                 'placeholder': 'Описание зала...',
                 'class': 'form-control'
             }),
-            'amenities': forms.Textarea(attrs={
-                'rows': 3,
-                'placeholder': 'Удобства (через запятую или с новой строки)',
-                'class': 'form-control'
-            })
+            'amenities': forms.CheckboxSelectMultiple()
         }
         labels = {
             'name': 'Название',
@@ -460,13 +461,11 @@ class ReviewCreateForm(forms.ModelForm):
         return text
     
     def save(self, commit=True):
-        """Сохранение отзыва с обновлением рейтинга тренера"""
+        """Сохранение отзыва (рейтинг тренера обновляется сигналом за O(1))"""
         review = super().save(commit=False)
         
         if commit:
             review.save()
-            # Обновляем средний рейтинг тренера
-            review.trainer.update_rating()
         
         return review
 
@@ -500,10 +499,11 @@ class RecordCreateForm(forms.ModelForm):
         if datetime_value > max_future_date:
             raise ValidationError('Нельзя записаться на тренировку более чем на 3 месяца вперед')
 
-        # Проверка рабочих часов (с 8:00 до 21:00)
-        hour = datetime_value.hour
-        if hour < 8 or hour >= 21:
-            raise ValidationError('Тренировки доступны только с 8:00 до 21:00')
+        # Проверка, что время совпадает с началом слота расписания
+        if not is_slot_start(datetime_value):
+            raise ValidationError(
+                'Тренировки начинаются только в слоты расписания: ' + ', '.join(slot_labels())
+            )
 
         return datetime_value
 
@@ -515,34 +515,16 @@ class RecordCreateForm(forms.ModelForm):
         user = cleaned_data.get('user')
 
         if trainer and datetime_value:
-            # Проверяем, нет ли уже записи у этого тренера в это время
-            # Считаем, что одна тренировка длится 1 час
-            time_start = datetime_value
-            time_end = datetime_value + timedelta(hours=1)
-
-            conflicting_records = Record.objects.filter(
-                trainer=trainer,
-                datetime__gte=time_start - timedelta(hours=1),
-                datetime__lt=time_end,
-                status__in=['pending', 'confirmed']  # Учитываем только активные записи
-            )
-
-            if conflicting_records.exists():
+            # Проверяем, нет ли у тренера тренировки, пересекающейся с этой
+            if Record.overlapping(datetime_value).filter(trainer=trainer).exists():
                 raise ValidationError(
                     f'Тренер {trainer.full_name} уже занят в это время. '
                     'Пожалуйста, выберите другое время.'
                 )
 
         if user and datetime_value:
-            # Проверяем, нет ли у пользователя уже записи в это время
-            user_conflicting_records = Record.objects.filter(
-                user=user,
-                datetime__gte=datetime_value - timedelta(hours=1),
-                datetime__lt=datetime_value + timedelta(hours=1),
-                status__in=['pending', 'confirmed']
-            )
-
-            if user_conflicting_records.exists():
+            # Проверяем, нет ли у пользователя другой тренировки в это время
+            if Record.overlapping(datetime_value).filter(user=user).exists():
                 raise ValidationError(
                     'У вас уже есть запись на тренировку в это время. '
                     'Пожалуйста, выберите другое время.'
@@ -551,9 +533,9 @@ class RecordCreateForm(forms.ModelForm):
         return cleaned_data
 
     def save(self, commit=True):
-        """Сохранение записи со статусом 'pending'"""
+        """Сохранение записи со статусом 'scheduled'"""
         record = super().save(commit=False)
-        record.status = 'pending'  # По умолчанию новая запись ожидает подтверждения
+        record.status = 'scheduled'
         
         if commit:
             record.save()
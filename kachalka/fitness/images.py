@@ -0,0 +1,231 @@
+"""
+Уменьшенные копии фото залов и тренеров для srcset.
+
+Для каждого загруженного изображения (GymImage.image, Trainer.image) создаются копии
+шириной до SIZES (thumb/medium/large) в WebP и в запасном формате для браузеров без
+WebP: JPEG, а для изображений с прозрачностью PNG. Копии крупнее оригинала не
+создаются - самая крупная копия имеет ширину оригинала. Файлы лежат рядом с ним:
+
+    gyms/derivatives/<имя оригинала>/<размер>.<расширение>
+
+поэтому один и тот же исходник (например, фото тренера по умолчанию) обрабатывается
+один раз. Размеры оригинала и список копий сохраняются в модели, а в сериализаторы
+попадают готовые строки srcset (см. image_sources).
+
+Обработка запускается после коммита транзакции в пуле потоков на settings.IMAGE_WORKERS
+(Pillow отпускает GIL при декодировании, масштабировании и кодировании); пока она
+не закончилась, отдаётся только оригинал. Для уже загруженных фото есть команда
+generate_image_derivatives. Как и оригиналы, копии при удалении записи не удаляются.
+"""
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_version
+from .models import Gym, GymImage, Trainer
+
+
+logger = logging.getLogger('fitness.images')
+
+# Размер: максимальная ширина в пикселях (по возрастанию)
+SIZES = {
+    'thumb': 320,
+    'medium': 768,
+    'large': 1600,
+}
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+# Модель: (поле изображения, поле ширины, поле высоты, поле копий)
+IMAGE_FIELDS = {
+    GymImage: ('image', 'width', 'height', 'variants'),
+    Trainer: ('image', 'image_width', 'image_height', 'image_variants'),
+}
+
+
+# ==================== Создание копий ====================
+
+def derivative_name(source_name, size, extension):
+    directory, filename = posixpath.split(source_name)
+    return posixpath.join(directory, 'derivatives', filename, f'{size}.{extension}')
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _encode(image, extension):
+    buffer = io.BytesIO()
+    if extension == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif extension == 'jpg':
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _save(storage, name, content, overwrite):
+    if storage.exists(name):
+        if not overwrite:
+            return name
+        storage.delete(name)
+    return storage.save(name, ContentFile(content))
+
+
+def build_variants(field_file, overwrite=False):
+    """
+    Создать копии изображения field_file во всех размерах и форматах
+    Возвращает (ширина, высота, variants), где variants = {
+        'source': имя оригинала,
+        'fallback': 'jpg' или 'png',
+        'webp': [{'size', 'name', 'width', 'height'}, ...],
+        'fallback_files': [...],
+    }; уже существующие файлы копий переиспользуются, если не задан overwrite.
+    """
+    storage = field_file.storage
+    with storage.open(field_file.name, 'rb') as source:
+        with Image.open(source) as opened:
+            original = ImageOps.exif_transpose(opened)
+            original.load()
+
+    width, height = original.size
+    alpha = _has_alpha(original)
+    fallback = 'png' if alpha else 'jpg'
+    original = original.convert('RGBA' if alpha else 'RGB')
+
+    variants = {'source': field_file.name, 'fallback': fallback, 'webp': [], 'fallback_files': []}
+    for size, max_width in SIZES.items():
+        if max_width < width:
+            image = original.copy()
+            image.thumbnail((max_width, height), Image.LANCZOS, reducing_gap=3.0)
+        else:
+            image = original
+        for extension, key in (('webp', 'webp'), (fallback, 'fallback_files')):
+            name = _save(storage, derivative_name(field_file.name, size, extension), _encode(image, extension), overwrite)
+            variants[key].append({'size': size, 'name': name, 'width': image.width, 'height': image.height})
+        if max_width >= width:
+            break
+    return width, height, variants
+
+
+def generate(model, pk, overwrite=False):
+    """Создать копии для изображения объекта и сохранить их в модель; True, если сохранены"""
+    image_field, width_field, height_field, variants_field = IMAGE_FIELDS[model]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return False
+    field_file = getattr(instance, image_field)
+    if not field_file:
+        return False
+
+    width, height, variants = build_variants(field_file, overwrite)
+    values = {width_field: width, height_field: height, variants_field: variants}
+    if model is Trainer:
+        values['updated_at'] = timezone.now()
+    # Если изображение успели заменить, копии старого не записываем
+    updated = model.objects.filter(pk=pk, **{image_field: field_file.name}).update(**values)
+    if not updated:
+        return False
+
+    if model is GymImage:
+        # Главное изображение зала копирует variants первого фото
+        Gym.refresh_counters([instance.gym_id])
+        bump_version(Gym)
+    bump_version(model)
+    return True
+
+
+# ==================== Пул обработчиков ====================
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_WORKERS', 2),
+                thread_name_prefix='fitness-images',
+            )
+        return _executor
+
+
+def _run(model, pk):
+    try:
+        generate(model, pk)
+    except Exception:
+        logger.exception('Не удалось создать копии изображения %s #%s', model.__name__, pk)
+
+
+def _run_in_pool(model, pk):
+    try:
+        _run(model, pk)
+    finally:
+        # Соединение потока пула не закрывается обработкой запроса
+        connection.close()
+
+
+def schedule(model, pk):
+    """Создать копии после коммита текущей транзакции: в пуле или сразу (IMAGE_DERIVATIVES_ASYNC)"""
+    if getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        transaction.on_commit(lambda: _pool().submit(_run_in_pool, model, pk))
+    else:
+        transaction.on_commit(lambda: _run(model, pk))
+
+
+def needs_variants(instance):
+    """Изображение объекта изменилось с момента создания копий"""
+    image_field, _, _, variants_field = IMAGE_FIELDS[type(instance)]
+    field_file = getattr(instance, image_field)
+    source = (getattr(instance, variants_field) or {}).get('source')
+    return bool(field_file) and source != field_file.name
+
+
+def _image_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    image_field, width_field, height_field, variants_field = IMAGE_FIELDS[sender]
+    if raw or (update_fields is not None and image_field not in update_fields):
+        return
+    if needs_variants(instance):
+        schedule(sender, instance.pk)
+    elif not getattr(instance, image_field) and getattr(instance, variants_field):
+        # Фото убрали - забываем копии
+        sender.objects.filter(pk=instance.pk).update(**{width_field: None, height_field: None, variants_field: {}})
+
+
+for _model in IMAGE_FIELDS:
+    post_save.connect(_image_saved, sender=_model, dispatch_uid=f'image_derivatives_{_model.__name__}')
+
+
+# ==================== Сериализация ====================
+
+def _srcset(storage, files):
+    return ', '.join(f'{storage.url(item["name"])} {item["width"]}w' for item in files)
+
+
+def image_sources(field_file, variants):
+    """
+    srcset копий изображения для <picture>/<img srcset> (без запросов к базе):
+    {'srcset': запасной формат, 'webp_srcset': WebP, 'thumbnail': URL самой маленькой копии}.
+    Пока копий нет (или они от другого файла), значения None.
+    """
+    if not field_file or not variants or variants.get('source') != field_file.name:
+        return {'srcset': None, 'webp_srcset': None, 'thumbnail': None}
+    storage = field_file.storage
+    return {
+        'srcset': _srcset(storage, variants['fallback_files']),
+        'webp_srcset': _srcset(storage, variants['webp']),
+        'thumbnail': storage.url(variants['fallback_files'][0]['name']),
+    }
@@ -0,0 +1,247 @@
+"""
+Django management команда: микробенчмарки горячих путей на чистом Python.
+
+Замеряет сериализаторы (serialize_gym, serialize_trainer, serialize_record),
+построение запросов формами фильтрации (*FilterForm.filter_queryset) и валидацию
+RecordCreateForm на данных из текущей базы (SQLite или локальный PostgreSQL;
+размер набора задаётся populate_db --preset). Для каждого бенчмарка выводятся
+время на операцию (минимум из нескольких повторов) и число SQL-запросов на операцию.
+
+Результаты можно сохранить как базовые и сравнивать с ними следующие запуски:
+команда завершается с ошибкой, если время выросло больше порога или запросов стало больше.
+Базовые результаты хранятся отдельно для каждой СУБД и для DEBUG (при DEBUG = True
+Django журналирует SQL-запросы, и время с запросами к базе не сравнимо с production).
+
+Использование:
+    python manage.py benchmark --save-baseline
+    python manage.py benchmark --threshold 0.2
+    python manage.py benchmark --only serialize_record --repeat 10
+"""
+import gc
+import json
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from fitness.availability import SLOT_TIMES
+from fitness.forms import GymFilterForm, RecordCreateForm, RecordFilterForm, TrainerFilterForm
+from fitness.models import Gym, Record, Trainer, UserProfile
+from fitness.serializers import serialize_gym, serialize_record, serialize_trainer, with_relations
+
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmark_baseline.json'
+
+
+def _compile(queryset):
+    """Собрать SQL без выполнения запроса (стоимость построения queryset)"""
+    return str(queryset.query)
+
+
+class Command(BaseCommand):
+    help = 'Микробенчмарки сериализаторов, форм фильтрации и валидации записи с контролем регрессий'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--gyms', type=int, default=100, help='Сколько залов сериализовать (по умолчанию: 100)')
+        parser.add_argument('--trainers', type=int, default=300, help='Сколько тренеров сериализовать (по умолчанию: 300)')
+        parser.add_argument('--records', type=int, default=1000, help='Сколько записей сериализовать (по умолчанию: 1000)')
+        parser.add_argument('--forms', type=int, default=200, help='Сколько раз строить форму за повтор (по умолчанию: 200)')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество повторов, берётся лучший (по умолчанию: 5)')
+        parser.add_argument('--only', nargs='+', help='Запустить только перечисленные бенчмарки')
+        parser.add_argument(
+            '--baseline',
+            default=str(DEFAULT_BASELINE),
+            help=f'Файл базовых результатов (по умолчанию: {DEFAULT_BASELINE.name} в корне проекта)'
+        )
+        parser.add_argument('--save-baseline', action='store_true', help='Сохранить результаты как базовые')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Допустимое замедление относительно базовых результатов (0.25 = +25%%)'
+        )
+
+    # ==================== Данные ====================
+
+    def _fixtures(self, options):
+        """Загрузить объекты со связями заранее: сериализаторы не должны ходить в базу"""
+        gyms = list(with_relations(Gym.objects.order_by('id'), serialize_gym)[:options['gyms']])
+        trainers = list(with_relations(Trainer.objects.order_by('id'), serialize_trainer)[:options['trainers']])
+        records = list(with_relations(Record.objects.order_by('id'), serialize_record)[:options['records']])
+        if not (gyms and trainers and records):
+            raise CommandError('В базе нет залов, тренеров или записей - сначала выполните populate_db')
+
+        profile = UserProfile.objects.order_by('id').first()
+        busy = Record.objects.filter(user=profile).values_list('datetime', flat=True)
+        slot_datetime = self._free_slot(set(busy))
+        return {
+            'gyms': gyms,
+            'trainers': trainers,
+            'records': records,
+            'gym': gyms[0],
+            'trainer': trainers[0],
+            'profile': profile,
+            'slot': slot_datetime,
+        }
+
+    @staticmethod
+    def _free_slot(busy):
+        """Ближайший будущий слот расписания, не занятый пользователем (для валидной формы)"""
+        day = timezone.localdate() + timedelta(days=1)
+        for offset in range(60):
+            for slot in SLOT_TIMES:
+                value = timezone.make_aware(datetime.combine(day + timedelta(days=offset), slot))
+                if value not in busy:
+                    return value
+        raise CommandError('Не найден свободный слот для RecordCreateForm')
+
+    # ==================== Бенчмарки ====================
+
+    def _benchmarks(self, data, forms_count):
+        """{имя: (функция одного повтора, количество операций в повторе)}"""
+        gym = data['gym']
+        trainer = data['trainer']
+        gym_filters = {
+            'city': gym.city,
+            'amenities': ','.join(amenity.key for amenity in gym.amenities.all()[:2]),
+        }
+        trainer_filters = {'gym': str(gym.id), 'specialization': trainer.specialization}
+        record_filters = {
+            'user': str(data['profile'].id),
+            'trainer': str(trainer.id),
+            'status': 'completed',
+            'date_from': '2020-01-01T00:00',
+            'date_to': '2030-01-01T00:00',
+        }
+        record_form = {
+            'user': str(data['profile'].id),
+            'trainer': str(trainer.id),
+            'datetime': timezone.localtime(data['slot']).strftime('%Y-%m-%dT%H:%M'),
+        }
+
+        def serialize_all(serializer_func, objects):
+            def run():
+                for obj in objects:
+                    serializer_func(obj)
+            return run, len(objects)
+
+        def forms(build):
+            def run():
+                for _ in range(forms_count):
+                    build()
+            return run, forms_count
+
+        def gym_filter():
+            _compile(GymFilterForm(gym_filters).filter_queryset(Gym.objects.all()))
+
+        def trainer_filter():
+            _compile(TrainerFilterForm(trainer_filters).filter_queryset(Trainer.objects.all()))
+
+        def record_filter():
+            _compile(RecordFilterForm(record_filters).filter_queryset(Record.objects.all()))
+
+        def record_create():
+            form = RecordCreateForm(record_form)
+            if not form.is_valid():
+                raise CommandError(f'RecordCreateForm не прошла валидацию: {form.errors.as_json()}')
+
+        return {
+            'serialize_gym': serialize_all(serialize_gym, data['gyms']),
+            'serialize_trainer': serialize_all(serialize_trainer, data['trainers']),
+            'serialize_record': serialize_all(serialize_record, data['records']),
+            'gym_filter_form': forms(gym_filter),
+            'trainer_filter_form': forms(trainer_filter),
+            'record_filter_form': forms(record_filter),
+            'record_create_form': forms(record_create),
+        }
+
+    @staticmethod
+    def _measure(run, operations, repeat):
+        """(мкс на операцию - лучший из повторов, SQL-запросов на операцию)"""
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            run()  # прогрев, заодно считаем запросы
+        timings = []
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return min(timings) / operations * 1e6, len(queries) / operations
+
+    # ==================== Запуск ====================
+
+    def handle(self, *args, **options):
+        data = self._fixtures(options)
+        benchmarks = self._benchmarks(data, max(1, options['forms']))
+        if options['only']:
+            unknown = set(options['only']) - set(benchmarks)
+            if unknown:
+                raise CommandError(f'Неизвестные бенчмарки: {", ".join(sorted(unknown))}. Доступны: {", ".join(benchmarks)}')
+            benchmarks = {name: benchmarks[name] for name in options['only']}
+
+        baseline_path = Path(options['baseline'])
+        stored = json.loads(baseline_path.read_text(encoding='utf-8')) if baseline_path.exists() else {}
+        baseline_key = f'{connection.vendor}-debug' if settings.DEBUG else connection.vendor
+        baseline = stored.get(baseline_key, {})
+
+        self.stdout.write(
+            f'БД {connection.vendor}: залов {len(data["gyms"])}, тренеров {len(data["trainers"])}, '
+            f'записей {len(data["records"])}, повторов {options["repeat"]}\n'
+        )
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING(
+                'DEBUG = True: время включает журнал SQL-запросов, сравнение идёт с базой '
+                f'{baseline_key}. Для цифр как в production запускайте с DEBUG=False.\n'
+            ))
+        self.stdout.write(f'{"Бенчмарк":<22} {"мкс/оп":>10} {"запр/оп":>8} {"база":>10} {"изм.":>8}')
+
+        results = {}
+        regressions = []
+        for name, (run, operations) in benchmarks.items():
+            per_op, queries = self._measure(run, operations, max(1, options['repeat']))
+            results[name] = {'us_per_op': round(per_op, 3), 'queries_per_op': round(queries, 3)}
+
+            line = f'{name:<22} {per_op:>10.2f} {queries:>8.2f}'
+            base = baseline.get(name)
+            if base:
+                change = per_op / base['us_per_op'] - 1 if base['us_per_op'] else 0.0
+                line += f' {base["us_per_op"]:>10.2f} {change:>+7.0%}'
+                if change > options['threshold']:
+                    regressions.append(f'{name}: {base["us_per_op"]:.2f} → {per_op:.2f} мкс/оп ({change:+.0%})')
+                    line = self.style.ERROR(line)
+                if queries > base['queries_per_op']:
+                    regressions.append(f'{name}: запросов {base["queries_per_op"]} → {queries:.2f} на операцию')
+                    line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+        if options['save_baseline']:
+            stored[baseline_key] = {**baseline, **results}
+            baseline_path.write_text(json.dumps(stored, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f'\n✓ Базовые результаты сохранены в {baseline_path}'))
+            return
+
+        if not baseline:
+            self.stdout.write(self.style.WARNING(
+                f'\nБазовых результатов для {baseline_key} нет - запустите с --save-baseline'
+            ))
+        elif regressions:
+            raise CommandError(
+                f'Регрессии производительности (порог {options["threshold"]:+.0%}):\n  ' + '\n  '.join(regressions)
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✓ Регрессий нет'))
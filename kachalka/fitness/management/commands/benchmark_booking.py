@@ -0,0 +1,147 @@
+"""
+Django management команда: нагрузочный тест бронирования слотов одного популярного тренера.
+
+Несколько потоков (каждый - отдельный пользователь и отдельное соединение с БД)
+одновременно пытаются забронировать все слоты одного дня в случайном порядке.
+Команда выводит пропускную способность, задержки и число двойных бронирований
+(должно быть 0). Созданные записи удаляются после теста.
+
+Использование:
+    python manage.py benchmark_booking --users 20 --mode slot
+    python manage.py benchmark_booking --trainer 3 --date 2025-12-20 --mode trainer
+"""
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.models import Count
+from django.utils import timezone
+
+from fitness.availability import SLOT_TIMES
+from fitness.booking import LOCK_MODES, TrainerBusy, book_slots
+from fitness.models import Record, Trainer, UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест бронирования: много пользователей одновременно бронируют слоты одного тренера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trainer', type=int, help='ID тренера (по умолчанию первый)')
+        parser.add_argument('--users', type=int, default=20, help='Количество одновременных пользователей')
+        parser.add_argument(
+            '--date',
+            help='День бронирования ГГГГ-ММ-ДД (по умолчанию через 29 дней)'
+        )
+        parser.add_argument(
+            '--mode',
+            choices=LOCK_MODES,
+            default='slot',
+            help='Режим блокировок fitness.booking (slot - по слотам, trainer - строка тренера; оба без ожидания)'
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Seed для порядка слотов')
+
+    def handle(self, *args, **options):
+        trainers = Trainer.objects.order_by('id')
+        trainer = trainers.filter(id=options['trainer']).first() if options['trainer'] else trainers.first()
+        if trainer is None:
+            raise CommandError('Тренер не найден - сначала выполните populate_db')
+
+        profiles = list(UserProfile.objects.order_by('id')[:options['users']])
+        if len(profiles) < options['users']:
+            raise CommandError(f'Нужно {options["users"]} пользователей, в базе {len(profiles)}')
+
+        if options['date']:
+            day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+        else:
+            day = timezone.localdate() + timedelta(days=29)
+        slots = [timezone.make_aware(datetime.combine(day, slot)) for slot in SLOT_TIMES]
+        already_taken = Record.objects.filter(
+            trainer=trainer, datetime__in=slots, status__in=Record.ACTIVE_STATUSES
+        ).count()
+
+        rng = random.Random(options['seed'])
+        orders = [rng.sample(slots, len(slots)) for _ in profiles]
+        results = []
+        results_lock = threading.Lock()
+        barrier = threading.Barrier(len(profiles))
+
+        def worker(profile, order):
+            local = []
+            try:
+                barrier.wait()
+                for slot_datetime in order:
+                    started = time.perf_counter()
+                    try:
+                        _, created, errors = book_slots(
+                            profile, trainer.id, {slot_datetime: slot_datetime.isoformat()}, lock_mode=options['mode']
+                        )
+                        outcome = 'created' if created else ('taken' if errors else 'other')
+                        created_ids = [record.id for record in created]
+                    except TrainerBusy:
+                        outcome, created_ids = 'busy', []
+                    except IntegrityError:
+                        outcome, created_ids = 'integrity', []
+                    except DatabaseError:
+                        outcome, created_ids = 'db_error', []
+                    local.append((outcome, time.perf_counter() - started, created_ids))
+            finally:
+                connection.close()
+                with results_lock:
+                    results.extend(local)
+
+        self.stdout.write(
+            f'Тренер: {trainer.full_name} (ID {trainer.id}), день {day}, '
+            f'слотов {len(slots)} (уже занято {already_taken}), '
+            f'пользователей {len(profiles)}, режим {options["mode"]}, БД {connection.vendor}'
+        )
+
+        threads = [threading.Thread(target=worker, args=(profile, order)) for profile, order in zip(profiles, orders)]
+        wall_started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_started
+
+        created_ids = [record_id for _, _, ids in results for record_id in ids]
+        double_booked = (
+            Record.objects.filter(trainer=trainer, datetime__in=slots, status__in=Record.ACTIVE_STATUSES)
+            .values('datetime')
+            .annotate(count=Count('id'))
+            .filter(count__gt=1)
+            .count()
+        )
+        Record.objects.filter(id__in=created_ids).delete()
+
+        outcomes = {}
+        for outcome, _, _ in results:
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        latencies = sorted(duration * 1000 for _, duration, _ in results)
+
+        self.stdout.write(f'\nПопыток: {len(results)} за {wall:.3f} с ({len(results) / wall:.1f} попыток/с)')
+        self.stdout.write(f'  Забронировано:            {outcomes.get("created", 0)}')
+        self.stdout.write(f'  «Слот уже занят» сразу:   {outcomes.get("taken", 0)}')
+        self.stdout.write(f'  Тренер занят (NOWAIT):    {outcomes.get("busy", 0)}')
+        self.stdout.write(f'  Отказ БД (IntegrityError): {outcomes.get("integrity", 0)}')
+        self.stdout.write(f'  Прочие ошибки БД:         {outcomes.get("db_error", 0)}')
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f'Задержка, мс: p50 {statistics.median(latencies):.1f}, '
+                f'p95 {p95:.1f}, max {latencies[-1]:.1f}'
+            )
+
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite допускает одного писателя: advisory-блокировок нет, а параллельные '
+                'транзакции получают "database is locked". Для реальных цифр запускайте на PostgreSQL.'
+            ))
+
+        if double_booked:
+            self.stdout.write(self.style.ERROR(f'✗ Двойных бронирований: {double_booked}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Двойных бронирований нет'))
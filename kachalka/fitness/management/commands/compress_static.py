@@ -0,0 +1,99 @@
+"""
+Django management команда для создания предварительно сжатых копий статики (.gz и .br).
+
+fitness.files отдаёт <файл>.br или <файл>.gz вместо <файл>, если клиент их принимает,
+поэтому сжатие выполняется один раз при деплое, а не на каждый запрос. Сжимаются
+текстовые файлы (COMPRESSIBLE_EXTENSIONS) от MIN_SIZE байт; копия не сохраняется,
+если экономит меньше 5%. Уже сжатые и не изменившиеся с тех пор файлы пропускаются.
+Для .br нужен пакет brotli (без него создаются только .gz).
+
+Использование:
+    python manage.py collectstatic --noinput && python manage.py compress_static
+    python manage.py compress_static fitness/static --force
+"""
+import gzip
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.html', '.svg', '.txt', '.xml', '.ico', '.wasm',
+}
+MIN_SIZE = 1024
+MIN_SAVING = 0.05
+
+
+def _compressors():
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.insert(0, ('.br', lambda data: brotli.compress(data, quality=11)))
+    return compressors
+
+
+class Command(BaseCommand):
+    help = 'Создать предварительно сжатые копии (.br, .gz) статических файлов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directories',
+            nargs='*',
+            help='Каталоги (по умолчанию: STATIC_ROOT, если он собран, и ассеты фронта)'
+        )
+        parser.add_argument('--force', action='store_true', help='Пересоздать копии, даже если они свежее файлов')
+
+    def handle(self, *args, **options):
+        directories = options['directories'] or [
+            directory for directory in (settings.STATIC_ROOT, *settings.STATICFILES_DIRS)
+            if os.path.isdir(directory)
+        ]
+        if not directories:
+            raise CommandError('Нет каталогов для сжатия: запустите collectstatic или укажите каталог')
+        if brotli is None:
+            self.stderr.write(self.style.WARNING('Пакет brotli не установлен - создаются только .gz копии'))
+
+        compressors = _compressors()
+        created = skipped = 0
+        for directory in directories:
+            for root, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    if os.path.splitext(filename)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                        continue
+                    path = os.path.join(root, filename)
+                    result = self._compress(path, compressors, options['force'])
+                    created += result
+                    skipped += len(compressors) - result
+        self.stdout.write(self.style.SUCCESS(f'✓ Сжатых копий создано: {created}, пропущено: {skipped}'))
+
+    @staticmethod
+    def _compress(path, compressors, force):
+        """Создать копии одного файла; возвращает количество записанных копий"""
+        source_stat = os.stat(path)
+        if source_stat.st_size < MIN_SIZE:
+            return 0
+        data = None
+        written = 0
+        for suffix, compress in compressors:
+            target = path + suffix
+            if not force and os.path.exists(target) and os.stat(target).st_mtime >= source_stat.st_mtime:
+                continue
+            if data is None:
+                with open(path, 'rb') as source:
+                    data = source.read()
+            compressed = compress(data)
+            if len(compressed) > len(data) * (1 - MIN_SAVING):
+                # Сжатие почти ничего не даёт - отдаём оригинал
+                if os.path.exists(target):
+                    os.remove(target)
+                continue
+            with open(f'{target}.tmp', 'wb') as output:
+                output.write(compressed)
+            os.replace(f'{target}.tmp', target)
+            written += 1
+        return written
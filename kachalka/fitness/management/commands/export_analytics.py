@@ -0,0 +1,58 @@
+"""
+Django management команда для колоночной выгрузки записей и отзывов в Parquet/Arrow.
+
+Наборы records, reviews и gym_reviews пишутся в <каталог>/<набор>/month=ГГГГ-ММ/
+пачками. Каждый запуск дописывает только строки, появившиеся после прошлого
+(состояние в <каталог>/_state.json), поэтому команду можно запускать по ночам.
+Нужен pyarrow.
+
+Использование:
+    python manage.py export_analytics
+    python manage.py export_analytics --datasets records --format arrow --output /data/fitness
+    python manage.py export_analytics --full  # удалить выгруженные файлы и выгрузить заново
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from fitness.analytics import DATASETS, DEFAULT_BATCH_SIZE, FORMATS, export_dataset
+
+
+class Command(BaseCommand):
+    help = 'Инкрементальная выгрузка записей и отзывов в Parquet/Arrow по месяцам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-o', '--output',
+            default=str(settings.ANALYTICS_EXPORT_ROOT),
+            help='Каталог выгрузки (по умолчанию: settings.ANALYTICS_EXPORT_ROOT)'
+        )
+        parser.add_argument(
+            '--datasets',
+            nargs='+',
+            choices=list(DATASETS),
+            default=list(DATASETS),
+            help='Наборы для выгрузки (по умолчанию: все)'
+        )
+        parser.add_argument('--format', choices=list(FORMATS), default='parquet', help='Формат файлов (по умолчанию: parquet)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Строк в пачке записи (по умолчанию: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument('--full', action='store_true', help='Удалить ранее выгруженные файлы наборов и выгрузить всё заново')
+
+    def handle(self, *args, **options):
+        for dataset in options['datasets']:
+            try:
+                rows, files = export_dataset(
+                    options['output'],
+                    dataset,
+                    file_format=options['format'],
+                    batch_size=max(1, options['batch_size']),
+                    full=options['full'],
+                )
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+            self.stdout.write(f'  {dataset}: {rows} строк, файлов: {files}')
+        self.stdout.write(self.style.SUCCESS(f'✓ Выгрузка сохранена в {options["output"]}'))
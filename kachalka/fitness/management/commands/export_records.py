@@ -0,0 +1,57 @@
+"""
+Django management команда для потоковой выгрузки записей на тренировки в NDJSON или CSV.
+
+Фильтры те же, что у /api/records/ (RecordFilterForm). Записи читаются пачками
+через серверный курсор, поэтому память не зависит от объёма выгрузки.
+
+Использование:
+    python manage.py export_records --format csv --output records.csv
+    python manage.py export_records --trainer 3 --status completed --date-from 2025-01-01T00:00 > records.ndjson
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from fitness.export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_lines, export_queryset
+from fitness.forms import RecordFilterForm
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить записи на тренировки в NDJSON или CSV (потоково)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson', help='Формат выгрузки (по умолчанию: ndjson)')
+        parser.add_argument('-o', '--output', help='Файл для выгрузки (по умолчанию: stdout)')
+        parser.add_argument('--user', help='ID пользователя')
+        parser.add_argument('--trainer', help='ID тренера')
+        parser.add_argument('--status', help='Фактический статус (scheduled, completed, cancelled)')
+        parser.add_argument('--date-from', help='Начало периода, ГГГГ-ММ-ДДTЧЧ:ММ')
+        parser.add_argument('--date-to', help='Конец периода, ГГГГ-ММ-ДДTЧЧ:ММ')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Размер пачки чтения из базы (по умолчанию: {DEFAULT_CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        filters = {
+            'user': options['user'],
+            'trainer': options['trainer'],
+            'status': options['status'],
+            'date_from': options['date_from'],
+            'date_to': options['date_to'],
+        }
+        filter_form = RecordFilterForm({name: value for name, value in filters.items() if value})
+        if not filter_form.is_valid():
+            errors = '; '.join(f'{field}: {" ".join(messages)}' for field, messages in filter_form.errors.items())
+            raise CommandError(f'Ошибка в фильтрах: {errors}')
+
+        chunks = export_lines(export_queryset(filter_form), options['format'], max(1, options['chunk_size']))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f'✓ Выгрузка сохранена в {options["output"]}'))
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
@@ -0,0 +1,85 @@
+"""
+Django management команда для поиска пересекающихся запланированных записей.
+
+Миграция 0016_booking_intervals запрещает пересечения на уровне базы и
+останавливается, если они уже есть. Команда показывает такие записи и по
+флагу --cancel-later отменяет их: записи просматриваются в порядке id, и
+отменяется запись, пересекающаяся с уже оставленной записью того же
+пользователя или тренера. Без флага данные не меняются.
+
+Команда не использует поле ends_at, поэтому работает и до применения миграции.
+
+Использование:
+    python manage.py find_booking_overlaps
+    python manage.py find_booking_overlaps --cancel-later
+"""
+from bisect import bisect_left
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from fitness.availability import invalidate_availability
+from fitness.models import Record
+
+
+def find_overlaps():
+    """[(id записи, id более ранней оставленной записи, 'user' или 'trainer')] для отмены"""
+    kept = {}
+    conflicts = []
+    rows = (
+        Record.objects.filter(status__in=Record.ACTIVE_STATUSES)
+        .order_by('id')
+        .values_list('id', 'user_id', 'trainer_id', 'datetime')
+    )
+    for record_id, user_id, trainer_id, start in rows.iterator(chunk_size=5000):
+        conflict = None
+        for owner, owner_id in (('user', user_id), ('trainer', trainer_id)):
+            starts = kept.get((owner, owner_id), [])
+            # Длительность у всех записей одинаковая: пересечение - начало ближе DURATION
+            index = bisect_left(starts, (start - Record.DURATION, float('inf')))
+            if index < len(starts) and starts[index][0] < start + Record.DURATION:
+                conflict = (record_id, starts[index][1], owner)
+                break
+        if conflict:
+            conflicts.append(conflict)
+            continue
+        for key in (('user', user_id), ('trainer', trainer_id)):
+            starts = kept.setdefault(key, [])
+            starts.insert(bisect_left(starts, (start, record_id)), (start, record_id))
+    return conflicts
+
+
+class Command(BaseCommand):
+    help = 'Найти (и по флагу отменить) пересекающиеся запланированные записи'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cancel-later',
+            action='store_true',
+            help='Отменить записи, пересекающиеся с более ранними (по id) записями'
+        )
+
+    def handle(self, *args, **options):
+        conflicts = find_overlaps()
+        if not conflicts:
+            self.stdout.write(self.style.SUCCESS('✓ Пересекающихся записей нет'))
+            return
+
+        owners = {'user': 'пользователя', 'trainer': 'тренера'}
+        for record_id, earlier_id, owner in conflicts:
+            self.stdout.write(f'  запись {record_id} пересекается с записью {earlier_id} ({owners[owner]})')
+        if not options['cancel_later']:
+            self.stdout.write(self.style.WARNING(
+                f'Найдено пересечений: {len(conflicts)}. Для отмены более поздних записей '
+                'запустите команду с --cancel-later'
+            ))
+            return
+
+        ids = [record_id for record_id, _, _ in conflicts]
+        with transaction.atomic():
+            trainer_ids = list(Record.objects.filter(pk__in=ids).values_list('trainer_id', flat=True))
+            cancelled = Record.objects.filter(pk__in=ids, status__in=Record.ACTIVE_STATUSES).update(
+                status='cancelled', updated_at=timezone.now()
+            )
+            transaction.on_commit(lambda: invalidate_availability(trainer_ids))
+        self.stdout.write(self.style.SUCCESS(f'✓ Отменено записей: {cancelled}'))
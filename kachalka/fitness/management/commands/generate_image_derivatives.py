@@ -0,0 +1,76 @@
+"""
+Django management команда для создания уменьшенных копий уже загруженных фото
+залов и тренеров (см. fitness.images).
+
+По умолчанию обрабатываются только изображения без копий или с копиями другого файла.
+
+Использование:
+    python manage.py generate_image_derivatives
+    python manage.py generate_image_derivatives --models trainers --workers 8
+    python manage.py generate_image_derivatives --force  # пересоздать все копии
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from fitness.images import IMAGE_FIELDS, generate, needs_variants
+from fitness.models import GymImage, Trainer
+
+
+MODELS = {
+    'gyms': GymImage,
+    'trainers': Trainer,
+}
+
+
+class Command(BaseCommand):
+    help = 'Создать уменьшенные копии (WebP и запасной формат) для фото залов и тренеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=list(MODELS),
+            default=list(MODELS),
+            help='Фото каких моделей обработать (по умолчанию: все)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.IMAGE_WORKERS,
+            help='Количество потоков (по умолчанию: settings.IMAGE_WORKERS)'
+        )
+        parser.add_argument('--force', action='store_true', help='Пересоздать копии, даже если они уже есть')
+
+    def handle(self, *args, **options):
+        force = options['force']
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for key in options['models']:
+                model = MODELS[key]
+                image_field, _, _, variants_field = IMAGE_FIELDS[model]
+                objects = model.objects.exclude(**{f'{image_field}__in': ['', None]}).only('pk', image_field, variants_field)
+                by_source = {}
+                for obj in objects.iterator():
+                    if force or needs_variants(obj):
+                        by_source.setdefault(getattr(obj, image_field).name, []).append(obj.pk)
+                # Сначала по одному объекту на исходный файл, затем остальные - они переиспользуют
+                # готовые копии, и потоки не создают одни и те же файлы одновременно
+                first = [pks[0] for pks in by_source.values()]
+                rest = [pk for pks in by_source.values() for pk in pks[1:]]
+                results = list(executor.map(lambda pk: self._generate(model, pk, force), first))
+                results += executor.map(lambda pk: self._generate(model, pk, False), rest)
+                self.stdout.write(
+                    f'  {key}: обработано {results.count(True)}, пропущено {results.count(False)}, '
+                    f'ошибок {results.count(None)}'
+                )
+        self.stdout.write(self.style.SUCCESS('✓ Копии изображений созданы'))
+
+    def _generate(self, model, pk, force):
+        try:
+            return generate(model, pk, overwrite=force)
+        except Exception as e:
+            self.stderr.write(f'  {model.__name__} #{pk}: {e}')
+            return None
+        finally:
+            connection.close()
@@ -1,48 +1,115 @@
 """
 Django management команда для полного пересоздания базы данных со всеми данными.
 
+Данные вставляются пачками через bulk_create, поэтому команда подходит и для
+генерации больших наборов для бенчмарков (пресеты M/L/XL - миллионы записей).
+Сигналы при bulk_create не срабатывают: счётчики, рейтинги, поисковый индекс
+и кэш пересчитываются один раз в конце.
+
 Использование:
     python manage.py populate_db --gyms 5 --trainers 10 --users 30
     python manage.py populate_db -g 3 -t 6 -u 9
+    python manage.py populate_db --preset L --seed 42
 """
 
 import random
 from datetime import datetime, timedelta
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
 from django.contrib.auth.models import User as DjangoUser
-from django.db import transaction
+from django.db import connection, transaction
 from django.utils import timezone
 from faker import Faker
-from fitness.models import UserProfile, Trainer, Gym, GymImage, Record, Review, GymReview
+from fitness.availability import SLOT_TIMES, invalidate_availability
+from fitness.cache import bump_version
+from fitness.models import (
+    UserProfile, Amenity, Trainer, Gym, GymImage, Record, Review, GymReview, ranking_score,
+)
+from fitness.search import update_search_index
+
+
+# Размеры наборов данных: records_per_user - среднее число записей на пользователя,
+# history_days - на сколько дней назад уходят записи (вперёд - всегда на 60 дней)
+PRESETS = {
+    'S': {'gyms': 5, 'trainers': 10, 'users': 30, 'records_per_user': 2, 'history_days': 30},
+    'M': {'gyms': 50, 'trainers': 500, 'users': 10_000, 'records_per_user': 10, 'history_days': 90},
+    'L': {'gyms': 200, 'trainers': 2_000, 'users': 100_000, 'records_per_user': 10, 'history_days': 365},
+    'XL': {'gyms': 1_000, 'trainers': 10_000, 'users': 500_000, 'records_per_user': 20, 'history_days': 730},
+}
+
+FUTURE_DAYS = 60
+DEFAULT_PASSWORD = 'testpass123'
+
+# Размер пула имён Faker на пол: имена берутся из пула, а не генерируются для каждого пользователя
+NAME_POOL_SIZE = 300
 
 
 class Command(BaseCommand):
     help = 'Полностью пересоздает базу данных: очищает все данные и создает залы, тренеров, пользователей, отзывы и записи.'
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--preset',
+            choices=PRESETS,
+            default='S',
+            help='Размер набора данных: S, M, L, XL (по умолчанию: S). Явные -g/-t/-u переопределяют пресет'
+        )
         parser.add_argument(
             '-g', '--gyms',
             type=int,
-            default=5,
-            help='Количество создаваемых залов (по умолчанию: 5)'
+            help='Количество создаваемых залов (по умолчанию: из пресета, для S - 5)'
         )
         parser.add_argument(
             '-t', '--trainers',
             type=int,
-            default=10,
-            help='Количество создаваемых тренеров (по умолчанию: 10)'
+            help='Количество создаваемых тренеров (по умолчанию: из пресета, для S - 10)'
         )
         parser.add_argument(
             '-u', '--users',
             type=int,
-            default=30,
-            help='Количество создаваемых пользователей (должно быть в 3 раза больше тренеров, по умолчанию: 30)'
+            help='Количество создаваемых пользователей (должно быть в 3 раза больше тренеров, для S - 30)'
+        )
+        parser.add_argument(
+            '--records-per-user',
+            type=int,
+            help='Среднее количество записей на пользователя (по умолчанию: из пресета)'
+        )
+        parser.add_argument(
+            '--history-days',
+            type=int,
+            help='Глубина истории записей в днях (по умолчанию: из пресета)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Seed генератора: с одинаковым seed создаются одинаковые данные (даты - относительно сегодня)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Размер пачки bulk_create (по умолчанию: 5000)'
+        )
+        parser.add_argument(
+            '--fast-passwords',
+            action='store_true',
+            help='Один заранее посчитанный хеш пароля на всех пользователей (для M/L/XL включено всегда)'
         )
 
     def handle(self, *args, **options):
-        num_gyms = options['gyms']
-        num_trainers = options['trainers']
-        num_users = options['users']
+        preset = PRESETS[options['preset']]
+        num_gyms = options['gyms'] if options['gyms'] is not None else preset['gyms']
+        num_trainers = options['trainers'] if options['trainers'] is not None else preset['trainers']
+        num_users = options['users'] if options['users'] is not None else preset['users']
+        records_per_user = options['records_per_user'] or preset['records_per_user']
+        history_days = options['history_days'] if options['history_days'] is not None else preset['history_days']
+        self.chunk_size = max(1, options['chunk_size'])
+        fast_passwords = options['fast_passwords'] or options['preset'] != 'S'
+
+        if min(num_gyms, num_trainers, num_users) < 1:
+            raise CommandError('Количество залов, тренеров и пользователей должно быть больше нуля')
 
         # Проверка соотношения пользователей к тренерам
         if num_users < num_trainers * 3:
@@ -62,11 +129,16 @@ class Command(BaseCommand):
                 f'  - Тренеров: {num_trainers}\n'
                 f'  - Пользователей: {num_users}\n'
                 f'  - Отзывов на тренеров: ~{num_trainers * 3} (по 2-4 на тренера)\n'
-                f'  - Отзывов на залы: ~{num_gyms * 2} (по 2-3 на зал)\n'
-                f'  - Записей: ~{num_users * 2} (по 1-3 на пользователя)\n'
+                f'  - Отзывов на залы: ~{num_gyms * 5 // 2} (по 2-3 на зал)\n'
+                f'  - Записей: ~{num_users * records_per_user} (по 1-{2 * records_per_user - 1} на пользователя, '
+                f'за {history_days} дн. назад и {FUTURE_DAYS} дн. вперёд)\n'
             )
         )
 
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+            Faker.seed(options['seed'])
+
         try:
             with transaction.atomic():
                 # Очистка базы данных
@@ -86,33 +158,25 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.SUCCESS(f'✓ Создано {len(trainers)} тренеров'))
 
                 self.stdout.write('Создание пользователей...')
-                users = self._create_users(num_users, fake)
+                users = self._create_users(num_users, fake, fast_passwords)
                 self.stdout.write(self.style.SUCCESS(f'✓ Создано {len(users)} пользователей'))
 
                 self.stdout.write('Создание отзывов на тренеров...')
                 reviews_count = self._create_reviews(users, trainers, fake)
                 self.stdout.write(self.style.SUCCESS(f'✓ Создано {reviews_count} отзывов на тренеров'))
 
-                # Обновление рейтингов тренеров
-                self.stdout.write('Обновление рейтингов тренеров...')
-                for trainer in trainers:
-                    trainer.update_rating()
-                self.stdout.write(self.style.SUCCESS('✓ Рейтинги тренеров обновлены'))
-
                 self.stdout.write('Создание отзывов на залы...')
                 gym_reviews_count = self._create_gym_reviews(users, gyms, fake)
                 self.stdout.write(self.style.SUCCESS(f'✓ Создано {gym_reviews_count} отзывов на залы'))
 
-                # Обновление рейтингов залов
-                self.stdout.write('Обновление рейтингов залов...')
-                for gym in gyms:
-                    gym.update_rating()
-                self.stdout.write(self.style.SUCCESS('✓ Рейтинги залов обновлены'))
-
                 self.stdout.write('Создание записей на тренировки...')
-                records_count = self._create_records(users, trainers, fake)
+                records_count = self._create_records(users, trainers, records_per_user, history_days)
                 self.stdout.write(self.style.SUCCESS(f'✓ Создано {records_count} записей'))
 
+                self.stdout.write('Пересчёт счётчиков и поискового индекса...')
+                self._refresh_derived(gyms, trainers)
+                self.stdout.write(self.style.SUCCESS('✓ Счётчики и поисковый индекс обновлены'))
+
             self.stdout.write(
                 self.style.SUCCESS(
                     f'\n{"="*50}\n'
@@ -125,20 +189,22 @@ class Command(BaseCommand):
             raise CommandError(f'Ошибка при заполнении базы данных: {str(e)}')
 
     def _clear_database(self):
-        """Очищает все записи в таблицах базы данных (сами таблицы остаются)."""
-        # Удаляем в правильном порядке с учетом внешних ключей
-        GymReview.objects.all().delete()
-        Review.objects.all().delete()
-        Record.objects.all().delete()
-        GymImage.objects.all().delete()
-        # Очищаем Many-to-Many связи перед удалением тренеров
-        for trainer in Trainer.objects.all():
-            trainer.gyms.clear()
-        Trainer.objects.all().delete()
-        Gym.objects.all().delete()
-        UserProfile.objects.all().delete()
-        # Удаляем всех пользователей Django, включая админов
-        DjangoUser.objects.all().delete()
+        """
+        Очищает все записи в таблицах базы данных (сами таблицы остаются).
+        PostgreSQL - один TRUNCATE ... RESTART IDENTITY CASCADE, SQLite - DELETE без загрузки объектов.
+        """
+        models = [
+            GymReview, Review, Record, GymImage, Trainer.gyms.through, Trainer,
+            Gym.amenities.through, Gym, Amenity, UserProfile, LogEntry,
+            DjangoUser.groups.through, DjangoUser.user_permissions.through, DjangoUser,
+        ]
+        tables = [model._meta.db_table for model in models]
+        sql_list = connection.ops.sql_flush(no_style(), tables, reset_sequences=True, allow_cascade=True)
+        connection.ops.execute_sql_flush(sql_list)
+
+    def _bulk_create(self, model, objects):
+        """bulk_create пачками по chunk_size; возвращает объекты с заполненными pk"""
+        return model.objects.bulk_create(objects, batch_size=self.chunk_size)
 
     def _create_gyms(self, count, fake):
         """
@@ -175,62 +241,122 @@ class Command(BaseCommand):
             'Спортивный комплекс с бассейном олимпийского стандарта. Плавание, аквааэробика, водное поло. Отличное место для любителей водных видов спорта.',
         ]
 
+        amenity_sets = [Amenity.parse(text) for text in amenities_list]
+        amenities = {
+            amenity.name: amenity
+            for amenity in Amenity.get_or_create_many({name for names in amenity_sets for name in names})
+        }
+
         used_names = set()
+        gym_amenities = []
         for i in range(count):
             city = random.choice(cities)
             
-            # Выбираем уникальное название
+            # Выбираем уникальное название; когда базовые закончились - филиалы с номером
             gym_name = random.choice(gym_names)
-            while gym_name in used_names:
-                gym_name = random.choice(gym_names)
+            if len(used_names) < len(gym_names):
+                while gym_name in used_names:
+                    gym_name = random.choice(gym_names)
+            else:
+                gym_name = f'{gym_name} №{i + 1}'
             used_names.add(gym_name)
             
-            gym = Gym.objects.create(
+            address = f"{fake.street_address()}, {city}"
+            gyms.append(Gym(
                 name=gym_name,
-                address=f"{fake.street_address()}, {city}",
+                address=address,
+                city=Gym.city_from_address(address),
                 description=random.choice(gym_descriptions),
-                amenities=random.choice(amenities_list)
-            )
-            
-            gyms.append(gym)
+                # bulk_create не вызывает save(): рейтинг без отзывов - априорный
+                ranking_score=ranking_score(0, 0),
+            ))
+            gym_amenities.append(random.choice(amenity_sets))
         
+        gyms = self._bulk_create(Gym, gyms)
+        self._bulk_create(Gym.amenities.through, [
+            Gym.amenities.through(gym_id=gym.id, amenity_id=amenities[name].id)
+            for gym, names in zip(gyms, gym_amenities)
+            for name in names
+        ])
         return gyms
 
-    def _get_russian_name_by_gender(self, gender, fake):
-        """Генерирует русское имя с учетом пола."""
-        if gender == 'M':
-            return fake.first_name_male()
-        else:
-            return fake.first_name_female()
-    
-    def _get_russian_lastname_by_gender(self, gender, fake):
-        """Генерирует русскую фамилию с учетом пола."""
-        if gender == 'M':
-            return fake.last_name_male()
-        else:
-            return fake.last_name_female()
-    
-    def _generate_full_name(self, gender, fake):
-        """Генерирует полное имя с учетом пола, избегая похожих имен и фамилий."""
+    def _name_pools(self, fake):
+        """
+        Пулы имён, фамилий и отчеств Faker по полу. Выбор из пула на порядки быстрее
+        генерации Faker для каждого пользователя и остаётся детерминированным при --seed.
+        """
+        if not hasattr(self, '_pools'):
+            self._pools = {
+                'M': (
+                    sorted({fake.first_name_male() for _ in range(NAME_POOL_SIZE)}),
+                    sorted({fake.last_name_male() for _ in range(NAME_POOL_SIZE)}),
+                    sorted({fake.middle_name_male() for _ in range(NAME_POOL_SIZE)}),
+                ),
+                'F': (
+                    sorted({fake.first_name_female() for _ in range(NAME_POOL_SIZE)}),
+                    sorted({fake.last_name_female() for _ in range(NAME_POOL_SIZE)}),
+                    sorted({fake.middle_name_female() for _ in range(NAME_POOL_SIZE)}),
+                ),
+            }
+        return self._pools
+
+    @staticmethod
+    def _names_differ(first_name, last_name):
+        """Имя и фамилия не похожи (сравниваем без окончаний)"""
+        first_name_base = first_name.lower().rstrip('аеёиоуыэюя')
+        last_name_base = last_name.lower().rstrip('аеёиоуыэюяовин')
+        return (
+            first_name_base != last_name_base
+            and not first_name_base.startswith(last_name_base[:3])
+            and not last_name_base.startswith(first_name_base[:3])
+        )
+
+    def _generate_name(self, gender, fake):
+        """Генерирует (имя, фамилия) с учетом пола, избегая похожих имен и фамилий."""
+        first_names, last_names, _ = self._name_pools(fake)[gender]
         max_attempts = 50
         for _ in range(max_attempts):
-            first_name = self._get_russian_name_by_gender(gender, fake)
-            last_name = self._get_russian_lastname_by_gender(gender, fake)
-            
-            # Проверяем, что имя и фамилия не похожи
-            # Убираем окончания для сравнения
-            first_name_base = first_name.lower().rstrip('аеёиоуыэюя')
-            last_name_base = last_name.lower().rstrip('аеёиоуыэюяовин')
-            
-            # Если имя и фамилия сильно отличаются, используем их
-            if first_name_base != last_name_base and not first_name_base.startswith(last_name_base[:3]) and not last_name_base.startswith(first_name_base[:3]):
-                return f"{first_name} {last_name}"
+            first_name = random.choice(first_names)
+            last_name = random.choice(last_names)
+            if self._names_differ(first_name, last_name):
+                return first_name, last_name
         
         # Если не удалось найти подходящую пару, используем любую
-        first_name = self._get_russian_name_by_gender(gender, fake)
-        last_name = self._get_russian_lastname_by_gender(gender, fake)
+        return random.choice(first_names), random.choice(last_names)
+
+    def _generate_full_name(self, gender, fake):
+        """Генерирует полное имя с учетом пола, избегая похожих имен и фамилий."""
+        first_name, last_name = self._generate_name(gender, fake)
         return f"{first_name} {last_name}"
 
+    def _unique_full_name(self, gender, first_name, last_name, used_names, fake):
+        """
+        Уникальное полное имя (UserProfile.full_name уникально): проверка по множеству в памяти,
+        при совпадении - с отчеством, затем с номером
+        """
+        full_name = f"{first_name} {last_name}"
+        if full_name not in used_names:
+            return full_name
+        middle_names = self._name_pools(fake)[gender][2]
+        for _ in range(5):
+            full_name = f"{first_name} {random.choice(middle_names)} {last_name}"
+            if full_name not in used_names:
+                return full_name
+        number = 2
+        while f"{first_name} {last_name} {number}" in used_names:
+            number += 1
+        return f"{first_name} {last_name} {number}"
+
+    @staticmethod
+    def _unique_phone(used_phones):
+        """Уникальный мобильный номер (UserProfile.phone уникален)"""
+        while True:
+            digits = f'{random.randrange(10 ** 9):09d}'
+            phone = f'+7 9{digits[:2]} {digits[2:5]}-{digits[5:7]}-{digits[7:]}'
+            if phone not in used_phones:
+                used_phones.add(phone)
+                return phone
+
     def _create_trainers(self, count, gyms, fake):
         """Создает тренеров с реалистичными описаниями."""
         trainers = []
@@ -263,74 +389,79 @@ class Command(BaseCommand):
             'Персональный тренер и нутрициолог. Комплексный подход - тренировки + питание = ваш результат! Работаю с клиентами онлайн и офлайн.',
         ]
 
+        trainer_gyms = []
         for _ in range(count):
             # Случайно выбираем пол тренера
             gender = random.choice(['M', 'F'])
             full_name = self._generate_full_name(gender, fake)
             
-            trainer = Trainer.objects.create(
+            trainers.append(Trainer(
                 full_name=full_name,
                 specialization=random.choice(specializations),
                 description=random.choice(trainer_descriptions),
-                image='trainers/trainer_base.jpg'  # Дефолтное изображение
-            )
+                image='trainers/trainer_base.jpg',  # Дефолтное изображение
+                ranking_score=ranking_score(0, 0),
+            ))
             
             # Привязываем тренера к 1-3 залам
             num_gyms = random.randint(1, min(3, len(gyms)))
-            trainer.gyms.set(random.sample(gyms, num_gyms))
-            
-            trainers.append(trainer)
+            trainer_gyms.append(random.sample(gyms, num_gyms))
         
+        trainers = self._bulk_create(Trainer, trainers)
+        self._bulk_create(Trainer.gyms.through, [
+            Trainer.gyms.through(trainer_id=trainer.id, gym_id=gym.id)
+            for trainer, selected_gyms in zip(trainers, trainer_gyms)
+            for gym in selected_gyms
+        ])
         return trainers
 
-    def _create_users(self, count, fake):
-        """Создает пользователей с профилями."""
-        users = []
+    def _create_users(self, count, fake, fast_passwords=False):
+        """
+        Создает пользователей с профилями пачками по chunk_size.
+        Возвращает список id профилей (объекты в памяти не держим).
+        """
+        profile_ids = []
+        used_names = set()
+        used_phones = set()
+        usernames = [fake.user_name() for _ in range(NAME_POOL_SIZE)]
+        emails = [fake.free_email() for _ in range(NAME_POOL_SIZE)]
+        # PBKDF2 на каждого пользователя - секунды на тысячу; быстрый режим считает хеш один раз
+        shared_password = make_password(DEFAULT_PASSWORD) if fast_passwords else None
         
-        for i in range(count):
-            # Сначала определяем пол
-            gender = random.choice(['M', 'F'])
-            
-            # Генерируем имя и фамилию с учетом пола
-            first_name = self._get_russian_name_by_gender(gender, fake)
-            last_name = self._get_russian_lastname_by_gender(gender, fake)
-            
-            # Проверяем, что имя и фамилия не похожи
-            max_attempts = 50
-            for _ in range(max_attempts):
-                first_name_base = first_name.lower().rstrip('аеёиоуыэюя')
-                last_name_base = last_name.lower().rstrip('аеёиоуыэюяовин')
+        for chunk_start in range(0, count, self.chunk_size):
+            django_users = []
+            profiles = []
+            for i in range(chunk_start, min(count, chunk_start + self.chunk_size)):
+                # Сначала определяем пол
+                gender = random.choice(['M', 'F'])
                 
-                if first_name_base != last_name_base and not first_name_base.startswith(last_name_base[:3]) and not last_name_base.startswith(first_name_base[:3]):
-                    break
+                # Генерируем имя и фамилию с учетом пола
+                first_name, last_name = self._generate_name(gender, fake)
+                full_name = self._unique_full_name(gender, first_name, last_name, used_names, fake)
+                used_names.add(full_name)
                 
-                first_name = self._get_russian_name_by_gender(gender, fake)
-                last_name = self._get_russian_lastname_by_gender(gender, fake)
+                # Создаем Django User (обычный пользователь); уникальность - по номеру
+                django_users.append(DjangoUser(
+                    username=f"{random.choice(usernames)}{i}",
+                    email=f"user{i}_{random.choice(emails)}",
+                    password=shared_password or make_password(DEFAULT_PASSWORD),
+                    first_name=first_name,
+                    last_name=last_name
+                ))
+                profiles.append(UserProfile(
+                    full_name=full_name,
+                    age=random.randint(18, 65),
+                    gender=gender,
+                    phone=self._unique_phone(used_phones)
+                ))
             
-            # Создаем Django User (обычный пользователь)
-            username = fake.user_name() + str(i)
-            email = f"user{i}_{fake.email()}"
-            
-            django_user = DjangoUser.objects.create_user(
-                username=username,
-                email=email,
-                password='testpass123',
-                first_name=first_name,
-                last_name=last_name
-            )
-            
-            # Профиль создается автоматически через сигнал
-            # Обновляем данные профиля
-            profile = django_user.profile
-            profile.full_name = f"{first_name} {last_name}"
-            profile.age = random.randint(18, 65)
-            profile.gender = gender
-            profile.phone = fake.phone_number()
-            profile.save()
-            
-            users.append(profile)
+            # bulk_create не отправляет post_save, поэтому профили создаем явно
+            django_users = DjangoUser.objects.bulk_create(django_users)
+            for django_user, profile in zip(django_users, profiles):
+                profile.user_id = django_user.id
+            profile_ids.extend(profile.id for profile in UserProfile.objects.bulk_create(profiles))
         
-        return users
+        return profile_ids
 
     def _create_reviews(self, users, trainers, fake):
         """Создает реалистичные отзывы от пользователей на тренеров."""
@@ -357,71 +488,79 @@ class Command(BaseCommand):
             'Занимаюсь месяц, пока все нравится. Посмотрим, что будет дальше. Надеюсь на результат!',
         ]
         
-        # Каждый тренер получает от 2 до 4 отзывов
+        # Каждый тренер получает от 2 до 4 отзывов от разных пользователей (unique_together)
+        reviews = []
         for trainer in trainers:
             num_reviews = random.randint(2, 4)
             selected_users = random.sample(users, min(num_reviews, len(users)))
             
-            for user in selected_users:
-                try:
-                    # 80% положительных отзывов (5 звезд), 15% хороших (4 звезды), 5% средних (3 звезды)
-                    rand = random.random()
-                    if rand < 0.80:
-                        rating = 5
-                        review_text = random.choice(positive_reviews)
-                    elif rand < 0.95:
-                        rating = 4
-                        review_text = random.choice(good_reviews)
-                    else:
-                        rating = 3
-                        review_text = random.choice(good_reviews)
-                    
-                    Review.objects.create(
-                        user=user,
-                        trainer=trainer,
-                        text=review_text,
-                        rating=rating
-                    )
-                    reviews_count += 1
-                except Exception:
-                    # Пропускаем, если отзыв уже существует (unique_together)
-                    pass
+            for user_id in selected_users:
+                # 80% положительных отзывов (5 звезд), 15% хороших (4 звезды), 5% средних (3 звезды)
+                rand = random.random()
+                if rand < 0.80:
+                    rating = 5
+                    review_text = random.choice(positive_reviews)
+                elif rand < 0.95:
+                    rating = 4
+                    review_text = random.choice(good_reviews)
+                else:
+                    rating = 3
+                    review_text = random.choice(good_reviews)
+                
+                reviews.append(Review(
+                    user_id=user_id,
+                    trainer=trainer,
+                    text=review_text,
+                    rating=rating
+                ))
+                self._add_rating(trainer, rating)
+            
+            if len(reviews) >= self.chunk_size:
+                reviews_count += len(self._bulk_create(Review, reviews))
+                reviews = []
         
+        reviews_count += len(self._bulk_create(Review, reviews))
         return reviews_count
 
-    def _create_records(self, users, trainers, fake):
-        """Создает записи на тренировки."""
+    @staticmethod
+    def _add_rating(owner, rating):
+        """Учесть оценку в счётчиках владельца (сигналы рейтинга при bulk_create не срабатывают)"""
+        owner.reviews_count += 1
+        owner.rating_sum += rating
+
+    def _create_records(self, users, trainers, records_per_user, history_days):
+        """
+        Создает записи на тренировки пачками по chunk_size.
+        Тренер и пользователь не могут быть заняты дважды (ограничение в БД) - занятость
+        запланированных слотов проверяется по множествам в памяти, без запросов.
+        """
         records_count = 0
+        now = timezone.now()
+        today = timezone.localdate()
+        trainer_ids = [trainer.id for trainer in trainers]
         
-        # Временные слоты по 1.5 часа с 9:00 до 21:00
-        time_slots = [
-            '09:00', '10:30', '12:00', '13:30', 
-            '15:00', '16:30', '18:00', '19:30'
+        # Начала слотов расписания для каждого дня диапазона от -history_days до +FUTURE_DAYS
+        day_offsets = range(-history_days, FUTURE_DAYS + 1)
+        slot_starts = [
+            [timezone.make_aware(datetime.combine(today + timedelta(days=offset), slot)) for slot in SLOT_TIMES]
+            for offset in day_offsets
         ]
+        busy_trainer_slots = set()
+        busy_user_slots = set()
         
-        # Каждый пользователь создает от 1 до 3 записей
-        for user in users:
-            num_records = random.randint(1, 3)
+        records = []
+        # Каждый пользователь создает в среднем records_per_user записей
+        for user_id in users:
+            num_records = random.randint(1, 2 * records_per_user - 1)
             
             for _ in range(num_records):
-                trainer = random.choice(trainers)
-                
-                # Генерируем случайную дату в диапазоне от -30 до +60 дней
-                days_offset = random.randint(-30, 60)
-                record_datetime = timezone.now() + timedelta(days=days_offset)
-                
-                # Выбираем случайный слот времени
-                time_slot = random.choice(time_slots)
-                hour, minute = map(int, time_slot.split(':'))
-                record_datetime = record_datetime.replace(
-                    hour=hour,
-                    minute=minute,
-                    second=0,
-                    microsecond=0
-                )
+                trainer_id = random.choice(trainer_ids)
+                day_index = random.randrange(len(slot_starts))
+                slot_index = random.randrange(len(SLOT_TIMES))
+                record_datetime = slot_starts[day_index][slot_index]
                 
                 # Определяем статус в зависимости от даты
-                if record_datetime < timezone.now():
+                if record_datetime < now:
                     # Прошедшие тренировки
                     status = random.choices(
                         ['completed', 'cancelled'],
@@ -434,14 +573,28 @@ class Command(BaseCommand):
                         weights=[0.9, 0.1]
                     )[0]
                 
-                Record.objects.create(
-                    user=user,
-                    trainer=trainer,
+                if status in Record.ACTIVE_STATUSES:
+                    trainer_slot = (trainer_id, day_index, slot_index)
+                    user_slot = (user_id, day_index, slot_index)
+                    if trainer_slot in busy_trainer_slots or user_slot in busy_user_slots:
+                        continue
+                    busy_trainer_slots.add(trainer_slot)
+                    busy_user_slots.add(user_slot)
+                
+                # save() не вызывается - конец интервала заполняем сами
+                records.append(Record(
+                    user_id=user_id,
+                    trainer_id=trainer_id,
                     datetime=record_datetime,
+                    ends_at=record_datetime + Record.DURATION,
                     status=status
-                )
-                records_count += 1
+                ))
+            
+            if len(records) >= self.chunk_size:
+                records_count += len(self._bulk_create(Record, records))
+                records = []
         
+        records_count += len(self._bulk_create(Record, records))
         return records_count
 
     def _create_gym_reviews(self, users, gyms, fake):
@@ -467,34 +620,52 @@ class Command(BaseCommand):
             'Нормальный зал. Цены приемлемые, персонал вежливый. Подходит для регулярных тренировок.',
         ]
         
-        # Каждый зал получает от 2 до 3 отзывов
+        # Каждый зал получает от 2 до 3 отзывов от разных пользователей (unique_together)
+        reviews = []
         for gym in gyms:
             num_reviews = random.randint(2, 3)
             selected_users = random.sample(users, min(num_reviews, len(users)))
             
-            for user in selected_users:
-                try:
-                    # 75% положительных отзывов (5 звезд), 20% хороших (4 звезды), 5% средних (3 звезды)
-                    rand = random.random()
-                    if rand < 0.75:
-                        rating = 5
-                        review_text = random.choice(positive_reviews)
-                    elif rand < 0.95:
-                        rating = 4
-                        review_text = random.choice(good_reviews)
-                    else:
-                        rating = 3
-                        review_text = random.choice(good_reviews)
-                    
-                    GymReview.objects.create(
-                        user=user,
-                        gym=gym,
-                        text=review_text,
-                        rating=rating
-                    )
-                    reviews_count += 1
-                except Exception:
-                    # Пропускаем, если отзыв уже существует (unique_together)
-                    pass
+            for user_id in selected_users:
+                # 75% положительных отзывов (5 звезд), 20% хороших (4 звезды), 5% средних (3 звезды)
+                rand = random.random()
+                if rand < 0.75:
+                    rating = 5
+                    review_text = random.choice(positive_reviews)
+                elif rand < 0.95:
+                    rating = 4
+                    review_text = random.choice(good_reviews)
+                else:
+                    rating = 3
+                    review_text = random.choice(good_reviews)
+                
+                reviews.append(GymReview(
+                    user_id=user_id,
+                    gym=gym,
+                    text=review_text,
+                    rating=rating
+                ))
+                self._add_rating(gym, rating)
         
+        reviews_count += len(self._bulk_create(GymReview, reviews))
         return reviews_count
+
+    def _refresh_derived(self, gyms, trainers):
+        """
+        Пересчитывает то, что при поштучном create() поддерживают сигналы:
+        рейтинги, счётчики тренеров в залах, поисковый индекс, версии кэша
+        """
+        for owner in (*gyms, *trainers):
+            owner.rating = round(owner.rating_sum / owner.reviews_count, 2) if owner.reviews_count else 0.00
+            owner.ranking_score = ranking_score(owner.reviews_count, owner.rating_sum)
+        rating_fields = ['reviews_count', 'rating_sum', 'rating', 'ranking_score']
+        Gym.objects.bulk_update(gyms, rating_fields, batch_size=self.chunk_size)
+        Trainer.objects.bulk_update(trainers, rating_fields, batch_size=self.chunk_size)
+        
+        Gym.refresh_counters([gym.id for gym in gyms])
+        for model in (Gym, Trainer):
+            update_search_index(model)
+        
+        transaction.on_commit(lambda: invalidate_availability([trainer.id for trainer in trainers]))
+        for model in (Amenity, Gym, Trainer, GymImage, Review, GymReview):
+            transaction.on_commit(lambda model=model: bump_version(model))
@@ -0,0 +1,18 @@
+"""
+Django management команда для полной перестройки поискового индекса залов и тренеров.
+
+Использование:
+    python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+from fitness.search import SEARCH_FIELDS, update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестроить полнотекстовый поисковый индекс залов и тренеров'
+
+    def handle(self, *args, **options):
+        for model in SEARCH_FIELDS:
+            self.stdout.write(f'Индексация: {model._meta.verbose_name_plural}...')
+            update_search_index(model)
+        self.stdout.write(self.style.SUCCESS('✓ Поисковый индекс перестроен'))
@@ -0,0 +1,26 @@
+"""
+Django management команда для пересчёта байесовского рейтинга (ranking_score) залов и тренеров.
+
+Нужна после изменения RANKING_PRIOR_MEAN / RANKING_PRIOR_WEIGHT: отзывы обновляют
+ranking_score инкрементально, но уже сохранённые значения посчитаны со старым априорным.
+
+Использование:
+    python manage.py refresh_ranking_scores
+"""
+from django.core.management.base import BaseCommand
+from fitness.cache import bump_version
+from fitness.models import Gym, Trainer, ranking_prior, refresh_ranking_scores
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать байесовский рейтинг для сортировки залов и тренеров'
+
+    def handle(self, *args, **options):
+        prior_mean, prior_weight = ranking_prior()
+        self.stdout.write(f'Априорная оценка {prior_mean}, вес {prior_weight}')
+        for model in (Gym, Trainer):
+            updated = refresh_ranking_scores(model)
+            # UPDATE не отправляет сигналы - сбрасываем закэшированные ответы каталога
+            bump_version(model)
+            self.stdout.write(f'  {model._meta.verbose_name_plural}: {updated}')
+        self.stdout.write(self.style.SUCCESS('✓ Рейтинг для сортировки пересчитан'))
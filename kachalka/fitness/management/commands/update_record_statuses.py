@@ -1,35 +1,70 @@
 """
-Django management команда для автоматического обновления статусов тренировок
+Django management команда для перевода закончившихся тренировок в статус 'completed'.
+
+API не зависит от этой команды: фактический статус вычисляется при чтении
+(Record.with_effective_status). Команда приводит данные в базе к тому же виду
+пачками UPDATE и может работать как постоянный фоновый процесс.
+
+Использование:
+    python manage.py update_record_statuses
+    python manage.py update_record_statuses --daemon --interval 300
 """
+import time
+
 from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Count
 from fitness.models import Record
 
 
 class Command(BaseCommand):
-    help = 'Обновить статусы тренировок (завершить тренировки, которые прошли более 1.5 часов назад)'
+    help = 'Обновить статусы тренировок (завершить тренировки, которые закончились)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество записей в одном UPDATE (по умолчанию 1000)'
+        )
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Работать постоянно, повторяя обновление каждые --interval секунд'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=300,
+            help='Пауза между запусками в режиме --daemon, секунд (по умолчанию 300)'
+        )
 
     def handle(self, *args, **options):
-        self.stdout.write('Обновление статусов тренировок...')
-        
-        # Находим все назначенные тренировки
-        scheduled_records = Record.objects.filter(status='scheduled')
-        
-        updated_count = 0
-        for record in scheduled_records:
-            if record.update_status():
-                updated_count += 1
-        
+        if not options['daemon']:
+            self._run_once(options['chunk_size'])
+            self._print_statistics()
+            return
+
+        self.stdout.write(f'Фоновый режим: обновление каждые {options["interval"]} с (Ctrl+C для остановки)')
+        try:
+            while True:
+                close_old_connections()
+                self._run_once(options['chunk_size'])
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('\nОстановлено')
+
+    def _run_once(self, chunk_size):
+        started = time.monotonic()
+        updated_count = Record.complete_finished(chunk_size=chunk_size)
         self.stdout.write(self.style.SUCCESS(
-            f'✓ Обновлено {updated_count} записей (завершено тренировок)'
+            f'✓ Обновлено {updated_count} записей (завершено тренировок) '
+            f'за {time.monotonic() - started:.2f} с'
         ))
-        
-        # Показываем статистику
-        total_scheduled = Record.objects.filter(status='scheduled').count()
-        total_completed = Record.objects.filter(status='completed').count()
-        total_cancelled = Record.objects.filter(status='cancelled').count()
-        
-        self.stdout.write(f'\nТекущая статистика:')
-        self.stdout.write(f'  Назначено: {total_scheduled}')
-        self.stdout.write(f'  Завершено: {total_completed}')
-        self.stdout.write(f'  Отменено: {total_cancelled}')
 
+    def _print_statistics(self):
+        counts = dict(Record.objects.order_by().values_list('status').annotate(count=Count('id')))
+        self.stdout.write(f'\nТекущая статистика:')
+        self.stdout.write(f'  Назначено: {counts.get("scheduled", 0)}')
+        self.stdout.write(f'  Завершено: {counts.get("completed", 0)}')
+        self.stdout.write(f'  Отменено: {counts.get("cancelled", 0)}')
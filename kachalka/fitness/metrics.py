@@ -0,0 +1,245 @@
+"""
+Метрики в текстовом формате Prometheus (GET /metrics).
+
+- fitness_http_requests_total{view, method, status} - количество запросов;
+- fitness_http_request_duration_seconds{view} - гистограмма времени ответа;
+- fitness_http_request_db_queries{view} - гистограмма числа SQL-запросов на запрос;
+- fitness_booking_slots_total{outcome} - исходы бронирования по слотам
+  (created, conflict, past_time, over_horizon, off_grid, invalid).
+
+Значения копятся в памяти процесса. Если задан settings.METRICS_DIR, каждый воркер
+не чаще раза в METRICS_FLUSH_INTERVAL секунд сохраняет свои значения в файл
+<pid>-<случайный суффикс>.json в этом каталоге, а /metrics суммирует файлы всех
+воркеров. Суффикс выбирается при первой записи в процессе, поэтому новый воркер с
+тем же pid не перезаписывает файл старого. При первой записи воркер также удаляет
+файлы процессов, которых уже нет (как mark_process_dead в prometheus_client), -
+счётчики при этом уменьшаются, и Prometheus считает это сбросом счётчика (rate()
+и increase() его учитывают). Каталог должен быть локальным для машины: pid
+проверяются в её пространстве процессов.
+Без METRICS_DIR /metrics показывает только текущий процесс.
+
+Вне DEBUG /metrics отдаётся только с METRICS_TOKEN (см. fitness.views.prometheus_metrics).
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Имя метрики: (тип, описание, границы корзин гистограммы)
+METRICS = {
+    'fitness_http_requests_total': ('counter', 'Количество запросов по имени URL, методу и коду ответа', None),
+    'fitness_http_request_duration_seconds': ('histogram', 'Время ответа по имени URL', DURATION_BUCKETS),
+    'fitness_http_request_db_queries': ('histogram', 'SQL-запросов на запрос по имени URL', QUERY_BUCKETS),
+    'fitness_booking_slots_total': ('counter', 'Исходы бронирования слотов', None),
+}
+
+BOOKING_OUTCOMES = ('created', 'conflict', 'past_time', 'over_horizon', 'off_grid', 'invalid')
+
+_lock = threading.Lock()
+# (имя, ((метка, значение), ...)) -> число для счётчиков,
+# [счётчики корзин..., сумма, количество] для гистограмм
+_values = {}
+_last_flush = 0.0
+# (pid, имя файла): при fork (gunicorn --preload) имя выбирается заново
+_file = (None, None)
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, labels, amount=1):
+    """Увеличить счётчик"""
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+    _maybe_flush()
+
+
+def observe(name, labels, value):
+    """Добавить наблюдение в гистограмму"""
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        state = _values.get(key)
+        if state is None:
+            state = _values[key] = [0] * (len(buckets) + 2)
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+    _maybe_flush()
+
+
+def observe_request(view, method, status, duration, queries):
+    """Учесть обработанный запрос (вызывается из fitness.timing.RequestTimingMiddleware)"""
+    view = view or 'unresolved'
+    inc('fitness_http_requests_total', {'view': view, 'method': method, 'status': str(status)})
+    observe('fitness_http_request_duration_seconds', {'view': view}, duration)
+    observe('fitness_http_request_db_queries', {'view': view}, queries)
+
+
+def count_booking(outcome, amount=1):
+    """Учесть исход бронирования amount слотов"""
+    if amount and enabled():
+        inc('fitness_booking_slots_total', {'outcome': outcome}, amount)
+
+
+# ==================== Общий каталог воркеров ====================
+
+def _directory():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def _maybe_flush():
+    global _last_flush
+    if not _directory():
+        return
+    now = time.monotonic()
+    if now - _last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0):
+        _last_flush = now
+        flush()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю
+        return True
+    return True
+
+
+def prune_dead(directory):
+    """Удалить файлы (и недописанные .tmp) завершившихся процессов; возвращает число удалённых"""
+    removed = 0
+    for filename in os.listdir(directory):
+        if not filename.endswith(('.json', '.json.tmp')):
+            continue
+        try:
+            pid = int(filename.split('-', 1)[0].split('.', 1)[0])
+        except ValueError:
+            continue
+        if pid == os.getpid() or _pid_alive(pid):
+            continue
+        try:
+            os.remove(os.path.join(directory, filename))
+            removed += 1
+        except FileNotFoundError:
+            # Файл уже удалил другой воркер
+            pass
+    return removed
+
+
+def _filename(directory):
+    """Имя файла процесса; при первой записи в процессе - заодно уборка за завершившимися"""
+    global _file
+    pid = os.getpid()
+    if _file[0] != pid:
+        _file = (pid, f'{pid}-{uuid.uuid4().hex[:12]}.json')
+        prune_dead(directory)
+    return _file[1]
+
+
+def flush():
+    """Сохранить значения процесса в METRICS_DIR/<pid>-<суффикс>.json (атомарной заменой файла)"""
+    directory = _directory()
+    if not directory:
+        return
+    with _lock:
+        payload = [[name, list(labels), value] for (name, labels), value in _values.items()]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, _filename(directory))
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as metrics_file:
+        json.dump(payload, metrics_file)
+    os.replace(temporary, path)
+
+
+atexit.register(flush)
+
+
+def _merge(target, name, labels, value):
+    key = (name, tuple(tuple(label) for label in labels))
+    current = target.get(key)
+    if current is None:
+        target[key] = list(value) if isinstance(value, list) else value
+    elif isinstance(value, list):
+        target[key] = [left + right for left, right in zip(current, value)]
+    else:
+        target[key] = current + value
+
+
+def collect():
+    """Значения всех воркеров (или текущего процесса, если METRICS_DIR не задан)"""
+    directory = _directory()
+    if not directory:
+        with _lock:
+            return {key: list(value) if isinstance(value, list) else value for key, value in _values.items()}
+
+    flush()
+    merged = {}
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename), encoding='utf-8') as metrics_file:
+                rows = json.load(metrics_file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in rows:
+            if name in METRICS:
+                _merge(merged, name, labels, value)
+    return merged
+
+
+# ==================== Текстовый формат Prometheus ====================
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus 0.0.4"""
+    values = collect()
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        series = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            for bound, count in zip(buckets, value):
+                lines.append(f'{name}_bucket{_labels(labels, [("le", _number(float(bound)))])} {count}')
+            lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {value[-1]}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(float(value[-2]))}')
+            lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0009_alter_review_options_gym_rating_gymreview"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="gym",
+            index=models.Index(fields=["name", "id"], name="gyms_name_6f5e89_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="gym",
+            index=models.Index(
+                fields=["-rating", "name", "id"], name="gyms_rating_c89e47_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="record",
+            index=models.Index(
+                fields=["-datetime", "-id"], name="records_datetim_88ebce_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="record",
+            index=models.Index(
+                fields=["user", "-datetime", "-id"], name="records_user_id_c78265_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="reviews_created_688751_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["trainer", "-created_at", "-id"],
+                name="reviews_trainer_d13ded_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="trainer",
+            index=models.Index(
+                fields=["full_name", "id"], name="trainers_full_na_0c0c1e_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="trainer",
+            index=models.Index(
+                fields=["-rating", "full_name", "id"], name="trainers_rating_ea67c2_idx"
+            ),
+        ),
+    ]
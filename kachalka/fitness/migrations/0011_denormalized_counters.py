@@ -0,0 +1,77 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+def backfill_counters(apps, schema_editor):
+    """Заполнить счётчики по уже существующим данным"""
+    Gym = apps.get_model("fitness", "Gym")
+    GymImage = apps.get_model("fitness", "GymImage")
+    Trainer = apps.get_model("fitness", "Trainer")
+    Review = apps.get_model("fitness", "Review")
+    GymReview = apps.get_model("fitness", "GymReview")
+    TrainerGyms = Trainer.gyms.through
+
+    for gym in Gym.objects.all():
+        first_image = GymImage.objects.filter(gym=gym).order_by("order", "id").first()
+        Gym.objects.filter(pk=gym.pk).update(
+            reviews_count=GymReview.objects.filter(gym=gym).count(),
+            trainers_count=TrainerGyms.objects.filter(gym_id=gym.pk).count(),
+            images_count=GymImage.objects.filter(gym=gym).count(),
+            main_image=first_image.image.name if first_image else "",
+        )
+
+    for trainer in Trainer.objects.all():
+        Trainer.objects.filter(pk=trainer.pk).update(
+            reviews_count=Review.objects.filter(trainer=trainer).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0010_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gym",
+            name="images_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество фото"
+            ),
+        ),
+        migrations.AddField(
+            model_name="gym",
+            name="main_image",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                help_text="Первое по порядку изображение зала",
+                upload_to="gyms/",
+                verbose_name="Главное изображение",
+            ),
+        ),
+        migrations.AddField(
+            model_name="gym",
+            name="reviews_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество отзывов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="gym",
+            name="trainers_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество тренеров"
+            ),
+        ),
+        migrations.AddField(
+            model_name="trainer",
+            name="reviews_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество отзывов"
+            ),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0011_denormalized_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gym",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+        ),
+        migrations.AddField(
+            model_name="record",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+        ),
+        migrations.AddField(
+            model_name="trainer",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+        ),
+    ]
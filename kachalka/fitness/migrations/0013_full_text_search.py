@@ -0,0 +1,74 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:14
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+SQLITE_TABLE = "fitness_search_index"
+
+# (таблица, kind, основное поле, дополнительное поле)
+SEARCH_TABLES = [
+    ("gyms", "fitness.gym", "name", "address"),
+    ("trainers", "fitness.trainer", "full_name", "specialization"),
+]
+
+
+def create_search_backend(apps, schema_editor):
+    """GIN-индексы для PostgreSQL или таблица FTS5 для SQLite, затем заполнение индекса"""
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for table, _, primary, secondary in SEARCH_TABLES:
+            schema_editor.execute(
+                f"UPDATE {table} SET search_vector = "
+                f"setweight(to_tsvector('russian', coalesce({primary}, '')), 'A') || "
+                f"setweight(to_tsvector('russian', coalesce({secondary}, '')), 'B')"
+            )
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_search_vector_gin "
+                f"ON {table} USING gin (search_vector)"
+            )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, primary_text, secondary_text, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        for table, kind, primary, secondary in SEARCH_TABLES:
+            schema_editor.execute(
+                f"INSERT INTO {SQLITE_TABLE} (kind, object_id, primary_text, secondary_text) "
+                f"SELECT '{kind}', id, coalesce({primary}, ''), coalesce({secondary}, '') FROM {table}"
+            )
+
+
+def drop_search_backend(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for table, _, _, _ in SEARCH_TABLES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_search_vector_gin")
+    elif vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0012_updated_at_timestamps"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gym",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="trainer",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_backend, drop_search_backend),
+    ]
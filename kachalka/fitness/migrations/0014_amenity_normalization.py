@@ -0,0 +1,99 @@
+# Generated manually: Gym.amenities из текстового поля в таблицу удобств
+
+from django.db import migrations, models
+
+
+def split_amenities(text):
+    """Разбить строку удобств (через запятую или с новой строки) на названия"""
+    names = {}
+    for part in (text or "").replace("\n", ",").split(","):
+        name = " ".join(part.split())
+        if name:
+            names.setdefault(name.casefold(), name)
+    return names
+
+
+def forwards(apps, schema_editor):
+    """Перенести удобства из строк в нормализованную таблицу"""
+    Gym = apps.get_model("fitness", "Gym")
+    Amenity = apps.get_model("fitness", "Amenity")
+
+    amenities = {}
+    for gym in Gym.objects.exclude(amenities_text__isnull=True).exclude(amenities_text=""):
+        links = []
+        for key, name in split_amenities(gym.amenities_text).items():
+            if key not in amenities:
+                amenities[key], _ = Amenity.objects.get_or_create(
+                    key=key, defaults={"name": name}
+                )
+            links.append(amenities[key])
+        gym.amenities.set(links)
+
+
+def backwards(apps, schema_editor):
+    """Собрать удобства обратно в строку через запятую"""
+    Gym = apps.get_model("fitness", "Gym")
+    for gym in Gym.objects.prefetch_related("amenities"):
+        gym.amenities_text = ", ".join(a.name for a in gym.amenities.all())
+        gym.save(update_fields=["amenities_text"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0013_full_text_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Amenity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, verbose_name="Название")),
+                (
+                    "key",
+                    models.CharField(
+                        editable=False,
+                        help_text="Название в нижнем регистре, используется для поиска и фильтрации",
+                        max_length=100,
+                        unique=True,
+                        verbose_name="Ключ",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Удобство",
+                "verbose_name_plural": "Удобства",
+                "db_table": "amenities",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.RenameField(
+            model_name="gym",
+            old_name="amenities",
+            new_name="amenities_text",
+        ),
+        migrations.AddField(
+            model_name="gym",
+            name="amenities",
+            field=models.ManyToManyField(
+                blank=True,
+                related_name="gyms",
+                to="fitness.amenity",
+                verbose_name="Удобства",
+            ),
+        ),
+        migrations.RunPython(forwards, backwards),
+        migrations.RemoveField(
+            model_name="gym",
+            name="amenities_text",
+        ),
+    ]
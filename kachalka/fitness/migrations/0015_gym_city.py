@@ -0,0 +1,43 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+def city_from_address(address):
+    """Город из адреса формата "улица, город" (та же логика, что Gym.city_from_address)"""
+    parts = (address or "").split(",")
+    if len(parts) < 2:
+        return ""
+    return " ".join(parts[-1].split())[:100]
+
+
+def backfill_city(apps, schema_editor):
+    """Заполнить город для существующих залов"""
+    Gym = apps.get_model("fitness", "Gym")
+    gyms = list(Gym.objects.only("id", "address"))
+    for gym in gyms:
+        gym.city = city_from_address(gym.address)
+    Gym.objects.bulk_update(gyms, ["city"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0014_amenity_normalization"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gym",
+            name="city",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text="Заполняется из адреса при сохранении (часть после последней запятой)",
+                max_length=100,
+                verbose_name="Город",
+            ),
+        ),
+        migrations.RunPython(backfill_city, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:21
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+# Длительность тренировки (Record.DURATION на момент миграции)
+DURATION = timedelta(minutes=90)
+DURATION_SQLITE = "-90 minutes"
+
+# (ограничение/триггер, поле владельца)
+OWNERS = [
+    ("trainer", "trainer_id"),
+    ("user", "user_id"),
+]
+
+
+def backfill_ends_at(apps, schema_editor):
+    Record = apps.get_model("fitness", "Record")
+    Record.objects.update(ends_at=F("datetime") + DURATION)
+
+
+# Сколько id конфликтующих записей показывать в сообщении об ошибке
+REPORTED_OVERLAPS = 50
+
+
+def check_existing_overlaps(schema_editor):
+    """
+    Двойные бронирования, созданные до ограничения, миграция не трогает: это данные
+    клиентов. Если они есть, миграция останавливается со списком записей - их нужно
+    разобрать командой find_booking_overlaps до повторного запуска migrate.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT records.id FROM records "
+            "WHERE records.status = 'scheduled' AND EXISTS ("
+            "SELECT 1 FROM records earlier WHERE earlier.status = 'scheduled' "
+            "AND earlier.id < records.id "
+            "AND (earlier.trainer_id = records.trainer_id OR earlier.user_id = records.user_id) "
+            "AND earlier.datetime < records.ends_at AND earlier.ends_at > records.datetime) "
+            "ORDER BY records.id"
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    if ids:
+        shown = ", ".join(str(record_id) for record_id in ids[:REPORTED_OVERLAPS])
+        more = (
+            f" и ещё {len(ids) - REPORTED_OVERLAPS}"
+            if len(ids) > REPORTED_OVERLAPS
+            else ""
+        )
+        raise RuntimeError(
+            f"Найдены пересекающиеся запланированные записи ({len(ids)}): {shown}{more}. "
+            "Просмотрите их командой `python manage.py find_booking_overlaps` и отмените "
+            "лишние (например, `find_booking_overlaps --cancel-later`), затем повторите migrate."
+        )
+
+
+def _sqlite_trigger_sql(event, owner, column):
+    exclude_self = "AND id <> NEW.id " if event == "update" else ""
+    timing = (
+        "BEFORE UPDATE OF datetime, ends_at, status, trainer_id, user_id"
+        if event == "update"
+        else "BEFORE INSERT"
+    )
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS records_{owner}_no_overlap_{event} "
+        f"{timing} ON records "
+        f"WHEN NEW.status = 'scheduled' AND EXISTS ("
+        f"SELECT 1 FROM records WHERE {column} = NEW.{column} AND status = 'scheduled' "
+        f"{exclude_self}"
+        f"AND datetime > datetime(NEW.datetime, '{DURATION_SQLITE}') "
+        f"AND datetime < NEW.ends_at AND ends_at > NEW.datetime) "
+        f"BEGIN SELECT RAISE(ABORT, 'records_{owner}_no_overlap'); END"
+    )
+
+
+def create_overlap_constraints(apps, schema_editor):
+    """GiST exclusion constraint в PostgreSQL или триггеры с тем же условием в SQLite"""
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        check_existing_overlaps(schema_editor)
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        for owner, column in OWNERS:
+            schema_editor.execute(
+                f"ALTER TABLE records ADD CONSTRAINT records_{owner}_no_overlap "
+                f"EXCLUDE USING gist ({column} WITH =, "
+                f"tstzrange(datetime, ends_at, '[)') WITH &&) "
+                f"WHERE (status = 'scheduled')"
+            )
+    elif vendor == "sqlite":
+        check_existing_overlaps(schema_editor)
+        for owner, column in OWNERS:
+            for event in ("insert", "update"):
+                schema_editor.execute(_sqlite_trigger_sql(event, owner, column))
+
+
+def drop_overlap_constraints(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for owner, _ in OWNERS:
+            schema_editor.execute(
+                f"ALTER TABLE records DROP CONSTRAINT IF EXISTS records_{owner}_no_overlap"
+            )
+    elif vendor == "sqlite":
+        for owner, _ in OWNERS:
+            for event in ("insert", "update"):
+                schema_editor.execute(
+                    f"DROP TRIGGER IF EXISTS records_{owner}_no_overlap_{event}"
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0015_gym_city"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="record",
+            name="ends_at",
+            field=models.DateTimeField(
+                editable=False,
+                help_text="Начало + длительность; пересечения запрещены на уровне БД",
+                null=True,
+                verbose_name="Окончание тренировки",
+            ),
+        ),
+        migrations.RunPython(backfill_ends_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="record",
+            name="ends_at",
+            field=models.DateTimeField(
+                editable=False,
+                help_text="Начало + длительность; пересечения запрещены на уровне БД",
+                verbose_name="Окончание тренировки",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="record",
+            index=models.Index(
+                fields=["trainer", "datetime"], name="records_trainer_adae6c_idx"
+            ),
+        ),
+        migrations.RunPython(create_overlap_constraints, drop_overlap_constraints),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0016_booking_intervals"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="record",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "scheduled")),
+                fields=("trainer", "datetime"),
+                name="records_trainer_slot_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0017_trainer_slot_unique"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="record",
+            index=models.Index(
+                condition=models.Q(("status", "scheduled")),
+                fields=["ends_at"],
+                name="records_scheduled_ends_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:25
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_sum(apps, schema_editor):
+    """Заполнить сумму и количество оценок и пересчитать рейтинг по существующим отзывам"""
+    Gym = apps.get_model("fitness", "Gym")
+    Trainer = apps.get_model("fitness", "Trainer")
+    Review = apps.get_model("fitness", "Review")
+    GymReview = apps.get_model("fitness", "GymReview")
+
+    for model, reviews, fk_name in (
+        (Gym, GymReview, "gym_id"),
+        (Trainer, Review, "trainer_id"),
+    ):
+        model.objects.update(reviews_count=0, rating_sum=0, rating=0)
+        stats = reviews.objects.values(fk_name).annotate(
+            count=Count("id"), total=Sum("rating")
+        )
+        for row in stats:
+            model.objects.filter(pk=row[fk_name]).update(
+                reviews_count=row["count"],
+                rating_sum=row["total"],
+                rating=round(row["total"] / row["count"], 2),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0018_record_effective_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gym",
+            name="rating_sum",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Сумма оценок"
+            ),
+        ),
+        migrations.AddField(
+            model_name="trainer",
+            name="rating_sum",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Сумма оценок"
+            ),
+        ),
+        migrations.RunPython(backfill_rating_sum, migrations.RunPython.noop),
+    ]
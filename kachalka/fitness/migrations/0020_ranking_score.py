@@ -0,0 +1,71 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast
+
+
+def backfill_ranking_score(apps, schema_editor):
+    """Посчитать байесовский рейтинг по уже накопленным количеству и сумме оценок"""
+    prior_mean = float(getattr(settings, "RANKING_PRIOR_MEAN", 4.0))
+    prior_weight = float(getattr(settings, "RANKING_PRIOR_WEIGHT", 5))
+    for model_name in ("Gym", "Trainer"):
+        apps.get_model("fitness", model_name).objects.update(
+            ranking_score=(
+                Cast(F("rating_sum"), models.FloatField()) + prior_weight * prior_mean
+            )
+            / (F("reviews_count") + prior_weight)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0019_rating_sum"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="gym",
+            name="gyms_rating_c89e47_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="trainer",
+            name="trainers_rating_ea67c2_idx",
+        ),
+        migrations.AddField(
+            model_name="gym",
+            name="ranking_score",
+            field=models.FloatField(
+                default=0.0,
+                editable=False,
+                help_text="Байесовская оценка: средний рейтинг, сглаженный к априорному (settings.RANKING_PRIOR_*)",
+                verbose_name="Рейтинг для сортировки",
+            ),
+        ),
+        migrations.AddField(
+            model_name="trainer",
+            name="ranking_score",
+            field=models.FloatField(
+                default=0.0,
+                editable=False,
+                help_text="Байесовская оценка: средний рейтинг, сглаженный к априорному (settings.RANKING_PRIOR_*)",
+                verbose_name="Рейтинг для сортировки",
+            ),
+        ),
+        migrations.RunPython(backfill_ranking_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="gym",
+            index=models.Index(
+                fields=["-ranking_score", "name", "id"], name="gyms_ranking_098f3d_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="trainer",
+            index=models.Index(
+                fields=["-ranking_score", "full_name", "id"],
+                name="trainers_ranking_1a53bc_idx",
+            ),
+        ),
+    ]
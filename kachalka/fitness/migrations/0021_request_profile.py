@@ -0,0 +1,94 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import fitness.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("fitness", "0020_ranking_score"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "url_name",
+                    models.CharField(
+                        db_index=True, max_length=200, verbose_name="Имя URL"
+                    ),
+                ),
+                ("method", models.CharField(max_length=10, verbose_name="Метод")),
+                ("path", models.CharField(max_length=2000, verbose_name="Путь")),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(
+                        null=True, verbose_name="Код ответа"
+                    ),
+                ),
+                (
+                    "trigger",
+                    models.CharField(
+                        choices=[
+                            ("manual", "По запросу сотрудника"),
+                            ("sampled", "Выборка по URL"),
+                        ],
+                        max_length=10,
+                        verbose_name="Источник",
+                    ),
+                ),
+                ("duration_ms", models.FloatField(verbose_name="Длительность, мс")),
+                ("interval_ms", models.FloatField(verbose_name="Интервал выборки, мс")),
+                (
+                    "samples",
+                    models.PositiveIntegerField(verbose_name="Количество выборок"),
+                ),
+                (
+                    "file",
+                    models.FileField(
+                        help_text="Свёрнутые стеки (формат flamegraph.pl / speedscope)",
+                        storage=fitness.models.profiles_storage,
+                        upload_to="%Y/%m/%d/",
+                        verbose_name="Файл профиля",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="request_profiles",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Профиль запроса",
+                "verbose_name_plural": "Профили запросов",
+                "db_table": "request_profiles",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
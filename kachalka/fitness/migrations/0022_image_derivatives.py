@@ -0,0 +1,72 @@
+# Generated by Django 4.2.26 on 2026-10-18 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fitness", "0021_request_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gym",
+            name="main_image_variants",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Копия GymImage.variants первого изображения (см. fitness.images)",
+                verbose_name="Производные главного изображения",
+            ),
+        ),
+        migrations.AddField(
+            model_name="gymimage",
+            name="height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Высота"
+            ),
+        ),
+        migrations.AddField(
+            model_name="gymimage",
+            name="variants",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                verbose_name="Производные изображения",
+            ),
+        ),
+        migrations.AddField(
+            model_name="gymimage",
+            name="width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Ширина"
+            ),
+        ),
+        migrations.AddField(
+            model_name="trainer",
+            name="image_height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Высота фото"
+            ),
+        ),
+        migrations.AddField(
+            model_name="trainer",
+            name="image_variants",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                verbose_name="Производные фото",
+            ),
+        ),
+        migrations.AddField(
+            model_name="trainer",
+            name="image_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Ширина фото"
+            ),
+        ),
+    ]
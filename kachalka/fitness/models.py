@@ -1,8 +1,29 @@
+from django.conf import settings
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.core.files.storage import FileSystemStorage
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User as DjangoUser
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
+from django.utils import timezone
+from datetime import timedelta
+
+
+class LoadedValuesMixin:
+    """Запоминает значения полей, загруженные из БД, чтобы сигналы видели изменения"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def loaded_value(self, field_name):
+        """Значение поля на момент загрузки из БД (None для новых объектов)"""
+        return getattr(self, '_loaded_values', {}).get(field_name)
 
 
 class UserProfile(models.Model):
@@ -75,13 +96,78 @@ def save_user_profile(sender, instance, **kwargs):
         instance.profile.save()
 
 
+class Amenity(models.Model):
+    """Удобство зала (бассейн, сауна, парковка...)"""
+    name = models.CharField(max_length=100, verbose_name="Название")
+    key = models.CharField(
+        max_length=100,
+        unique=True,
+        editable=False,
+        verbose_name="Ключ",
+        help_text="Название в нижнем регистре, используется для поиска и фильтрации"
+    )
+
+    class Meta:
+        db_table = 'amenities'
+        verbose_name = "Удобство"
+        verbose_name_plural = "Удобства"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def normalize(name):
+        """Ключ удобства: без лишних пробелов и без учёта регистра"""
+        return ' '.join(name.split()).casefold()
+
+    @classmethod
+    def parse(cls, text):
+        """Разбить строку удобств (через запятую или с новой строки) на названия"""
+        names = {}
+        for part in (text or '').replace('\n', ',').split(','):
+            name = ' '.join(part.split())
+            if name:
+                names.setdefault(cls.normalize(name), name)
+        return list(names.values())
+
+    @classmethod
+    def get_or_create_many(cls, names):
+        """Найти или создать удобства по названиям (без учёта регистра)"""
+        by_key = {cls.normalize(name): name for name in names}
+        existing = {amenity.key: amenity for amenity in cls.objects.filter(key__in=by_key)}
+        missing = [cls(name=name, key=key) for key, name in by_key.items() if key not in existing]
+        if missing:
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+            existing = {amenity.key: amenity for amenity in cls.objects.filter(key__in=by_key)}
+        return [existing[key] for key in by_key]
+
+    def save(self, *args, **kwargs):
+        self.key = self.normalize(self.name)
+        super().save(*args, **kwargs)
+
+
 class Gym(models.Model):
     """Модель спортивного зала"""
     name = models.CharField(max_length=255, verbose_name="Название")
     address = models.CharField(max_length=500, verbose_name="Адрес")
+    city = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        editable=False,
+        verbose_name="Город",
+        help_text="Заполняется из адреса при сохранении (часть после последней запятой)"
+    )
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
-    amenities = models.TextField(blank=True, null=True, verbose_name="Удобства")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+    amenities = models.ManyToManyField(
+        Amenity,
+        related_name='gyms',
+        verbose_name="Удобства",
+        blank=True
+    )
     rating = models.DecimalField(
         max_digits=3,
         decimal_places=2,
@@ -89,22 +175,87 @@ class Gym(models.Model):
         verbose_name="Средний рейтинг",
         help_text="Среднее арифметическое всех оценок"
     )
+    # Денормализованные счётчики, поддерживаются сигналами ниже
+    reviews_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество отзывов")
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Сумма оценок")
+    ranking_score = models.FloatField(
+        default=0.0,
+        editable=False,
+        verbose_name="Рейтинг для сортировки",
+        help_text="Байесовская оценка: средний рейтинг, сглаженный к априорному (settings.RANKING_PRIOR_*)"
+    )
+    trainers_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество тренеров")
+    images_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество фото")
+    main_image = models.ImageField(
+        upload_to='gyms/',
+        blank=True,
+        editable=False,
+        verbose_name="Главное изображение",
+        help_text="Первое по порядку изображение зала"
+    )
+    main_image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Производные главного изображения",
+        help_text="Копия GymImage.variants первого изображения (см. fitness.images)"
+    )
+    # Поисковый индекс (PostgreSQL), поддерживается fitness.search
+    search_vector = SearchVectorField(null=True, editable=False)
     
     class Meta:
         db_table = 'gyms'
         verbose_name = "Спортивный зал"
         verbose_name_plural = "Спортивные залы"
         ordering = ['name']
+        indexes = [
+            # Ключи keyset-пагинации списка залов
+            models.Index(fields=['name', 'id']),
+            # Топ залов и сортировка по рейтингу: ORDER BY ranking_score DESC ... LIMIT по индексу
+            models.Index(fields=['-ranking_score', 'name', 'id']),
+        ]
 
     def __str__(self):
         return self.name
+
+    @staticmethod
+    def city_from_address(address):
+        """Город из адреса формата "улица, город" (пустая строка, если запятой нет)"""
+        parts = (address or '').split(',')
+        if len(parts) < 2:
+            return ''
+        return ' '.join(parts[-1].split())[:100]
+
+    def save(self, *args, **kwargs):
+        self.city = self.city_from_address(self.address)
+        if self._state.adding:
+            # Без отзывов рейтинг для сортировки равен априорному, а не 0
+            self.ranking_score = ranking_score(self.reviews_count, self.rating_sum)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'address' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'city'}
+        super().save(*args, **kwargs)
     
     def update_rating(self):
-        """Обновить средний рейтинг на основе отзывов"""
-        from django.db.models import Avg
-        avg_rating = self.gym_reviews.aggregate(Avg('rating'))['rating__avg']
-        self.rating = round(avg_rating, 2) if avg_rating else 0.00
-        self.save(update_fields=['rating'])
+        """
+        Полностью пересчитать количество, сумму оценок и рейтинг по отзывам.
+        При обычной работе они поддерживаются сигналами за O(1); метод нужен для восстановления.
+        """
+        _recount_rating(self, self.gym_reviews.all())
+
+    @classmethod
+    def refresh_counters(cls, gym_ids):
+        """Пересчитать счётчики тренеров, изображений и главное фото для указанных залов"""
+        for gym_id in set(gym_ids):
+            images = GymImage.objects.filter(gym_id=gym_id).order_by('order', 'id')
+            first_image = images.first()
+            cls.objects.filter(pk=gym_id).update(
+                trainers_count=Trainer.gyms.through.objects.filter(gym_id=gym_id).count(),
+                images_count=images.count(),
+                main_image=first_image.image.name if first_image else '',
+                main_image_variants=first_image.variants if first_image else {},
+                updated_at=timezone.now(),
+            )
 
 
 class GymImage(models.Model):
@@ -116,6 +267,10 @@ class GymImage(models.Model):
         verbose_name="Спортивный зал"
     )
     image = models.ImageField(upload_to='gyms/', verbose_name="Изображение")
+    # Размеры оригинала и уменьшенные копии для srcset, заполняются fitness.images
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Ширина")
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Высота")
+    variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Производные изображения")
     order = models.PositiveIntegerField(default=0, verbose_name="Порядок отображения")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
 
@@ -134,6 +289,10 @@ class Trainer(models.Model):
     full_name = models.CharField(max_length=255, verbose_name="Полное имя")
     specialization = models.CharField(max_length=255, verbose_name="Специализация", db_index=True)
     image = models.ImageField(upload_to='trainers/', blank=True, null=True, verbose_name="Фото тренера")
+    # Размеры оригинала и уменьшенные копии для srcset, заполняются fitness.images
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Ширина фото")
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Высота фото")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name="Производные фото")
     description = models.TextField(blank=True, null=True, verbose_name="Описание")
     rating = models.DecimalField(
         max_digits=3,
@@ -148,7 +307,18 @@ class Trainer(models.Model):
         verbose_name="Спортивные залы",
         blank=True
     )
+    reviews_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество отзывов")
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Сумма оценок")
+    ranking_score = models.FloatField(
+        default=0.0,
+        editable=False,
+        verbose_name="Рейтинг для сортировки",
+        help_text="Байесовская оценка: средний рейтинг, сглаженный к априорному (settings.RANKING_PRIOR_*)"
+    )
+    # Поисковый индекс (PostgreSQL), поддерживается fitness.search
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
     class Meta:
         db_table = 'trainers'
@@ -157,26 +327,40 @@ class Trainer(models.Model):
         ordering = ['full_name']
         indexes = [
             models.Index(fields=['specialization']),
+            # Ключи keyset-пагинации списка тренеров
+            models.Index(fields=['full_name', 'id']),
+            # Топ тренеров и сортировка по рейтингу: ORDER BY ranking_score DESC ... LIMIT по индексу
+            models.Index(fields=['-ranking_score', 'full_name', 'id']),
         ]
 
     def __str__(self):
         return f"{self.full_name} - {self.specialization}"
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            # Без отзывов рейтинг для сортировки равен априорному, а не 0
+            self.ranking_score = ranking_score(self.reviews_count, self.rating_sum)
+        super().save(*args, **kwargs)
     
     def update_rating(self):
-        """Обновить средний рейтинг на основе отзывов"""
-        from django.db.models import Avg
-        avg_rating = self.reviews.aggregate(Avg('rating'))['rating__avg']
-        self.rating = round(avg_rating, 2) if avg_rating else 0.00
-        self.save(update_fields=['rating'])
+        """
+        Полностью пересчитать количество, сумму оценок и рейтинг по отзывам.
+        При обычной работе они поддерживаются сигналами за O(1); метод нужен для восстановления.
+        """
+        _recount_rating(self, self.reviews.all())
 
 
-class Record(models.Model):
+class Record(LoadedValuesMixin, models.Model):
     """Модель записи на тренировку"""
     STATUS_CHOICES = [
         ('scheduled', 'Назначена'),
         ('cancelled', 'Отменена'),
         ('completed', 'Завершена'),
     ]
+    # Статусы, при которых запись занимает время тренера и пользователя
+    ACTIVE_STATUSES = ('scheduled',)
+    # Длительность тренировки (совпадает с шагом сетки слотов)
+    DURATION = timedelta(minutes=90)
 
     user = models.ForeignKey(
         UserProfile,
@@ -193,6 +377,11 @@ class Record(models.Model):
         db_index=True
     )
     datetime = models.DateTimeField(verbose_name="Дата и время тренировки")
+    ends_at = models.DateTimeField(
+        editable=False,
+        verbose_name="Окончание тренировки",
+        help_text="Начало + длительность; пересечения запрещены на уровне БД"
+    )
     status = models.CharField(
         max_length=20,
         choices=STATUS_CHOICES,
@@ -200,6 +389,7 @@ class Record(models.Model):
         verbose_name="Статус"
     )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
     class Meta:
         db_table = 'records'
@@ -211,10 +401,104 @@ class Record(models.Model):
             models.Index(fields=['trainer']),
             models.Index(fields=['datetime']),
             models.Index(fields=['status']),
+            # Ключи keyset-пагинации списка записей
+            models.Index(fields=['-datetime', '-id']),
+            models.Index(fields=['user', '-datetime', '-id']),
+            # Поиск пересечений по тренеру: диапазон datetime ограничен длительностью
+            models.Index(fields=['trainer', 'datetime']),
+            # Фоновый перевод закончившихся тренировок в 'completed'
+            models.Index(
+                fields=['ends_at'],
+                condition=models.Q(status='scheduled'),
+                name='records_scheduled_ends_idx',
+            ),
+        ]
+        constraints = [
+            # Один активный слот тренера на время начала: дешёвая проверка дублей при гонках
+            models.UniqueConstraint(
+                fields=['trainer', 'datetime'],
+                condition=models.Q(status='scheduled'),
+                name='records_trainer_slot_unique',
+            ),
         ]
 
     def __str__(self):
         return f"{self.user.full_name} -> {self.trainer.full_name} ({self.datetime.strftime('%d.%m.%Y %H:%M')})"
+
+    def save(self, *args, **kwargs):
+        if self.datetime:
+            self.ends_at = self.datetime + self.DURATION
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'datetime' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'ends_at'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def overlapping(cls, start, end=None):
+        """
+        Активные записи, пересекающиеся с интервалом [start, end) (по умолчанию - одна тренировка).
+        Все записи одной длительности, поэтому условие по datetime ограничивает
+        просмотр индекса отрезком длиной DURATION + (end - start).
+        """
+        end = end or start + cls.DURATION
+        return cls.objects.filter(
+            status__in=cls.ACTIVE_STATUSES,
+            datetime__gt=start - cls.DURATION,
+            datetime__lt=end,
+            ends_at__gt=start,
+        )
+
+    @classmethod
+    def with_effective_status(cls, queryset, now=None):
+        """
+        Аннотация effective_status: назначенная тренировка, которая уже закончилась
+        (ends_at <= now), считается завершённой, даже если фоновая задача ещё не
+        обновила статус в базе. Чтение ничего не записывает.
+        """
+        now = now or timezone.now()
+        return queryset.annotate(effective_status=models.Case(
+            models.When(status='scheduled', ends_at__lte=now, then=models.Value('completed')),
+            default=F('status'),
+            output_field=models.CharField(),
+        ))
+
+    @classmethod
+    def effective_status_filter(cls, status, now=None):
+        """Условие 'фактический статус равен status', использующее индексы по status и ends_at"""
+        now = now or timezone.now()
+        if status == 'scheduled':
+            return models.Q(status='scheduled', ends_at__gt=now)
+        if status == 'completed':
+            return models.Q(status='completed') | models.Q(status='scheduled', ends_at__lte=now)
+        return models.Q(status=status)
+
+    def get_effective_status(self, now=None):
+        """Фактический статус (из аннотации with_effective_status, если она есть)"""
+        if hasattr(self, 'effective_status'):
+            return self.effective_status
+        if self.status == 'scheduled' and self.ends_at <= (now or timezone.now()):
+            return 'completed'
+        return self.status
+
+    def get_effective_status_display(self):
+        return dict(self.STATUS_CHOICES).get(self.get_effective_status())
+
+    @classmethod
+    def complete_finished(cls, now=None, chunk_size=1000):
+        """
+        Перевести закончившиеся назначенные тренировки в 'completed' пачками по chunk_size
+        (одним UPDATE на пачку, короткие транзакции). Возвращает количество обновлённых записей.
+        """
+        now = now or timezone.now()
+        finished = cls.objects.filter(status='scheduled', ends_at__lte=now)
+        updated = 0
+        while True:
+            ids = list(finished.order_by('ends_at', 'id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return updated
+            updated += cls.objects.filter(id__in=ids, status='scheduled').update(
+                status='completed', updated_at=now
+            )
     
     def can_cancel(self):
         """Проверить, можно ли отменить тренировку"""
@@ -225,26 +509,22 @@ class Record(models.Model):
         """Отменить тренировку"""
         if self.can_cancel():
             self.status = 'cancelled'
-            self.save(update_fields=['status'])
+            self.save(update_fields=['status', 'updated_at'])
             return True
         return False
     
     def update_status(self):
-        """Автоматически обновить статус тренировки"""
-        from django.utils import timezone
-        from datetime import timedelta
-        
+        """Автоматически обновить статус тренировки (для массового обновления - complete_finished)"""
         if self.status == 'scheduled':
-            # Если прошло 1.5 часа после начала тренировки, она завершена
-            training_end_time = self.datetime + timedelta(hours=1, minutes=30)
-            if timezone.now() >= training_end_time:
+            # Если тренировка закончилась (прошло DURATION после начала), она завершена
+            if timezone.now() >= self.datetime + self.DURATION:
                 self.status = 'completed'
-                self.save(update_fields=['status'])
+                self.save(update_fields=['status', 'updated_at'])
                 return True
         return False
 
 
-class Review(models.Model):
+class Review(LoadedValuesMixin, models.Model):
     """Модель отзыва на тренера"""
     user = models.ForeignKey(
         UserProfile,
@@ -276,13 +556,16 @@ class Review(models.Model):
         indexes = [
             models.Index(fields=['trainer']),
             models.Index(fields=['rating']),
+            # Ключи keyset-пагинации списка отзывов
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['trainer', '-created_at', '-id']),
         ]
 
     def __str__(self):
         return f"Отзыв от {self.user.full_name} на {self.trainer.full_name} ({self.rating}/5)"
 
 
-class GymReview(models.Model):
+class GymReview(LoadedValuesMixin, models.Model):
     """Модель отзыва на зал"""
     user = models.ForeignKey(
         UserProfile,
@@ -318,3 +601,234 @@ class GymReview(models.Model):
 
     def __str__(self):
         return f"Отзыв от {self.user.full_name} на {self.gym.name} ({self.rating}/5)"
+
+
+def profiles_storage():
+    """Хранилище профилей вне MEDIA_ROOT: файлы отдаются только через админку"""
+    return FileSystemStorage(location=settings.PROFILING_ROOT)
+
+
+class RequestProfile(models.Model):
+    """Статистический профиль одного запроса API (fitness.profiling)"""
+    TRIGGER_CHOICES = [
+        ('manual', 'По запросу сотрудника'),
+        ('sampled', 'Выборка по URL'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата создания")
+    url_name = models.CharField(max_length=200, db_index=True, verbose_name="Имя URL")
+    method = models.CharField(max_length=10, verbose_name="Метод")
+    path = models.CharField(max_length=2000, verbose_name="Путь")
+    status_code = models.PositiveSmallIntegerField(null=True, verbose_name="Код ответа")
+    user = models.ForeignKey(
+        DjangoUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='request_profiles',
+        verbose_name="Пользователь"
+    )
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES, verbose_name="Источник")
+    duration_ms = models.FloatField(verbose_name="Длительность, мс")
+    interval_ms = models.FloatField(verbose_name="Интервал выборки, мс")
+    samples = models.PositiveIntegerField(verbose_name="Количество выборок")
+    file = models.FileField(
+        storage=profiles_storage,
+        upload_to='%Y/%m/%d/',
+        verbose_name="Файл профиля",
+        help_text="Свёрнутые стеки (формат flamegraph.pl / speedscope)"
+    )
+
+    class Meta:
+        db_table = 'request_profiles'
+        verbose_name = "Профиль запроса"
+        verbose_name_plural = "Профили запросов"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.url_name} {self.method} ({self.duration_ms:.0f} мс, {self.created_at:%d.%m.%Y %H:%M})"
+
+
+# ==================== Поддержка денормализованных счётчиков ====================
+
+def ranking_prior():
+    """(априорная средняя оценка, вес априорной оценки в отзывах) из настроек"""
+    return (
+        float(getattr(settings, 'RANKING_PRIOR_MEAN', 4.0)),
+        float(getattr(settings, 'RANKING_PRIOR_WEIGHT', 5)),
+    )
+
+
+def ranking_score(count, total):
+    """Байесовский рейтинг для уже известных количества и суммы оценок (см. ranking_score_expression)"""
+    prior_mean, prior_weight = ranking_prior()
+    return (total + prior_weight * prior_mean) / (count + prior_weight)
+
+
+def ranking_score_expression(count, total):
+    """
+    Байесовский рейтинг (prior_weight * prior_mean + сумма) / (prior_weight + количество):
+    у тренера с одним отзывом «5» он близок к априорному, а с сотнями отзывов - к среднему
+    """
+    prior_mean, prior_weight = ranking_prior()
+    return (Cast(total, models.FloatField()) + prior_weight * prior_mean) / (count + prior_weight)
+
+
+def _rating_delta(count_delta, sum_delta):
+    """
+    Поля UPDATE, сдвигающие количество и сумму оценок на дельты и пересчитывающие
+    средний и байесовский рейтинги в том же запросе (в SET используются значения до обновления)
+    """
+    count = F('reviews_count') + count_delta
+    total = F('rating_sum') + sum_delta
+    average = Round(Cast(total, models.FloatField()) / NullIf(count, 0), 2)
+    return {
+        'reviews_count': count,
+        'rating_sum': total,
+        'rating': Cast(Coalesce(average, 0.0), models.DecimalField(max_digits=3, decimal_places=2)),
+        'ranking_score': ranking_score_expression(count, total),
+        'updated_at': timezone.now(),
+    }
+
+
+def _recount_rating(owner, reviews):
+    """Пересчитать рейтинг владельца отзывов агрегатом по всем отзывам"""
+    stats = reviews.aggregate(count=models.Count('id'), total=models.Sum('rating'))
+    owner.reviews_count = stats['count']
+    owner.rating_sum = stats['total'] or 0
+    owner.rating = round(owner.rating_sum / owner.reviews_count, 2) if owner.reviews_count else 0.00
+    owner.ranking_score = ranking_score(owner.reviews_count, owner.rating_sum)
+    owner.save(update_fields=['reviews_count', 'rating_sum', 'rating', 'ranking_score', 'updated_at'])
+
+
+def refresh_ranking_scores(model):
+    """Пересчитать ranking_score всех строк одним UPDATE (после изменения априорных настроек)"""
+    return model.objects.update(
+        ranking_score=ranking_score_expression(F('reviews_count'), F('rating_sum'))
+    )
+
+
+def _move_review_rating(model, instance, created, fk_name):
+    """
+    Атомарно (F-выражениями) учесть отзыв в рейтинге: создание, смена оценки
+    или перенос отзыва к другому тренеру/залу. O(1) независимо от числа отзывов.
+    """
+    attname = f'{fk_name}_id'
+    new_id = getattr(instance, attname)
+    old_id = None if created else instance.loaded_value(attname)
+    old_rating = None if created else instance.loaded_value('rating')
+
+    if created:
+        model.objects.filter(pk=new_id).update(**_rating_delta(1, instance.rating))
+    elif old_id is not None and old_id != new_id:
+        model.objects.filter(pk=old_id).update(**_rating_delta(-1, -(old_rating or 0)))
+        model.objects.filter(pk=new_id).update(**_rating_delta(1, instance.rating))
+    elif old_rating is not None and old_rating != instance.rating:
+        model.objects.filter(pk=new_id).update(**_rating_delta(0, instance.rating - old_rating))
+
+    instance._loaded_values = {
+        **getattr(instance, '_loaded_values', {}),
+        attname: new_id,
+        'rating': instance.rating,
+    }
+
+
+def _removed_rating(instance):
+    """Оценка удалённого отзыва в том виде, в каком она была в базе"""
+    loaded = instance.loaded_value('rating')
+    return instance.rating if loaded is None else loaded
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    """Обновить счётчик отзывов и рейтинг тренера"""
+    _move_review_rating(Trainer, instance, created, 'trainer')
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Убрать отзыв из счётчика и рейтинга тренера"""
+    Trainer.objects.filter(pk=instance.trainer_id).update(**_rating_delta(-1, -_removed_rating(instance)))
+
+
+@receiver(post_save, sender=GymReview)
+def gym_review_saved(sender, instance, created, **kwargs):
+    """Обновить счётчик отзывов и рейтинг зала"""
+    _move_review_rating(Gym, instance, created, 'gym')
+
+
+@receiver(post_delete, sender=GymReview)
+def gym_review_deleted(sender, instance, **kwargs):
+    """Убрать отзыв из счётчика и рейтинга зала"""
+    Gym.objects.filter(pk=instance.gym_id).update(**_rating_delta(-1, -_removed_rating(instance)))
+
+
+@receiver(post_save, sender=GymImage)
+@receiver(post_delete, sender=GymImage)
+def gym_image_changed(sender, instance, **kwargs):
+    """Пересчитать количество фото и главное изображение зала"""
+    Gym.refresh_counters([instance.gym_id])
+
+
+@receiver(m2m_changed, sender=Trainer.gyms.through)
+def trainer_gyms_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчитать количество тренеров в затронутых залах"""
+    if action == 'pre_clear':
+        # После очистки связей уже не узнать, какие залы и тренеры были затронуты
+        if reverse:
+            instance._cleared_gym_ids = [instance.pk]
+            instance._cleared_trainer_ids = list(instance.trainers.values_list('pk', flat=True))
+        else:
+            instance._cleared_gym_ids = list(instance.gyms.values_list('pk', flat=True))
+            instance._cleared_trainer_ids = [instance.pk]
+        return
+
+    if action == 'post_clear':
+        gym_ids = getattr(instance, '_cleared_gym_ids', [])
+        trainer_ids = getattr(instance, '_cleared_trainer_ids', [])
+    elif action in ('post_add', 'post_remove'):
+        gym_ids = [instance.pk] if reverse else pk_set
+        trainer_ids = pk_set if reverse else [instance.pk]
+    else:
+        return
+
+    Gym.refresh_counters(gym_ids)
+    # Список залов входит в карточку тренера, поэтому отмечаем тренеров изменёнными
+    Trainer.objects.filter(pk__in=trainer_ids).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Gym.amenities.through)
+def gym_amenities_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Отметить залы изменёнными при смене набора удобств"""
+    if action == 'pre_clear' and reverse:
+        instance._cleared_gym_ids = list(instance.gyms.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        gym_ids = [instance.pk]
+    elif action == 'post_clear':
+        gym_ids = getattr(instance, '_cleared_gym_ids', [])
+    else:
+        gym_ids = pk_set
+    Gym.objects.filter(pk__in=gym_ids).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Trainer)
+def trainer_pre_delete(sender, instance, **kwargs):
+    """Запомнить залы тренера: связи удаляются каскадом без m2m_changed"""
+    instance._deleted_gym_ids = list(instance.gyms.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Trainer)
+def trainer_deleted(sender, instance, **kwargs):
+    """Пересчитать количество тренеров в залах удалённого тренера"""
+    Gym.refresh_counters(getattr(instance, '_deleted_gym_ids', []))
+
+
+@receiver(post_delete, sender=RequestProfile)
+def request_profile_deleted(sender, instance, **kwargs):
+    """Удалить файл профиля вместе с записью"""
+    if instance.file:
+        instance.file.delete(save=False)
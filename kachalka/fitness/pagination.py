@@ -0,0 +1,143 @@
+"""
+Keyset (cursor) пагинация для списковых API.
+
+Вместо OFFSET и полного COUNT(*) следующая страница выбирается условием
+"строго после последней строки" по ключам сортировки, поэтому запрос
+использует индекс и работает одинаково быстро на любой глубине списка.
+Курсор непрозрачен для клиента: это base64 от JSON с ключами последней строки.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class CursorError(ValueError):
+    """Некорректный курсор или лимит в параметрах запроса"""
+
+
+def _encode_value(value):
+    """Приводит значение ключа сортировки к JSON-совместимому виду"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(ordering, values):
+    """Кодирует ключи последней строки страницы в непрозрачный курсор"""
+    payload = {
+        'o': ','.join(ordering),
+        'v': [_encode_value(value) for value in values],
+    }
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, ordering):
+    """Декодирует курсор и проверяет, что он выдан для той же сортировки"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = payload['v']
+        cursor_ordering = payload['o']
+    except (ValueError, TypeError, KeyError):
+        raise CursorError('Некорректный курсор')
+
+    if cursor_ordering != ','.join(ordering) or not isinstance(values, list) \
+            or len(values) != len(ordering):
+        raise CursorError('Курсор не соответствует параметрам сортировки')
+
+    return values
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    """Разбирает параметр limit с ограничением сверху MAX_LIMIT"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise CursorError('Параметр limit должен быть целым числом')
+    if limit < 1:
+        raise CursorError('Параметр limit должен быть положительным')
+    return min(limit, MAX_LIMIT)
+
+
+def _after_filter(ordering, values):
+    """
+    Строит условие "строка идёт после курсора" для составного ключа.
+    Для ('-rating', 'name', 'id') это:
+        rating < r OR (rating = r AND name > n) OR (rating = r AND name = n AND id > i)
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def with_tiebreaker(ordering):
+    """Добавляет уникальный id в конец сортировки, чтобы ключ был однозначным"""
+    ordering = tuple(ordering)
+    if ordering and ordering[-1].lstrip('-') in ('id', 'pk'):
+        return ordering
+    direction = '-' if ordering and ordering[-1].startswith('-') else ''
+    return ordering + (f'{direction}id',)
+
+
+def _key_field(queryset, name):
+    """Поле модели или аннотации (например, search_rank) для ключа сортировки"""
+    if name in queryset.query.annotations:
+        return queryset.query.annotations[name].output_field
+    return queryset.model._meta.get_field(queryset.model._meta.pk.name if name == 'pk' else name)
+
+
+def _cursor_values(queryset, ordering, values):
+    """Приводит значения из курсора к типам полей; неподходящие значения - CursorError, а не 500"""
+    try:
+        return [
+            None if value is None else _key_field(queryset, field.lstrip('-')).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        raise CursorError('Некорректный курсор')
+
+
+def paginate_keyset(queryset, ordering, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Возвращает (objects, next_cursor) для одной страницы queryset.
+
+    ordering - ключи сортировки в нотации order_by; к ним добавляется id.
+    Выбирается limit + 1 строка: лишняя строка лишь сигнализирует,
+    что следующая страница существует, и в ответ не попадает.
+    """
+    ordering = with_tiebreaker(ordering)
+    queryset = queryset.order_by(*ordering)
+
+    if cursor:
+        values = _cursor_values(queryset, ordering, decode_cursor(cursor, ordering))
+        queryset = queryset.filter(_after_filter(ordering, values))
+
+    objects = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        last = objects[-1]
+        next_cursor = encode_cursor(
+            ordering,
+            [getattr(last, field.lstrip('-')) for field in ordering],
+        )
+
+    return objects, next_cursor
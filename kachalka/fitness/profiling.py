@@ -0,0 +1,156 @@
+"""
+Статистический профайлер запросов API по требованию.
+
+Профиль снимается, если:
+- сотрудник (is_staff) прислал заголовок X-Profile: 1 или параметр ?_profile=1;
+- запрос попал в выборку settings.PROFILING_SAMPLE_RATES для своего имени URL.
+
+На время view запускается поток, который раз в PROFILING_INTERVAL_MS снимает стек
+потока запроса (sys._current_frames). Стеки сохраняются в формате свёрнутых стеков
+("a;b;c 12" - формат flamegraph.pl, открывается в speedscope.app) как RequestProfile
+и доступны в админке; id профиля возвращается в заголовке X-Profile-Id.
+
+Интервал меньше sys.getswitchinterval() (5 мс по умолчанию) не даёт более частых
+выборок: потоку профайлера нужен GIL. Если профиль не снимается, middleware стоит
+одно обращение к словарю настроек на запрос.
+"""
+import logging
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .models import RequestProfile
+
+
+logger = logging.getLogger('fitness.profiling')
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+
+_PATH_PREFIXES = sorted(
+    {os.path.join(str(settings.BASE_DIR), ''), os.path.join(sysconfig.get_paths()['stdlib'], '')}
+    | {os.path.join(path, '') for path in sys.path if path and path.endswith('-packages')},
+    key=len,
+    reverse=True,
+)
+
+
+def _short_path(filename):
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+class StackSampler(threading.Thread):
+    """Поток, периодически снимающий стек указанного потока"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='fitness-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._finished = threading.Event()
+
+    def run(self):
+        while not self._finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self._finished.is_set():
+                # Поток запроса уже ждёт остановки профайлера - это не время view
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._finished.set()
+        self.join()
+
+    def folded(self):
+        """Свёрнутые стеки: строка "корень;...;лист количество" на каждый уникальный стек"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _trigger(request, url_name):
+    """'manual', 'sampled' или None - снимать ли профиль запроса"""
+    if request.META.get(PROFILE_HEADER) == '1' or request.GET.get(PROFILE_PARAM) == '1':
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_active and user.is_staff:
+            return 'manual'
+    rate = settings.PROFILING_SAMPLE_RATES.get(url_name)
+    if rate and random.random() < rate:
+        return 'sampled'
+    return None
+
+
+class ProfilingMiddleware:
+    """Снимает профиль view для запросов сотрудников с флагом и для выборки по URL"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        sampler = getattr(request, '_profile_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            profile = self._save(request, response, sampler)
+            if profile is not None:
+                response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            return None
+        url_name = request.resolver_match.view_name if request.resolver_match else ''
+        trigger = _trigger(request, url_name)
+        if trigger is None:
+            return None
+        sampler = StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL_MS / 1000)
+        request._profile_sampler = sampler
+        request._profile_trigger = trigger
+        request._profile_started = time.perf_counter()
+        sampler.start()
+        return None
+
+    @staticmethod
+    def _save(request, response, sampler):
+        duration_ms = (time.perf_counter() - request._profile_started) * 1000
+        url_name = request.resolver_match.view_name if request.resolver_match else '-'
+        user = getattr(request, 'user', None)
+        try:
+            profile = RequestProfile(
+                url_name=url_name,
+                method=request.method,
+                path=request.get_full_path()[:2000],
+                status_code=response.status_code,
+                user=user if user is not None and user.is_authenticated else None,
+                trigger=request._profile_trigger,
+                duration_ms=duration_ms,
+                interval_ms=sampler.interval * 1000,
+                samples=sampler.samples,
+            )
+            filename = f'{time.strftime("%H%M%S")}_{url_name.replace(":", "_")}.folded'
+            profile.file.save(filename, ContentFile(sampler.folded().encode('utf-8')), save=False)
+            profile.save()
+        except Exception:
+            # Профиль - вспомогательная информация, ответ пользователю важнее
+            logger.exception('Не удалось сохранить профиль запроса %s', request.path)
+            return None
+        logger.info(
+            'Профиль %s: %s %s, %.1f мс, %s выборок',
+            profile.pk, url_name, request.method, duration_ms, sampler.samples,
+        )
+        return profile
@@ -0,0 +1,196 @@
+"""
+Полнотекстовый поиск по залам и тренерам.
+
+PostgreSQL: колонка search_vector (tsvector со стеммингом 'russian') + GIN-индекс,
+поиск через websearch_to_tsquery и сортировка по ts_rank.
+SQLite (локальная разработка): виртуальная таблица FTS5 с ранжированием bm25 и
+префиксным поиском по усечённым словоформам вместо настоящего стемминга.
+
+Индекс обновляется при сохранении объекта (сигналы post_save/post_delete),
+полная перестройка - командой `python manage.py rebuild_search_index`.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import DatabaseError, connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+from django.db.models.signals import post_save, post_delete
+
+from .models import Gym, Trainer
+
+
+SEARCH_CONFIG = 'russian'
+
+# Поля, попадающие в поисковый индекс: (поле, вес). Вес 'A' - основное поле.
+SEARCH_FIELDS = {
+    Gym: (('name', 'A'), ('address', 'B')),
+    Trainer: (('full_name', 'A'), ('specialization', 'B')),
+}
+
+# Поиск по подстроке, если полнотекстовый индекс недоступен
+FALLBACK_LOOKUPS = {
+    Gym: ('name', 'address'),
+    Trainer: ('full_name',),
+}
+
+SQLITE_TABLE = 'fitness_search_index'
+
+# Максимум совпадений, которые SQLite-fallback передаёт в основной запрос
+SQLITE_MAX_MATCHES = 1000
+
+_RUSSIAN_ENDINGS = sorted([
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ов', 'ев', 'ей', 'ий', 'ый', 'ой',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'а', 'я', 'о', 'е',
+    'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+
+
+def _vendor(queryset):
+    return connections[queryset.db].vendor
+
+
+# ==================== Поиск ====================
+
+def search_queryset(queryset, text):
+    """
+    Отфильтровать queryset по поисковой строке и добавить аннотацию search_rank
+    (чем больше, тем релевантнее).
+    """
+    text = text.strip()
+    model = queryset.model
+    if not text:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    vendor = _vendor(queryset)
+    if vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+        # ts_rank возвращает real (float4): без приведения к double precision значение
+        # из курсора пагинации (float8) никогда не равно рангу строки на границе страницы
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+        )
+
+    if vendor == 'sqlite':
+        scores = _sqlite_match(queryset.db, model, text)
+        if scores is not None:
+            if not scores:
+                return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+            return queryset.filter(pk__in=list(scores)).annotate(
+                search_rank=Case(
+                    *[When(pk=pk, then=Value(score)) for pk, score in scores.items()],
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                )
+            )
+
+    condition = Q()
+    for field in FALLBACK_LOOKUPS[model]:
+        condition |= Q(**{f'{field}__icontains': text})
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def _stem(word):
+    """Грубое усечение русских окончаний для префиксного поиска в FTS5"""
+    for ending in _RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def _fts5_query(text):
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{_stem(word)}"*' for word in words)
+
+
+def _sqlite_match(alias, model, text):
+    """{id: релевантность} для SQLite FTS5 или None, если индекс не создан"""
+    match = _fts5_query(text)
+    if not match:
+        return {}
+    sql = (
+        f'SELECT object_id, bm25({SQLITE_TABLE}, 0.0, 0.0, 10.0, 3.0) AS score '
+        f'FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s AND kind = %s '
+        f'ORDER BY score LIMIT {SQLITE_MAX_MATCHES}'
+    )
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(sql, [match, model._meta.label_lower])
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    # bm25 тем меньше, чем лучше совпадение, поэтому меняем знак
+    return {object_id: -score for object_id, score in rows}
+
+
+# ==================== Поддержка индекса ====================
+
+def _search_vector(model):
+    vector = None
+    for field, weight in SEARCH_FIELDS[model]:
+        part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def update_search_index(model, pks=None, using='default'):
+    """Перестроить поисковый индекс для объектов model (все, если pks=None)"""
+    queryset = model._default_manager.using(using)
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+
+    vendor = connections[using].vendor
+    if vendor == 'postgresql':
+        queryset.update(search_vector=_search_vector(model))
+    elif vendor == 'sqlite':
+        fields = [field for field, _ in SEARCH_FIELDS[model]]
+        rows = [
+            (model._meta.label_lower, values[0], values[1] or '', values[2] or '')
+            for values in queryset.values_list('pk', *fields)
+        ]
+        try:
+            with connections[using].cursor() as cursor:
+                _sqlite_delete(cursor, model, pks)
+                cursor.executemany(
+                    f'INSERT INTO {SQLITE_TABLE} (kind, object_id, primary_text, secondary_text) '
+                    'VALUES (%s, %s, %s, %s)',
+                    rows,
+                )
+        except DatabaseError:
+            # Таблица FTS5 ещё не создана (миграции не применены) - поиск работает через icontains
+            pass
+
+
+def _sqlite_delete(cursor, model, pks):
+    if pks is None:
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE kind = %s', [model._meta.label_lower])
+    else:
+        for pk in pks:
+            cursor.execute(
+                f'DELETE FROM {SQLITE_TABLE} WHERE kind = %s AND object_id = %s',
+                [model._meta.label_lower, pk],
+            )
+
+
+def _index_saved(sender, instance, raw=False, update_fields=None, using='default', **kwargs):
+    if raw:
+        return
+    fields = {field for field, _ in SEARCH_FIELDS[sender]}
+    if update_fields is not None and not fields.intersection(update_fields):
+        return
+    update_search_index(sender, [instance.pk], using=using)
+
+
+def _index_deleted(sender, instance, using='default', **kwargs):
+    if connections[using].vendor != 'sqlite':
+        return
+    try:
+        with connections[using].cursor() as cursor:
+            _sqlite_delete(cursor, sender, [instance.pk])
+    except DatabaseError:
+        pass
+
+
+for _model in SEARCH_FIELDS:
+    post_save.connect(_index_saved, sender=_model, dispatch_uid=f'search_index_save_{_model.__name__}')
+    post_delete.connect(_index_deleted, sender=_model, dispatch_uid=f'search_index_delete_{_model.__name__}')
@@ -1,44 +1,123 @@
 """
 Сериализаторы для преобразования моделей Django в JSON
+
+Сериализаторы не ходят в базу: всё, что им нужно, должно быть загружено заранее.
+Каждый сериализатор объявляет свои связи через декоратор @serializer, а views
+подготавливают данные через with_relations() (для queryset) или load_relations()
+(для уже загруженных объектов). При SERIALIZERS_STRICT = True любой SQL-запрос
+внутри сериализатора приводит к SerializerQueryError.
 """
+import functools
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import prefetch_related_objects
+
+from .images import image_sources
+from .timing import current_timing
+
+
+class SerializerQueryError(RuntimeError):
+    """Сериализатор выполнил SQL-запрос (связь не была загружена заранее)"""
+
+
+def _forbid_queries(serializer_name):
+    """execute_wrapper, запрещающий запросы к базе"""
+    def blocker(execute, sql, params, many, context):
+        raise SerializerQueryError(
+            f'{serializer_name} выполнил запрос к базе: {sql}. '
+            'Загрузите связи заранее через with_relations() или load_relations().'
+        )
+    return blocker
+
+
+def serializer(select_related=(), prefetch_related=()):
+    """
+    Объявляет связи, которые нужны сериализатору
+    select_related - ForeignKey/OneToOne, загружаемые JOIN-ом
+    prefetch_related - обратные и ManyToMany связи
+    """
+    def decorator(func):
+        def call(obj):
+            if not getattr(settings, 'SERIALIZERS_STRICT', False):
+                return func(obj)
+            with connection.execute_wrapper(_forbid_queries(func.__name__)):
+                return func(obj)
+
+        @functools.wraps(func)
+        def wrapper(obj):
+            # Время сериализации для Server-Timing (fitness.timing), если запрос замеряется
+            timing = current_timing()
+            if timing is None:
+                return call(obj)
+            started = time.perf_counter()
+            try:
+                return call(obj)
+            finally:
+                timing.serialize_time += time.perf_counter() - started
+
+        wrapper.select_related = tuple(select_related)
+        wrapper.prefetch_related = tuple(prefetch_related)
+        return wrapper
+    return decorator
+
+
+def with_relations(queryset, serializer_func):
+    """Добавить к queryset связи, объявленные сериализатором"""
+    if serializer_func.select_related:
+        queryset = queryset.select_related(*serializer_func.select_related)
+    if serializer_func.prefetch_related:
+        queryset = queryset.prefetch_related(*serializer_func.prefetch_related)
+    return queryset
+
+
+def load_relations(objects, serializer_func):
+    """Догрузить связи для уже полученных объектов (уже загруженные пропускаются)"""
+    lookups = serializer_func.select_related + serializer_func.prefetch_related
+    if lookups:
+        prefetch_related_objects(list(objects), *lookups)
+    return objects
 
 
+@serializer(prefetch_related=('images', 'amenities'))
 def serialize_gym(gym):
     """Сериализация зала"""
     # Безопасное получение изображений
     images_list = []
-    for img in gym.images.all().order_by('order'):
+    # Сортируем в памяти, чтобы не терять результат prefetch_related
+    for img in sorted(gym.images.all(), key=lambda img: (img.order, img.id)):
         try:
             image_url = img.image.url if img.image else None
         except (ValueError, AttributeError):
             image_url = None
         
+        sources = image_sources(img.image, img.variants)
         images_list.append({
             'id': img.id,
             'image': image_url,
-            'order': img.order
+            'order': img.order,
+            'width': img.width,
+            'height': img.height,
+            'srcset': sources['srcset'],
+            'webp_srcset': sources['webp_srcset'],
         })
     
-    # Безопасное получение главного изображения
+    # Главное изображение хранится в самом зале (поддерживается сигналами)
     main_image = None
-    if gym.images.exists():
-        first_img = gym.images.first()
+    if gym.main_image:
         try:
-            main_image = first_img.image.url if first_img.image else None
+            main_image = gym.main_image.url
         except (ValueError, AttributeError):
             main_image = None
     
     # Если нет изображений, используем дефолтное для главной страницы
     if not main_image:
         main_image = '/media/gyms/gym_base.jpeg'
+    main_sources = image_sources(gym.main_image, gym.main_image_variants)
     
-    # Преобразуем amenities в список, если это строка
-    amenities = gym.amenities
-    if amenities and isinstance(amenities, str):
-        # Разделяем по запятым и очищаем от пробелов
-        amenities = [a.strip() for a in amenities.split(',') if a.strip()]
-    elif not amenities:
-        amenities = []
+    # Удобства берём из загруженной связи (Amenity упорядочены по названию)
+    amenities = [amenity.name for amenity in gym.amenities.all()]
     
     # Используем сохраненный рейтинг из модели
     gym_rating = float(gym.rating) if gym.rating else 0.0
@@ -47,16 +126,20 @@ def serialize_gym(gym):
         'id': gym.id,
         'name': gym.name,
         'address': gym.address,
+        'city': gym.city,
         'description': gym.description or '',
         'amenities': amenities,
         'images': images_list,
         'main_image': main_image,
+        'main_image_srcset': main_sources['srcset'],
+        'main_image_webp_srcset': main_sources['webp_srcset'],
         'rating': round(gym_rating, 1),
-        'reviews_count': gym.gym_reviews.count(),
-        'trainers_count': gym.trainers.count(),
+        'reviews_count': gym.reviews_count,
+        'trainers_count': gym.trainers_count,
     }
 
 
+@serializer(prefetch_related=('gyms',))
 def serialize_trainer(trainer):
     """Сериализация тренера"""
     # Используем сохраненный рейтинг из модели
@@ -78,6 +161,7 @@ def serialize_trainer(trainer):
             image_url = trainer.image.url
         except (ValueError, AttributeError):
             image_url = None
+    sources = image_sources(trainer.image, trainer.image_variants)
     
     return {
         'id': trainer.id,
@@ -87,11 +171,16 @@ def serialize_trainer(trainer):
         'description': trainer.description or '',
         'gyms': gyms_list,
         'rating': round(rating, 1),
-        'reviews_count': trainer.reviews.count(),
+        'reviews_count': trainer.reviews_count,
         'image': image_url,
+        'image_width': trainer.image_width,
+        'image_height': trainer.image_height,
+        'image_srcset': sources['srcset'],
+        'image_webp_srcset': sources['webp_srcset'],
     }
 
 
+@serializer(select_related=('user',))
 def serialize_user_profile(profile):
     """Сериализация профиля пользователя"""
     return {
@@ -105,14 +194,14 @@ def serialize_user_profile(profile):
     }
 
 
+@serializer(select_related=('user__user', 'trainer'), prefetch_related=('trainer__gyms',))
 def serialize_record(record):
     """Сериализация записи на тренировку"""
     from django.utils import timezone
     
-    # Получаем название зала (первый зал тренера)
-    gym_name = None
-    if record.trainer.gyms.exists():
-        gym_name = record.trainer.gyms.first().name
+    # Получаем название зала (первый зал тренера) из загруженных залов
+    trainer_gyms = sorted(record.trainer.gyms.all(), key=lambda gym: (gym.name, gym.id))
+    gym_name = trainer_gyms[0].name if trainer_gyms else None
     
     # Конвертируем datetime в локальный часовой пояс (Москва)
     # Добавляем часовой пояс +03:00 для правильного парсинга на фронтенде
@@ -133,12 +222,14 @@ def serialize_record(record):
         'trainer_specialization': record.trainer.specialization,
         'gym_name': gym_name,
         'datetime': datetime_str,
-        'status': record.status,
-        'status_display': record.get_status_display(),
+        # Фактический статус: закончившаяся тренировка - 'completed' без записи в БД
+        'status': record.get_effective_status(),
+        'status_display': record.get_effective_status_display(),
         'created_at': record.created_at.isoformat(),
     }
 
 
+@serializer(select_related=('user', 'trainer'))
 def serialize_review(review):
     """Сериализация отзыва на тренера"""
     return {
@@ -158,6 +249,7 @@ def serialize_review(review):
     }
 
 
+@serializer(select_related=('user', 'gym'))
 def serialize_gym_review(review):
     """Сериализация отзыва на зал"""
     return {
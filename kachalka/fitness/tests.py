@@ -1,3 +1,691 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User as DjangoUser
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db import IntegrityError, OperationalError, transaction
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import booking, files, metrics, views
+from .forms import RecordCreateForm
+from .models import Amenity, Gym, GymImage, GymReview, Record, Review, Trainer, ranking_score
+
+
+def _create_profile(name):
+    # Профиль создаётся сигналом при создании пользователя
+    return DjangoUser.objects.create_user(username=name, password='password').profile
+
+
+def _create_catalog(size, suffix=''):
+    """Залы и тренеры со всеми связями, которые попадают в сериализаторы"""
+    amenity = Amenity.objects.create(name=f'Сауна{suffix}')
+    profile = _create_profile(f'Клиент{suffix}')
+    start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    for i in range(size):
+        gym = Gym.objects.create(name=f'Зал {suffix}{i}', address=f'ул. Мира, {i}, Казань')
+        gym.amenities.add(amenity)
+        GymImage.objects.create(gym=gym, image=f'gyms/{suffix}{i}.jpg')
+        GymReview.objects.create(user=profile, gym=gym, rating=5, text='Хорошо')
+        trainer = Trainer.objects.create(full_name=f'Тренер {suffix}{i}', specialization='Йога')
+        trainer.gyms.add(gym)
+        Review.objects.create(user=profile, trainer=trainer, rating=4, text='Отлично')
+        Record.objects.create(user=profile, trainer=trainer, datetime=start + timedelta(days=i))
+    return trainer
+
+
+def _collect_pages(client, url, key, limit):
+    """Пройти список по курсору и вернуть id всех строк по порядку"""
+    ids = []
+    cursor = ''
+    for _ in range(100):
+        response = client.get(url, {'limit': limit, 'cursor': cursor})
+        assert response.status_code == 200, response.content
+        data = response.json()
+        ids.extend(item['id'] for item in data[key])
+        cursor = data['next_cursor']
+        if not cursor:
+            return ids
+    raise AssertionError('Курсор не закончился за 100 страниц')
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False)
+class ListPaginationTests(TestCase):
+    """Постраничная выдача залов и тренеров при одинаковых ключах сортировки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Одинаковые названия и рейтинг (без отзывов ranking_score у всех одинаковый)
+        cls.gyms = [Gym.objects.create(name='Атлет', address=f'ул. Ленина, {i}, Москва') for i in range(7)]
+        cls.trainers = [
+            Trainer.objects.create(full_name='Иван Петров', specialization='Силовой тренинг') for _ in range(7)
+        ]
+
+    def test_rating_desc_ties_are_paginated_without_gaps(self):
+        for url, key, objects in (
+            ('/api/gyms/?order_by=rating_desc', 'gyms', self.gyms),
+            ('/api/trainers/?order_by=rating_desc', 'trainers', self.trainers),
+        ):
+            with self.subTest(key=key):
+                ids = _collect_pages(self.client, url, key, limit=3)
+                self.assertEqual(sorted(ids), sorted(obj.id for obj in objects))
+                self.assertEqual(len(ids), len(set(ids)))
+
+    def test_search_rank_ties_are_paginated_without_gaps(self):
+        # В SQLite ранг - bm25 (double), в PostgreSQL - ts_rank, приведённый к double precision
+        for url, key, objects in (
+            ('/api/gyms/?search=Атлет', 'gyms', self.gyms),
+            ('/api/trainers/?search=Петров', 'trainers', self.trainers),
+        ):
+            with self.subTest(key=key):
+                ids = _collect_pages(self.client, url, key, limit=2)
+                self.assertEqual(sorted(ids), sorted(obj.id for obj in objects))
+                self.assertEqual(len(ids), len(set(ids)))
+
+    def test_cursor_with_wrong_value_types_is_rejected(self):
+        def cursor(ordering, values):
+            raw = json.dumps({'o': ordering, 'v': values}).encode('utf-8')
+            return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+        for url, ordering, values in (
+            ('/api/gyms/', 'name,id', ['zzz', 'zzz']),
+            ('/api/gyms/?order_by=rating_desc', '-ranking_score,name,id', ['высокий', 'Атлет', 1]),
+            ('/api/records/', '-datetime,-id', ['не дата', 1]),
+            ('/api/reviews/', '-created_at,-id', [[2025], 1]),
+        ):
+            with self.subTest(url=url):
+                separator = '&' if '?' in url else '?'
+                response = self.client.get(f'{url}{separator}limit=2&cursor={cursor(ordering, values)}')
+                self.assertEqual(response.status_code, 400)
+
+    def test_top_returns_next_cursor_for_the_rest(self):
+        data = self.client.get('/api/gyms/', {'top': 3}).json()
+        self.assertEqual(data['count'], 3)
+        rest = self.client.get('/api/gyms/', {'top': 3, 'limit': 10, 'cursor': data['next_cursor']}).json()
+        self.assertEqual(
+            sorted(gym['id'] for gym in data['gyms'] + rest['gyms']),
+            sorted(gym.id for gym in self.gyms),
+        )
+
+    def test_list_without_limit_is_capped(self):
+        with mock.patch.object(views, 'MAX_LIMIT', 5):
+            data = self.client.get('/api/trainers/').json()
+        self.assertEqual(data['count'], 5)
+        self.assertIsNotNone(data['next_cursor'])
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False, SERIALIZERS_STRICT=True)
+class SerializerQueryTests(TestCase):
+    """
+    Число запросов списков и карточки тренера не зависит от количества строк;
+    SERIALIZERS_STRICT превращает запрос из сериализатора в ошибку (500)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trainer = _create_catalog(5)
+
+    def test_gyms_list(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/gyms/')
+        self.assertEqual(response.status_code, 200)
+        gyms = response.json()['gyms']
+        self.assertEqual(len(gyms), 5)
+        self.assertEqual(gyms[0]['amenities'], ['Сауна'])
+
+    def test_trainers_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/trainers/')
+        self.assertEqual(response.status_code, 200)
+        trainers = response.json()['trainers']
+        self.assertEqual(len(trainers), 5)
+        self.assertEqual(len(trainers[0]['gyms']), 1)
+
+    def test_trainer_detail(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/api/trainers/{self.trainer.id}/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['reviews']), 1)
+        self.assertEqual(len(data['booked_slots']), 1)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        _create_catalog(10, suffix='б')
+        with self.assertNumQueries(3):
+            self.client.get('/api/gyms/')
+        with self.assertNumQueries(2):
+            self.client.get('/api/trainers/')
+
+
+class BookingOverlapTests(TestCase):
+    """Пересечения записей: ends_at, Record.overlapping, ограничения базы, форма и create_records"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = _create_profile('Анна')
+        cls.other_profile = _create_profile('Борис')
+        cls.trainer = Trainer.objects.create(full_name='Ольга Смирнова', specialization='Пилатес')
+        cls.other_trainer = Trainer.objects.create(full_name='Пётр Иванов', specialization='Бокс')
+        # Слот 10:30 послезавтра (слоты расписания идут подряд через Record.DURATION)
+        day = timezone.localdate() + timedelta(days=2)
+        cls.slot = timezone.make_aware(datetime.combine(day, time(10, 30)))
+        cls.slot_label = f'{day.isoformat()}T10:30:00'
+
+    def _book(self, trainer, slots):
+        return self.client.post(
+            '/api/records/create/',
+            json.dumps({'trainer_id': trainer.id, 'time_slots': slots}),
+            content_type='application/json',
+        )
+
+    def test_ends_at_is_start_plus_duration(self):
+        record = Record.objects.create(user=self.profile, trainer=self.trainer, datetime=self.slot)
+        self.assertEqual(record.ends_at, self.slot + Record.DURATION)
+
+        record.datetime = self.slot + timedelta(days=1)
+        record.save(update_fields=['datetime'])
+        record.refresh_from_db()
+        self.assertEqual(record.ends_at, self.slot + timedelta(days=1) + Record.DURATION)
+
+    def test_overlapping(self):
+        record = Record.objects.create(user=self.profile, trainer=self.trainer, datetime=self.slot)
+        self.assertEqual(list(Record.overlapping(self.slot)), [record])
+        self.assertEqual(list(Record.overlapping(self.slot + timedelta(minutes=45))), [record])
+        self.assertEqual(list(Record.overlapping(self.slot - timedelta(minutes=45))), [record])
+        # Соседние слоты только касаются интервала записи
+        self.assertFalse(Record.overlapping(self.slot + Record.DURATION).exists())
+        self.assertFalse(Record.overlapping(self.slot - Record.DURATION).exists())
+        self.assertEqual(
+            list(Record.overlapping(self.slot - timedelta(hours=3), self.slot + timedelta(hours=3))), [record]
+        )
+
+        record.cancel()
+        self.assertFalse(Record.overlapping(self.slot).exists())
+
+    def test_database_rejects_overlapping_records(self):
+        Record.objects.create(user=self.profile, trainer=self.trainer, datetime=self.slot)
+        shifted = self.slot + timedelta(minutes=30)
+        for user, trainer in ((self.other_profile, self.trainer), (self.profile, self.other_trainer)):
+            with self.subTest(user=user.full_name, trainer=trainer.full_name):
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    Record.objects.create(user=user, trainer=trainer, datetime=shifted)
+
+        # Перенос существующей записи на пересекающееся время (ограничение на UPDATE)
+        record = Record.objects.create(
+            user=self.other_profile, trainer=self.trainer, datetime=self.slot + Record.DURATION
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Record.objects.filter(pk=record.pk).update(datetime=shifted, ends_at=shifted + Record.DURATION)
+
+        # Отменённые записи не мешают
+        Record.objects.create(user=self.other_profile, trainer=self.trainer, datetime=shifted, status='cancelled')
+
+    def test_form_rejects_trainer_and_user_overlaps(self):
+        Record.objects.create(user=self.profile, trainer=self.trainer, datetime=self.slot)
+        cases = (
+            (self.other_profile, self.trainer, 'уже занят'),
+            (self.profile, self.other_trainer, 'уже есть запись'),
+        )
+        for user, trainer, message in cases:
+            with self.subTest(message=message):
+                form = RecordCreateForm({'user': user.id, 'trainer': trainer.id, 'datetime': self.slot_label})
+                self.assertFalse(form.is_valid())
+                self.assertIn(message, ' '.join(form.non_field_errors()))
+
+        form = RecordCreateForm({'user': self.other_profile.id, 'trainer': self.other_trainer.id, 'datetime': self.slot_label})
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_create_records_rejects_overlaps(self):
+        self.client.force_login(self.profile.user)
+        self.assertEqual(self._book(self.trainer, [self.slot_label]).status_code, 201)
+
+        # Тот же пользователь к другому тренеру в то же время
+        response = self._book(self.other_trainer, [self.slot_label])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('У вас уже есть тренировка в это время', response.json()['errors'][0])
+
+        # Другой пользователь к занятому тренеру
+        self.client.force_login(self.other_profile.user)
+        response = self._book(self.trainer, [self.slot_label])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Слот уже занят', response.json()['errors'][0])
+
+    def test_create_records_returns_409_when_database_rejects_insert(self):
+        # Проверка в приложении пропустила пересечение (как при гонке) - срабатывает ограничение базы
+        Record.objects.create(user=self.other_profile, trainer=self.trainer, datetime=self.slot)
+        self.client.force_login(self.profile.user)
+        with mock.patch.object(booking.Record, 'overlapping', return_value=Record.objects.none()):
+            response = self._book(self.trainer, [self.slot_label])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Record.objects.filter(user=self.profile).count(), 0)
+
+    def test_cancel_and_rebook_same_slot(self):
+        self.client.force_login(self.profile.user)
+        record_id = self._book(self.trainer, [self.slot_label]).json()['records'][0]['id']
+
+        response = self.client.post(f'/api/records/{record_id}/cancel/')
+        self.assertEqual(response.status_code, 200)
+
+        response = self._book(self.trainer, [self.slot_label])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(Record.objects.filter(trainer=self.trainer).order_by('id').values_list('status', flat=True)),
+            ['cancelled', 'scheduled'],
+        )
+
+
+class MetricsEndpointTests(TestCase):
+    """Доступ к /metrics: без METRICS_TOKEN - только при DEBUG"""
+
+    def test_token_required_outside_debug(self):
+        with self.settings(DEBUG=False, METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with self.settings(DEBUG=True, METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+        with self.settings(DEBUG=False, METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+
+class BenchmarkCommandTests(TestCase):
+    """Команда benchmark: сравнение с базовыми результатами и выход с ошибкой при регрессии"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _create_catalog(3)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = Path(directory.name) / 'baseline.json'
+
+    def _run(self, *args):
+        out = StringIO()
+        call_command(
+            'benchmark', '--repeat', '1', '--forms', '2', '--baseline', str(self.baseline), *args, stdout=out
+        )
+        return out.getvalue()
+
+    def _set_baseline(self, us_per_op):
+        stored = json.loads(self.baseline.read_text(encoding='utf-8'))
+        for result in stored[connection.vendor].values():
+            result['us_per_op'] = us_per_op
+        self.baseline.write_text(json.dumps(stored), encoding='utf-8')
+
+    def test_passes_against_slower_baseline(self):
+        self._run('--save-baseline')
+        self._set_baseline(10 ** 9)
+        self.assertIn('Регрессий нет', self._run())
+
+    def test_fails_on_regression(self):
+        self._run('--save-baseline')
+        self._set_baseline(0.000001)
+        with self.assertRaisesMessage(CommandError, 'Регрессии производительности'):
+            self._run('--only', 'serialize_gym', 'record_create_form')
+
+
+class RankingScoreDefaultTests(TestCase):
+    """Новый зал или тренер без отзывов получает априорный ranking_score, а не 0"""
+
+    def test_new_objects_start_at_prior(self):
+        prior = ranking_score(0, 0)
+        self.assertEqual(Gym.objects.create(name='Новый', address='ул. Садовая, 1, Москва').ranking_score, prior)
+        trainer = Trainer.objects.create(full_name='Новый тренер', specialization='Бег')
+        trainer.refresh_from_db()
+        self.assertEqual(trainer.ranking_score, prior)
+
+    def test_new_trainer_is_ranked_above_low_rated(self):
+        low_rated = Trainer.objects.create(full_name='Низкий', specialization='Бег')
+        Review.objects.create(user=_create_profile('Критик'), trainer=low_rated, rating=1, text='Плохо')
+        fresh = Trainer.objects.create(full_name='Новичок', specialization='Бег')
+        top = list(Trainer.objects.order_by('-ranking_score', 'full_name', 'id').values_list('id', flat=True))
+        self.assertEqual(top, [fresh.id, low_rated.id])
+
+
+class TrainerLockModeTests(TestCase):
+    """Режим 'trainer': в TrainerBusy превращается только lock_not_available"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = _create_profile('Вера')
+        cls.trainer = Trainer.objects.create(full_name='Глеб', specialization='Бокс')
+
+    def _book_with_error(self, sqlstate):
+        class DriverError(Exception):
+            pass
+
+        cause = DriverError()
+        cause.sqlstate = sqlstate
+        error = OperationalError('ошибка')
+        error.__cause__ = cause
+        with mock.patch('django.db.models.query.QuerySet.first', side_effect=error):
+            booking.book_slots(self.profile, self.trainer.id, {}, lock_mode='trainer')
+
+    def test_lock_not_available_is_trainer_busy(self):
+        with self.assertRaises(booking.TrainerBusy):
+            self._book_with_error('55P03')
+
+    def test_other_database_errors_are_reraised(self):
+        # 57014 - statement_timeout
+        with self.assertRaises(OperationalError):
+            self._book_with_error('57014')
+
+
+class TrainerAvailabilityTests(TestCase):
+    """Параметры from/to свободных слотов тренера"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.trainer = Trainer.objects.create(full_name='Дарья', specialization='Йога')
+
+    def test_date_overflow_is_bad_request(self):
+        response = self.client.get(f'/api/trainers/{self.trainer.id}/availability/', {'from': '9999-12-20'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_default_range(self):
+        response = self.client.get(f'/api/trainers/{self.trainer.id}/availability/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['from'], timezone.localdate().isoformat())
+
+
+@override_settings(RANKING_PRIOR_MEAN=4.0, RANKING_PRIOR_WEIGHT=5)
+class ReviewRatingCounterTests(TestCase):
+    """Счётчики и рейтинги, которые сигналы отзывов поддерживают F-выражениями"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = _create_profile('Автор')
+        cls.other_author = _create_profile('Другой автор')
+        cls.trainer = Trainer.objects.create(full_name='Елена', specialization='Йога')
+        cls.other_trainer = Trainer.objects.create(full_name='Жанна', specialization='Бег')
+        cls.gym = Gym.objects.create(name='Олимп', address='ул. Мира, 5, Сочи')
+
+    def assertRating(self, owner, count, total):
+        owner.refresh_from_db()
+        self.assertEqual((owner.reviews_count, owner.rating_sum), (count, total))
+        self.assertEqual(owner.rating, Decimal(f'{total / count:.2f}') if count else Decimal('0.00'))
+        self.assertAlmostEqual(owner.ranking_score, (total + 5 * 4.0) / (count + 5))
+
+    def test_create_and_change_rating(self):
+        review = Review.objects.create(user=self.author, trainer=self.trainer, rating=5, text='Отлично')
+        Review.objects.create(user=self.other_author, trainer=self.trainer, rating=2, text='Так себе')
+        self.assertRating(self.trainer, 2, 7)
+
+        review.rating = 3
+        review.save()
+        self.assertRating(self.trainer, 2, 5)
+
+    def test_move_review_to_other_trainer(self):
+        review = Review.objects.create(user=self.author, trainer=self.trainer, rating=5, text='Отлично')
+        review.trainer = self.other_trainer
+        review.rating = 4
+        review.save()
+        self.assertRating(self.trainer, 0, 0)
+        self.assertRating(self.other_trainer, 1, 4)
+
+    def test_instance_delete(self):
+        review = Review.objects.create(user=self.author, trainer=self.trainer, rating=1, text='Плохо')
+        Review.objects.create(user=self.other_author, trainer=self.trainer, rating=5, text='Отлично')
+        review.delete()
+        self.assertRating(self.trainer, 1, 5)
+
+    def test_queryset_delete(self):
+        Review.objects.create(user=self.author, trainer=self.trainer, rating=1, text='Плохо')
+        Review.objects.create(user=self.other_author, trainer=self.trainer, rating=5, text='Отлично')
+        Review.objects.create(user=self.author, trainer=self.other_trainer, rating=3, text='Нормально')
+        Review.objects.filter(trainer=self.trainer).delete()
+        self.assertRating(self.trainer, 0, 0)
+        self.assertRating(self.other_trainer, 1, 3)
+
+    def test_gym_reviews(self):
+        review = GymReview.objects.create(user=self.author, gym=self.gym, rating=4, text='Хороший зал')
+        GymReview.objects.create(user=self.other_author, gym=self.gym, rating=5, text='Отличный зал')
+        self.assertRating(self.gym, 2, 9)
+        review.rating = 2
+        review.save()
+        self.assertRating(self.gym, 2, 7)
+        GymReview.objects.filter(gym=self.gym).delete()
+        self.assertRating(self.gym, 0, 0)
+
+
+class CreateRecordsBatchTests(TestCase):
+    """create_records: пачка слотов одной вставкой и ошибки по отдельным слотам"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = _create_profile('Зоя')
+        cls.trainer = Trainer.objects.create(full_name='Игорь', specialization='Кроссфит')
+        cls.day = timezone.localdate() + timedelta(days=3)
+
+    def setUp(self):
+        self.client.force_login(self.profile.user)
+
+    def _label(self, hour, minute, day=None):
+        return f'{(day or self.day).isoformat()}T{hour:02d}:{minute:02d}:00'
+
+    def _book(self, slots):
+        return self.client.post(
+            '/api/records/create/',
+            json.dumps({'trainer_id': self.trainer.id, 'time_slots': slots}),
+            content_type='application/json',
+        )
+
+    def test_batch_with_partial_errors(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        response = self._book([
+            self._label(9, 0), self._label(10, 30), self._label(12, 0),
+            self._label(12, 0),  # повтор в запросе
+            self._label(10, 0),  # не начало слота
+            self._label(9, 0, day=yesterday),  # прошедшее время
+            'не дата',
+        ])
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(len(data['records']), 3)
+        self.assertEqual(len(data['errors']), 3)
+        self.assertEqual(Record.objects.filter(user=self.profile, status='scheduled').count(), 3)
+
+        # Забронированные слоты сразу пропадают из свободных (кэш сброшен после bulk_create)
+        availability = self.client.get(
+            f'/api/trainers/{self.trainer.id}/availability/', {'from': self.day.isoformat(), 'to': self.day.isoformat()}
+        ).json()
+        self.assertNotIn('09:00', availability['days'][0]['slots'])
+        self.assertIn('13:30', availability['days'][0]['slots'])
+
+    def test_only_invalid_slots_is_bad_request(self):
+        response = self._book([self._label(10, 0), self._label(9, 0, day=self.day + timedelta(days=60))])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.json()['errors']), 2)
+        self.assertFalse(Record.objects.exists())
+
+    def test_already_booked_slots_are_reported_per_slot(self):
+        self.assertEqual(self._book([self._label(9, 0)]).status_code, 201)
+        response = self._book([self._label(9, 0), self._label(10, 30)])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['records']), 1)
+        self.assertIn('Вы уже записаны на это время', response.json()['errors'][0])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        with CaptureQueriesContext(connection) as small:
+            self._book([self._label(9, 0)])
+        with CaptureQueriesContext(connection) as large:
+            self._book([self._label(hour, minute) for hour, minute in ((10, 30), (12, 0), (13, 30), (15, 0), (16, 30))])
+        self.assertEqual(len(large), len(small))
+
+
+class EffectiveStatusTests(TestCase):
+    """Фактический статус закончившихся тренировок при чтении и complete_finished"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profile = _create_profile('Кира')
+        trainer = Trainer.objects.create(full_name='Лев', specialization='Плавание')
+        now = timezone.now()
+
+        def create(hours, status='scheduled'):
+            return Record.objects.create(
+                user=cls.profile, trainer=trainer, datetime=now + timedelta(hours=hours), status=status
+            )
+
+        cls.finished = [create(-100), create(-50)]
+        # Идёт прямо сейчас: началась, но не закончилась
+        cls.in_progress = create(-1)
+        cls.upcoming = create(50)
+        cls.completed = create(-200, status='completed')
+        cls.cancelled = create(-300, status='cancelled')
+
+    def test_filter_matches_annotation(self):
+        annotated = Record.with_effective_status(Record.objects.all())
+        expected = {
+            'scheduled': {self.in_progress.id, self.upcoming.id},
+            'completed': {self.completed.id, *(record.id for record in self.finished)},
+            'cancelled': {self.cancelled.id},
+        }
+        for status, ids in expected.items():
+            with self.subTest(status=status):
+                filtered = Record.objects.filter(Record.effective_status_filter(status))
+                self.assertEqual(set(filtered.values_list('id', flat=True)), ids)
+                self.assertEqual(set(annotated.filter(effective_status=status).values_list('id', flat=True)), ids)
+
+    def test_records_list_reports_effective_status(self):
+        response = self.client.get('/api/records/', {'user': self.profile.id, 'status': 'completed'})
+        self.assertEqual(response.status_code, 200)
+        records = response.json()['records']
+        self.assertEqual(len(records), 3)
+        self.assertEqual({record['status'] for record in records}, {'completed'})
+
+    def test_complete_finished_updates_in_chunks(self):
+        self.assertEqual(Record.complete_finished(chunk_size=1), 2)
+        self.assertEqual(
+            set(Record.objects.filter(status='completed').values_list('id', flat=True)),
+            {self.completed.id, *(record.id for record in self.finished)},
+        )
+        self.in_progress.refresh_from_db()
+        self.assertEqual(self.in_progress.status, 'scheduled')
+        self.assertEqual(Record.complete_finished(), 0)
+
+    def test_update_record_statuses_command(self):
+        call_command('update_record_statuses', '--chunk-size', '1', stdout=StringIO())
+        self.assertFalse(Record.objects.filter(Record.effective_status_filter('completed'), status='scheduled').exists())
+
+
+class FileServingTests(TestCase):
+    """fitness.files.serve: Range, If-Range, сжатые копии и кэширование"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.content = bytes(range(256)) * 4
+        (self.root / 'app.js').write_bytes(self.content)
+        self.factory = RequestFactory()
+
+    def _serve(self, path='app.js', **headers):
+        request = self.factory.get(f'/static/{path}', **headers)
+        return files.serve(request, path, document_root=self.root, location='static', immutable='manifest')
+
+    def test_parse_range(self):
+        self.assertEqual(files._parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(files._parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(files._parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(files._parse_range('bytes=50-500', 100), (50, 99))
+        # Несколько диапазонов - весь файл
+        self.assertIsNone(files._parse_range('bytes=0-1,5-6', 100))
+        for header in ('bytes=100-', 'bytes=5-1', 'bytes=-0'):
+            with self.subTest(header=header), self.assertRaises(ValueError):
+                files._parse_range(header, 100)
+
+    def test_range_response(self):
+        response = self._serve(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self._serve(HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_range(self):
+        full = self._serve()
+        etag = full['ETag']
+        full.close()
+        self.assertEqual(self._serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+        # Файл изменился (другой ETag) - отдаётся целиком
+        response = self._serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_precompressed_variant(self):
+        (self.root / 'app.js.gz').write_bytes(b'gzip')
+        (self.root / 'app.js.br').write_bytes(b'brotli')
+
+        response = self._serve(HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(b''.join(response.streaming_content), b'brotli')
+
+        response = self._serve(HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        response.close()
+
+        response = self._serve()
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        response.close()
+
+    def test_stale_variant_is_ignored(self):
+        variant = self.root / 'app.js.gz'
+        variant.write_bytes(b'old gzip')
+        source_mtime = (self.root / 'app.js').stat().st_mtime
+        os.utime(variant, (source_mtime - 10, source_mtime - 10))
+        response = self._serve(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+        response.close()
+
+    def test_cache_headers_and_not_modified(self):
+        (self.root / 'app.0123456789ab.js').write_bytes(self.content)
+        response = self._serve('app.0123456789ab.js')
+        self.assertEqual(response['Cache-Control'], files.IMMUTABLE_CACHE_CONTROL)
+        response.close()
+
+        response = self._serve()
+        self.assertTrue(response['Cache-Control'].startswith('public, max-age='))
+        etag = response['ETag']
+        response.close()
+        self.assertEqual(self._serve(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_offload_and_path_traversal(self):
+        with self.settings(FILES_OFFLOAD='x-accel-redirect', FILES_ACCEL_PREFIX='/internal/'):
+            response = self._serve()
+        self.assertEqual(response['X-Accel-Redirect'], '/internal/static/app.js')
+        self.assertEqual(response.content, b'')
+
+        with self.assertRaises(Http404):
+            self._serve('../app.js')
+
+
+class MetricsDirectoryTests(TestCase):
+    """Файлы воркеров в METRICS_DIR: уборка за завершившимися процессами"""
+
+    def test_prune_dead_keeps_live_processes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        live = [f'{os.getpid()}-aaaa.json', f'{os.getppid()}-bbbb.json']
+        # pid заведомо больше pid_max Linux - такого процесса нет
+        dead = ['99999999-cccc.json', '99999999-dddd.json.tmp', '99999998.json']
+        for filename in (*live, *dead, 'README.txt'):
+            (root / filename).write_text('[]', encoding='utf-8')
+
+        self.assertEqual(metrics.prune_dead(directory.name), len(dead))
+        self.assertEqual(sorted(os.listdir(directory.name)), sorted([*live, 'README.txt']))
@@ -0,0 +1,132 @@
+"""
+Замеры времени обработки запросов API.
+
+RequestTimingMiddleware считает для каждого запроса число SQL-запросов, время в базе,
+время сериализации (декоратор @serializer), время view и общее время и отдаёт их
+в заголовках Server-Timing и X-Query-Count, а также пишет строку в лог
+fitness.requests с именем URL (gyms_list, trainer_detail, ...).
+
+Накладные расходы - perf_counter на каждый SQL-запрос и вызов сериализатора.
+Заголовки и лог пишутся для доли запросов settings.REQUEST_TIMING_SAMPLE_RATE;
+метрики fitness.metrics (если включены) получают время и число запросов всех
+запросов, без метрик и вне выборки запрос проходит без обёрток вообще.
+Для StreamingHttpResponse учитывается только время до начала отдачи тела.
+"""
+import contextvars
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+logger = logging.getLogger('fitness.requests')
+
+_current = contextvars.ContextVar('fitness_request_timing', default=None)
+
+
+class RequestTiming:
+    """Накопленные замеры одного запроса (время в секундах)"""
+    __slots__ = ('queries', 'db_time', 'serialize_time', 'view_started', 'view_time', 'total_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.view_started = None
+        self.view_time = 0.0
+        self.total_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        """execute_wrapper: время и количество SQL-запросов"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing (длительности в миллисекундах)"""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'view;dur={self.view_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+
+def current_timing():
+    """Замеры текущего запроса или None, если запрос не попал в выборку"""
+    return _current.get()
+
+
+def _sampled():
+    if not getattr(settings, 'REQUEST_TIMING_ENABLED', True):
+        return False
+    rate = getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 1.0)
+    return rate >= 1 or random.random() < rate
+
+
+class RequestTimingMiddleware:
+    """Server-Timing, X-Query-Count и строка лога fitness.requests для выборки запросов"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = _sampled()
+        if not sampled and not metrics.enabled():
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timing.record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        finished = time.perf_counter()
+        timing.total_time = finished - started
+        if timing.view_started is not None:
+            timing.view_time = finished - timing.view_started
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.view_name if match else None
+        if metrics.enabled():
+            metrics.observe_request(url_name, request.method, response.status_code, timing.total_time, timing.queries)
+        if sampled:
+            response['Server-Timing'] = timing.server_timing()
+            response['X-Query-Count'] = str(timing.queries)
+            self._log(request, response, timing, url_name)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = _current.get()
+        if timing is not None:
+            timing.view_started = time.perf_counter()
+
+    @staticmethod
+    def _log(request, response, timing, url_name):
+        fields = {
+            'url_name': url_name or '-',
+            'method': request.method,
+            'status': response.status_code,
+            'queries': timing.queries,
+            'db_ms': round(timing.db_time * 1000, 1),
+            'serialize_ms': round(timing.serialize_time * 1000, 1),
+            'view_ms': round(timing.view_time * 1000, 1),
+            'total_ms': round(timing.total_time * 1000, 1),
+        }
+        logger.info(
+            ' '.join(f'{name}=%s' for name in fields),
+            *fields.values(),
+            extra={'request_timing': fields},
+        )
@@ -1,11 +1,12 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path, re_path
-from django.views.static import serve
 
-from . import views
+from . import files, views
 
 urlpatterns = [
+    # ==================== Мониторинг ====================
+    path("metrics", views.prometheus_metrics, name="metrics"),
+    
     # ==================== API endpoints ====================
     # Залы
     path("api/gyms/", views.gyms_list, name="gyms_list"),
@@ -14,6 +15,7 @@ urlpatterns = [
     # Тренеры
     path("api/trainers/", views.trainers_list, name="trainers_list"),
     path("api/trainers/<int:trainer_id>/", views.trainer_detail, name="trainer_detail"),
+    path("api/trainers/<int:trainer_id>/availability/", views.trainer_availability, name="trainer_availability"),
     
     # Отзывы
     path("api/reviews/", views.reviews_list, name="reviews_list"),
@@ -22,7 +24,11 @@ urlpatterns = [
     # Записи
     path("api/records/", views.records_list, name="records_list"),
     path("api/records/create/", views.create_records, name="create_records"),
+    path("api/records/export/", views.records_export, name="records_export"),
     path("api/records/<int:record_id>/cancel/", views.cancel_record, name="cancel_record"),
+
+    # Аналитика
+    path("api/analytics/<str:dataset>/", views.analytics_export, name="analytics_export"),
     
     # Пользователи
     path("api/users/<int:user_id>/", views.user_profile, name="user_profile"),
@@ -30,6 +36,7 @@ urlpatterns = [
     # Вспомогательные
     path("api/specializations/", views.specializations_list, name="specializations_list"),
     path("api/cities/", views.cities_list, name="cities_list"),
+    path("api/facets/", views.facets, name="facets"),
     
     # Аутентификация
     path("api/auth/current-user/", views.current_user, name="current_user"),
@@ -38,23 +45,45 @@ urlpatterns = [
     path("api/register/", views.register, name="register"),
     
     # ==================== Статические файлы ====================
-    # Отдаём собранные ассеты по пути /assets/...
+    # Собранные ассеты Vite по пути /assets/... - в именах хэш содержимого
     re_path(
         r"^assets/(?P<path>.*)$",
-        serve,
-        {"document_root": settings.BASE_DIR / "fitness" / "static" / "assets"},
+        files.serve,
+        {
+            "document_root": settings.BASE_DIR / "fitness" / "static" / "assets",
+            "location": "assets",
+            "immutable": True,
+        },
     ),
-    # Отдаём изображения напрямую из корня static (для совместимости с Vite)
+    # Изображения из корня static (для совместимости с Vite)
     re_path(
         r"^(?P<path>gym\.png|vite\.svg|back\.jpg)$",
-        serve,
-        {"document_root": settings.BASE_DIR / "fitness" / "static"},
+        files.serve,
+        {"document_root": settings.BASE_DIR / "fitness" / "static", "location": "root"},
+    ),
+    # Статика: в production собранная collectstatic с хэшами в именах
+    re_path(
+        rf"^{settings.STATIC_URL.strip('/')}/(?P<path>.*)$",
+        files.serve,
+        {
+            "document_root": settings.STATIC_ROOT if settings.FILES_PRODUCTION else settings.STATICFILES_DIRS[0],
+            "location": "static",
+            "immutable": "manifest",
+        },
     ),
-] + static(settings.STATIC_URL, document_root=settings.BASE_DIR / "fitness" / "static") + [
     # ==================== React SPA ====================
     # Главная страница
     path("", views.index, name="index"),
     # Любой другой путь отдаём фронту, кроме API и статики
-    re_path(r"^(?!api/|static/|assets/|media/|gym\.png|vite\.svg|back\.jpg).*$", views.index, name="spa"),
+    re_path(r"^(?!api/|metrics$|static/|assets/|media/|gym\.png|vite\.svg|back\.jpg).*$", views.index, name="spa"),
 ]
 
+# Загруженные файлы: в production их отдаёт веб-сервер, Django - только при
+# FILES_SERVE_MEDIA (по умолчанию в DEBUG или при настроенном FILES_OFFLOAD)
+if settings.FILES_SERVE_MEDIA:
+    urlpatterns.append(re_path(
+        rf"^{settings.MEDIA_URL.strip('/')}/(?P<path>.*)$",
+        files.serve,
+        {"document_root": settings.MEDIA_ROOT, "location": "media"},
+    ))
+
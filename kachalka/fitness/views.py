@@ -1,17 +1,32 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods, condition
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User as DjangoUser
 from django.contrib.auth import login, logout
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import IntegrityError
 from django.utils import timezone
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
-from .models import Gym, Trainer, UserProfile, Record, Review, GymReview
+import tempfile
+from .models import Amenity, Gym, GymImage, Trainer, UserProfile, Record, Review, GymReview
 from .serializers import (
     serialize_gym, serialize_trainer, serialize_user_profile,
-    serialize_record, serialize_review, serialize_gym_review
+    serialize_record, serialize_review, serialize_gym_review,
+    with_relations, load_relations
+)
+from . import analytics, metrics
+from .availability import MAX_RANGE_DAYS, SLOT_DURATION, free_slots, is_slot_start, slot_labels
+from .booking import TrainerBusy, book_slots
+from .export import CONTENT_TYPES, DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, export_lines, export_queryset
+from .facets import build_facets
+from .pagination import MAX_LIMIT, CursorError, paginate_keyset, parse_limit
+from .cache import cached_response, text_param, csv_param, exact_param
+from .conditional import (
+    BOOKED_SLOTS_WINDOW, gym_detail_etag, gym_detail_last_modified,
+    trainer_detail_etag, trainer_detail_last_modified
 )
 from .forms import (
     GymFilterForm, TrainerFilterForm, ReviewFilterForm, RecordFilterForm,
@@ -20,6 +35,91 @@ from .forms import (
 )
 
 
+# Допустимые сортировки списков (ключи order_by -> поля для ORDER BY)
+# Сортировка по рейтингу идёт по байесовскому ranking_score (индекс -ranking_score, name, id)
+GYM_ORDERINGS = {
+    'rating_desc': ('-ranking_score', 'name'),
+    'rating_asc': ('ranking_score', 'name'),
+    'name': ('name',),
+}
+
+TRAINER_ORDERINGS = {
+    'rating_desc': ('-ranking_score', 'full_name'),
+    'rating_asc': ('ranking_score', 'full_name'),
+    'name': ('full_name',),
+}
+
+
+def _list_ordering(order_by, top, orderings, default, search=''):
+    """Выбирает сортировку списка по параметрам order_by, top и search"""
+    if order_by in orderings:
+        return orderings[order_by]
+    if top:
+        # Если указан top, сортируем по рейтингу
+        return orderings['rating_desc']
+    if search:
+        # При поиске - по релевантности (аннотация search_rank из fitness.search)
+        return ('-search_rank',) + default
+    # По умолчанию сортируем по имени
+    return default
+
+
+def _search_text(filter_form):
+    """Поисковая строка из провалидированной формы фильтрации"""
+    if not filter_form.is_valid():
+        return ''
+    return (filter_form.cleaned_data.get('search') or '').strip()
+
+
+def _wants_cursor_page(request):
+    """
+    Клиент запросил постраничную выдачу (непустой limit или cursor)
+    Пустые значения игнорируются так же, как в ключе кэша (fitness.cache), иначе
+    ?cursor= и запрос без параметров получили бы один закэшированный ответ разной формы.
+    """
+    return bool(request.GET.get('limit', '').strip() or request.GET.get('cursor', '').strip())
+
+
+def _keyset_response(request, queryset, ordering, key, serializer):
+    """
+    Отдаёт одну страницу списка по курсору
+    Параметры:
+        - limit: размер страницы (по умолчанию 50, максимум 200)
+        - cursor: значение next_cursor из предыдущего ответа
+    """
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        objects, next_cursor = paginate_keyset(
+            queryset, ordering,
+            cursor=request.GET.get('cursor'),
+            limit=limit
+        )
+    except CursorError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        key: [serializer(obj) for obj in objects],
+        'next_cursor': next_cursor,
+    })
+
+
+def _capped_list_response(queryset, ordering, top, key, serializer):
+    """
+    Список без limit/cursor (формат с count): не больше top и не больше MAX_LIMIT строк
+    Некорректный или неположительный top игнорируется. Если строк больше,
+    next_cursor позволяет дочитать список постранично (limit/cursor).
+    """
+    try:
+        top_count = int(top) if top else 0
+    except ValueError:
+        top_count = 0
+    limit = min(top_count, MAX_LIMIT) if top_count > 0 else MAX_LIMIT
+    
+    objects, next_cursor = paginate_keyset(queryset, ordering, limit=limit)
+    data = [serializer(obj) for obj in objects]
+    return JsonResponse({key: data, 'count': len(data), 'next_cursor': next_cursor})
+
+
 def index(request):
     """
     Отдаёт базовый HTML шаблон React.
@@ -27,21 +127,49 @@ def index(request):
     return render(request, "index.html")
 
 
+@require_http_methods(["GET"])
+def prometheus_metrics(request):
+    """
+    Метрики в формате Prometheus (см. fitness.metrics)
+    GET /metrics
+    Нужен заголовок Authorization: Bearer <METRICS_TOKEN>; без токена метрики
+    открыты только при DEBUG
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token and not settings.DEBUG:
+        return JsonResponse({'error': 'Доступ запрещен: задайте METRICS_TOKEN'}, status=403)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+    if not metrics.enabled():
+        return JsonResponse({'error': 'Метрики отключены'}, status=404)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # ==================== API для залов ====================
 
 @require_http_methods(["GET"])
+@cached_response(
+    depends_on=(Gym, GymImage, GymReview, Trainer, Amenity),
+    params={
+        'search': text_param, 'city': exact_param, 'amenities': csv_param,
+        'top': exact_param, 'order_by': exact_param,
+        'limit': exact_param, 'cursor': exact_param,
+    }
+)
 def gyms_list(request):
     """
     Получить список всех залов с фильтрацией
     GET /api/gyms/
     Параметры:
-        - search: поиск по названию или адресу
-        - city: фильтр по городу
-        - amenities: фильтр по удобствам (через запятую)
-        - top: количество топ залов по рейтингу (например, top=5)
+        - search: полнотекстовый поиск по названию и адресу (результаты по релевантности)
+        - city: фильтр по городу (точное название из /api/cities/)
+        - amenities: фильтр по удобствам (через запятую, зал должен иметь все)
+        - top: количество топ залов по байесовскому рейтингу ranking_score (например, top=5)
         - order_by: сортировка (rating_desc, rating_asc, name)
+        - limit, cursor: постраничная выдача по курсору (вместо count возвращается next_cursor)
+    Без limit/cursor возвращается не больше 200 залов (MAX_LIMIT) и next_cursor для продолжения.
     """
-    gyms = Gym.objects.all().prefetch_related('images', 'trainers')
+    gyms = with_relations(Gym.objects.all(), serialize_gym)
     
     # Используем форму для фильтрации (сначала фильтруем)
     filter_form = GymFilterForm(request.GET)
@@ -52,47 +180,31 @@ def gyms_list(request):
     # Проверяем параметр top и order_by для сортировки
     top = request.GET.get('top')
     order_by = request.GET.get('order_by', '')
+    ordering = _list_ordering(order_by, top, GYM_ORDERINGS, ('name',), _search_text(filter_form))
     
-    # Сортировка
-    if order_by == 'rating_desc':
-        gyms = gyms.order_by('-rating', 'name')
-    elif order_by == 'rating_asc':
-        gyms = gyms.order_by('rating', 'name')
-    elif order_by == 'name':
-        gyms = gyms.order_by('name')
-    elif top:
-        # Если указан top, сортируем по рейтингу
-        gyms = gyms.order_by('-rating', 'name')
-    else:
-        # По умолчанию сортируем по имени
-        gyms = gyms.order_by('name')
-    
-    # Ограничиваем количество после фильтрации и сортировки
-    if top:
-        try:
-            top_count = int(top)
-            gyms = gyms[:top_count]
-        except ValueError:
-            pass
+    # Постраничная выдача по курсору, если клиент её запросил
+    if _wants_cursor_page(request):
+        return _keyset_response(request, gyms, ordering, 'gyms', serialize_gym)
     
-    data = [serialize_gym(gym) for gym in gyms]
-    return JsonResponse({'gyms': data, 'count': len(data)})
+    return _capped_list_response(gyms, ordering, top, 'gyms', serialize_gym)
 
 
 @require_http_methods(["GET"])
+@condition(etag_func=gym_detail_etag, last_modified_func=gym_detail_last_modified)
 def gym_detail(request, gym_id):
     """
     Получить детальную информацию о зале
     GET /api/gyms/<id>/
+    Поддерживает If-None-Match / If-Modified-Since (ответ 304 без сборки данных)
     """
-    gym = get_object_or_404(Gym.objects.prefetch_related('images', 'trainers', 'gym_reviews__user'), id=gym_id)
+    gym = get_object_or_404(with_relations(Gym.objects.all(), serialize_gym), id=gym_id)
     
     # Получаем тренеров этого зала
-    trainers = gym.trainers.all().prefetch_related('reviews', 'gyms')
+    trainers = with_relations(gym.trainers.all(), serialize_trainer)
     trainers_data = [serialize_trainer(trainer) for trainer in trainers]
     
     # Получаем отзывы на зал
-    reviews = gym.gym_reviews.all().select_related('user')
+    reviews = with_relations(gym.gym_reviews.all(), serialize_gym_review)
     reviews_data = [serialize_gym_review(review) for review in reviews]
     
     gym_data = serialize_gym(gym)
@@ -105,18 +217,28 @@ def gym_detail(request, gym_id):
 # ==================== API для тренеров ====================
 
 @require_http_methods(["GET"])
+@cached_response(
+    depends_on=(Trainer, Review, Gym),
+    params={
+        'search': text_param, 'gym': exact_param, 'specialization': text_param,
+        'top': exact_param, 'order_by': exact_param,
+        'limit': exact_param, 'cursor': exact_param,
+    }
+)
 def trainers_list(request):
     """
     Получить список всех тренеров с фильтрацией
     GET /api/trainers/
     Параметры:
-        - search: поиск по имени
+        - search: полнотекстовый поиск по имени и специализации (результаты по релевантности)
         - gym: фильтр по залу (ID)
         - specialization: фильтр по специализации
-        - top: количество топ тренеров по рейтингу (например, top=5)
+        - top: количество топ тренеров по байесовскому рейтингу ranking_score (например, top=5)
         - order_by: сортировка (rating_desc, rating_asc, name)
+        - limit, cursor: постраничная выдача по курсору (вместо count возвращается next_cursor)
+    Без limit/cursor возвращается не больше 200 тренеров (MAX_LIMIT) и next_cursor для продолжения.
     """
-    trainers = Trainer.objects.all().prefetch_related('gyms', 'reviews')
+    trainers = with_relations(Trainer.objects.all(), serialize_trainer)
     
     # Используем форму для фильтрации (сначала фильтруем)
     filter_form = TrainerFilterForm(request.GET)
@@ -127,57 +249,38 @@ def trainers_list(request):
     # Проверяем параметр top и order_by для сортировки
     top = request.GET.get('top')
     order_by = request.GET.get('order_by', '')
+    ordering = _list_ordering(order_by, top, TRAINER_ORDERINGS, ('full_name',), _search_text(filter_form))
     
-    # Сортировка
-    if order_by == 'rating_desc':
-        trainers = trainers.order_by('-rating', 'full_name')
-    elif order_by == 'rating_asc':
-        trainers = trainers.order_by('rating', 'full_name')
-    elif order_by == 'name':
-        trainers = trainers.order_by('full_name')
-    elif top:
-        # Если указан top, сортируем по рейтингу
-        trainers = trainers.order_by('-rating', 'full_name')
-    else:
-        # По умолчанию сортируем по имени
-        trainers = trainers.order_by('full_name')
-    
-    # Ограничиваем количество после фильтрации и сортировки
-    if top:
-        try:
-            top_count = int(top)
-            trainers = trainers[:top_count]
-        except ValueError:
-            pass
+    # Постраничная выдача по курсору, если клиент её запросил
+    if _wants_cursor_page(request):
+        return _keyset_response(request, trainers, ordering, 'trainers', serialize_trainer)
     
-    data = [serialize_trainer(trainer) for trainer in trainers]
-    return JsonResponse({'trainers': data, 'count': len(data)})
+    return _capped_list_response(trainers, ordering, top, 'trainers', serialize_trainer)
 
 
 @require_http_methods(["GET"])
+@condition(etag_func=trainer_detail_etag, last_modified_func=trainer_detail_last_modified)
 def trainer_detail(request, trainer_id):
     """
     Получить детальную информацию о тренере
     GET /api/trainers/<id>/
+    Поддерживает If-None-Match / If-Modified-Since (ответ 304 без сборки данных)
     """
     trainer = get_object_or_404(
-        Trainer.objects.prefetch_related('gyms', 'reviews__user'),
+        with_relations(Trainer.objects.all(), serialize_trainer),
         id=trainer_id
     )
     
     trainer_data = serialize_trainer(trainer)
     
     # Добавляем отзывы
-    reviews = trainer.reviews.all().select_related('user__user')
+    reviews = with_relations(trainer.reviews.all(), serialize_review)
     trainer_data['reviews'] = [serialize_review(review) for review in reviews]
     
     # Добавляем забронированные слоты
-    from datetime import datetime, timedelta
-    from django.utils import timezone
-    
     # Получаем записи на ближайшие 30 дней
     start_date = timezone.now()
-    end_date = start_date + timedelta(days=30)
+    end_date = start_date + BOOKED_SLOTS_WINDOW
     
     booked_slots = Record.objects.filter(
         trainer=trainer,
@@ -196,6 +299,45 @@ def trainer_detail(request, trainer_id):
     return JsonResponse(trainer_data)
 
 
+@require_http_methods(["GET"])
+def trainer_availability(request, trainer_id):
+    """
+    Свободные слоты тренера по дням
+    GET /api/trainers/<id>/availability/?from=ГГГГ-ММ-ДД&to=ГГГГ-ММ-ДД
+    Параметры:
+        - from: первый день (по умолчанию сегодня)
+        - to: последний день включительно (по умолчанию from + 30 дней, не более 31 дня)
+    """
+    if not Trainer.objects.filter(id=trainer_id).exists():
+        return JsonResponse({'error': 'Тренер не найден'}, status=404)
+    
+    try:
+        today = timezone.localdate()
+        date_from = datetime.strptime(request.GET['from'], '%Y-%m-%d').date() \
+            if request.GET.get('from') else today
+        date_to = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() \
+            if request.GET.get('to') else date_from + BOOKED_SLOTS_WINDOW
+    except ValueError:
+        return JsonResponse({'error': 'Даты должны быть в формате ГГГГ-ММ-ДД'}, status=400)
+    except OverflowError:
+        # from у верхней границы календаря: from + окно по умолчанию не помещается в date
+        return JsonResponse({'error': 'Дата вне допустимого диапазона'}, status=400)
+    
+    if date_to < date_from:
+        return JsonResponse({'error': 'Параметр to раньше from'}, status=400)
+    if (date_to - date_from).days >= MAX_RANGE_DAYS:
+        return JsonResponse({'error': f'Диапазон не должен превышать {MAX_RANGE_DAYS} дней'}, status=400)
+    
+    return JsonResponse({
+        'trainer_id': trainer_id,
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'slot_times': slot_labels(),
+        'slot_duration_minutes': int(SLOT_DURATION.total_seconds() // 60),
+        'days': free_slots(trainer_id, date_from, date_to),
+    })
+
+
 # ==================== API для отзывов ====================
 
 @require_http_methods(["GET", "POST"])
@@ -203,11 +345,11 @@ def trainer_detail(request, trainer_id):
 def reviews_list(request):
     """
     Получить список отзывов или создать новый
-    GET /api/reviews/?trainer=<id>
+    GET /api/reviews/?trainer=<id>&limit=<n>&cursor=<next_cursor>
     POST /api/reviews/
     """
     if request.method == 'GET':
-        reviews = Review.objects.all().select_related('user__user', 'trainer')
+        reviews = with_relations(Review.objects.all(), serialize_review)
         
         # Используем форму для фильтрации
         filter_form = ReviewFilterForm(request.GET)
@@ -219,8 +361,7 @@ def reviews_list(request):
                 'errors': filter_form.errors
             }, status=400)
         
-        data = [serialize_review(review) for review in reviews]
-        return JsonResponse({'reviews': data, 'count': len(data)})
+        return _keyset_response(request, reviews, ('-created_at',), 'reviews', serialize_review)
     
     # POST - создание отзыва
     try:
@@ -240,7 +381,7 @@ def reviews_list(request):
             return JsonResponse({
                 'success': True,
                 'message': 'Отзыв успешно создан',
-                'review': serialize_review(review)
+                'review': serialize_review(load_relations([review], serialize_review)[0])
             }, status=201)
         else:
             return JsonResponse({
@@ -267,11 +408,11 @@ def reviews_list(request):
 def records_list(request):
     """
     Получить список записей или создать новую
-    GET /api/records/?user=<id>&status=<status>
+    GET /api/records/?user=<id>&status=<status>&limit=<n>&cursor=<next_cursor>
     POST /api/records/
     """
     if request.method == 'GET':
-        records = Record.objects.all().select_related('user__user', 'trainer')
+        records = with_relations(Record.with_effective_status(Record.objects.all()), serialize_record)
         
         # Используем форму для фильтрации
         filter_form = RecordFilterForm(request.GET)
@@ -283,8 +424,7 @@ def records_list(request):
                 'errors': filter_form.errors
             }, status=400)
         
-        data = [serialize_record(record) for record in records]
-        return JsonResponse({'records': data, 'count': len(data)})
+        return _keyset_response(request, records, ('-datetime',), 'records', serialize_record)
     
     # POST - создание записи
     try:
@@ -296,7 +436,7 @@ def records_list(request):
             return JsonResponse({
                 'success': True,
                 'message': 'Запись успешно создана',
-                'record': serialize_record(record)
+                'record': serialize_record(load_relations([record], serialize_record)[0])
             }, status=201)
         else:
             return JsonResponse({
@@ -316,6 +456,82 @@ def records_list(request):
         }, status=500)
 
 
+@require_http_methods(["GET"])
+def records_export(request):
+    """
+    Потоковая выгрузка записей для сотрудников (см. fitness.export)
+    GET /api/records/export/?format=ndjson|csv&user=<id>&trainer=<id>&status=<status>&date_from=&date_to=
+    Память не зависит от количества записей: строки отдаются по мере чтения из базы.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Необходима авторизация'}, status=401)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': f'Неизвестный формат: {export_format}. Доступны: {", ".join(EXPORT_FORMATS)}'}, status=400)
+
+    filter_form = RecordFilterForm(request.GET)
+    if not filter_form.is_valid():
+        return JsonResponse({
+            'error': 'Ошибка валидации',
+            'errors': filter_form.errors
+        }, status=400)
+
+    response = StreamingHttpResponse(
+        export_lines(export_queryset(filter_form), export_format, DEFAULT_CHUNK_SIZE),
+        content_type=CONTENT_TYPES[export_format],
+    )
+    filename = f'records_{timezone.localtime():%Y%m%d_%H%M%S}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@require_http_methods(["GET"])
+def analytics_export(request, dataset):
+    """
+    Выгрузка одного месяца набора для аналитики в Parquet или Arrow (см. fitness.analytics)
+    GET /api/analytics/<records|reviews|gym_reviews>/?month=ГГГГ-ММ&format=parquet|arrow
+    Полная инкрементальная выгрузка по месяцам - командой export_analytics.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Необходима авторизация'}, status=401)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Доступ запрещен'}, status=403)
+
+    if dataset not in analytics.DATASETS:
+        return JsonResponse({'error': f'Неизвестный набор: {dataset}. Доступны: {", ".join(analytics.DATASETS)}'}, status=404)
+    file_format = request.GET.get('format', 'parquet')
+    if file_format not in analytics.FORMATS:
+        return JsonResponse({'error': f'Неизвестный формат: {file_format}. Доступны: {", ".join(analytics.FORMATS)}'}, status=400)
+    month = request.GET.get('month') or f'{timezone.localtime():%Y-%m}'
+    try:
+        datetime.strptime(month, '%Y-%m')
+    except ValueError:
+        return JsonResponse({'error': 'Неверный формат месяца, ожидается ГГГГ-ММ'}, status=400)
+
+    extension, content_type = analytics.FORMATS[file_format]
+    # Файл пишется во временный файл на диске и отдаётся потоком;
+    # NamedTemporaryFile удаляется, когда FileResponse закрывает его после отдачи
+    export_file = tempfile.NamedTemporaryFile(suffix=extension)
+    try:
+        analytics.month_file(dataset, month, export_file.name, file_format)
+    except ImproperlyConfigured as e:
+        export_file.close()
+        return JsonResponse({'error': str(e)}, status=501)
+    except Exception:
+        export_file.close()
+        raise
+
+    return FileResponse(
+        export_file,
+        as_attachment=True,
+        filename=f'{dataset}_{month}{extension}',
+        content_type=content_type,
+    )
+
+
 # ==================== API для пользователей ====================
 
 @require_http_methods(["GET"])
@@ -324,31 +540,17 @@ def user_profile(request, user_id):
     Получить профиль пользователя
     GET /api/users/<id>/
     """
-    profile = get_object_or_404(UserProfile.objects.select_related('user'), id=user_id)
+    profile = get_object_or_404(with_relations(UserProfile.objects.all(), serialize_user_profile), id=user_id)
     
     profile_data = serialize_user_profile(profile)
     
-    # Добавляем записи пользователя
-    records = Record.objects.filter(user=profile).select_related('trainer')
-    
-    # Оптимизированное обновление статусов: обновляем только те записи, которые нужно обновить
-    # Используем bulk update вместо вызова update_status() для каждой записи
-    from datetime import timedelta
-    now = timezone.now()
-    cutoff_time = now - timedelta(hours=1, minutes=30)
-    
-    # Находим записи, которые нужно обновить (scheduled и прошло более 1.5 часа)
-    records_to_update = records.filter(
-        status='scheduled',
-        datetime__lte=cutoff_time
+    # Добавляем записи пользователя. Статус закончившихся тренировок вычисляется
+    # при чтении (effective_status), в базу их переводит update_record_statuses
+    records = with_relations(
+        Record.with_effective_status(Record.objects.filter(user=profile)),
+        serialize_record
     )
     
-    if records_to_update.exists():
-        # Используем bulk update для эффективного обновления
-        records_to_update.update(status='completed')
-        # Перезагружаем записи после обновления статусов
-        records = Record.objects.filter(user=profile).select_related('trainer')
-    
     profile_data['records'] = [serialize_record(record) for record in records]
     
     return JsonResponse(profile_data)
@@ -357,6 +559,7 @@ def user_profile(request, user_id):
 # ==================== Вспомогательные API ====================
 
 @require_http_methods(["GET"])
+@cached_response(depends_on=(Trainer,))
 def specializations_list(request):
     """
     Получить список всех специализаций тренеров
@@ -367,21 +570,40 @@ def specializations_list(request):
 
 
 @require_http_methods(["GET"])
+@cached_response(depends_on=(Gym,))
 def cities_list(request):
     """
-    Получить список всех городов (извлекаются из адресов залов)
+    Получить список всех городов, в которых есть залы
     GET /api/cities/
     """
-    # Извлекаем города из адресов (предполагается формат "улица, город")
-    addresses = Gym.objects.values_list('address', flat=True)
-    cities = set()
-    for address in addresses:
-        parts = address.split(',')
-        if len(parts) >= 2:
-            city = parts[-1].strip()
-            cities.add(city)
-    
-    return JsonResponse({'cities': sorted(list(cities))})
+    # DISTINCT по индексу на Gym.city (поле заполняется из адреса при сохранении)
+    cities = (
+        Gym.objects.exclude(city='')
+        .order_by('city')
+        .values_list('city', flat=True)
+        .distinct()
+    )
+    return JsonResponse({'cities': list(cities)})
+
+
+@require_http_methods(["GET"])
+@cached_response(
+    depends_on=(Gym, Trainer, Amenity),
+    params={
+        'search': text_param, 'city': exact_param, 'amenities': csv_param,
+        'gym': exact_param, 'specialization': text_param,
+    }
+)
+def facets(request):
+    """
+    Счётчики для фильтров каталога одним запросом
+    GET /api/facets/
+    Параметры (те же, что у /api/gyms/ и /api/trainers/):
+        - search, city, amenities: фильтры залов
+        - gym, specialization: фильтры тренеров
+    Возвращает количество залов по городам и удобствам, тренеров по специализациям и залам
+    """
+    return JsonResponse(build_facets(request.GET))
 
 
 # ==================== API для аутентификации ====================
@@ -513,7 +735,7 @@ def register(request):
 def cancel_record(request, record_id):
     """Отменить запись на тренировку"""
     try:
-        record = get_object_or_404(Record, id=record_id)
+        record = get_object_or_404(with_relations(Record.objects.all(), serialize_record), id=record_id)
         
         # Проверяем, что пользователь владелец записи
         if not request.user.is_authenticated:
@@ -539,10 +761,67 @@ def cancel_record(request, record_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+MONTHS_RU = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+             'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря']
+
+# На сколько вперёд можно записаться через create_records
+BOOKING_HORIZON = timedelta(days=30)
+
+
+def _format_date_ru(value):
+    """Дата словами в локальном часовом поясе: '14 декабря 2025'"""
+    local = timezone.localtime(value)
+    return f"{local.day} {MONTHS_RU[local.month - 1]} {local.year}"
+
+
+def _parse_slot(slot_datetime_str):
+    """
+    Разбирает слот вида "2025-12-14T16:30:00" в aware datetime.
+    Время приходит в локальном часовом поясе (Europe/Moscow); суффиксы 'Z' и '+03:00' отбрасываются.
+    """
+    if '+' in slot_datetime_str:
+        clean_datetime_str = slot_datetime_str.split('+')[0]
+    elif 'Z' in slot_datetime_str:
+        clean_datetime_str = slot_datetime_str.replace('Z', '')
+    else:
+        clean_datetime_str = slot_datetime_str
+    
+    slot_datetime = datetime.fromisoformat(clean_datetime_str)
+    if timezone.is_naive(slot_datetime):
+        slot_datetime = timezone.make_aware(slot_datetime)
+    return slot_datetime
+
+
+def _validate_slot(slot_datetime, slot_datetime_str, now):
+    """(исход для метрик, текст ошибки) для слота или None, если слот можно бронировать"""
+    if slot_datetime <= now:
+        return 'past_time', f'Нельзя записаться на прошедшее время: {slot_datetime_str}'
+    
+    max_date = now + BOOKING_HORIZON
+    if slot_datetime > max_date:
+        return 'over_horizon', (
+            f'Нельзя записаться более чем на месяц вперед. '
+            f'Максимальная дата записи: {_format_date_ru(max_date)}. '
+            f'Выбранная дата: {_format_date_ru(slot_datetime)}'
+        )
+    
+    if not is_slot_start(slot_datetime):
+        return 'off_grid', f'Время не совпадает со слотом расписания: {slot_datetime_str}'
+    
+    return None
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def create_records(request):
-    """Создать записи на тренировки"""
+    """
+    Создать записи на тренировки
+    POST /api/records/create/
+    Body: {trainer_id, time_slots: ["2025-12-14T16:30:00", ...]}
+    Все слоты проверяются заранее, конфликты ищутся одним запросом,
+    записи создаются одним bulk_create в транзакции. Занятые параллельным
+    бронированием слоты возвращаются как «Слот уже занят» без ожидания.
+    """
     try:
         if not request.user.is_authenticated:
             return JsonResponse({'error': 'Необходима авторизация'}, status=401)
@@ -551,103 +830,45 @@ def create_records(request):
         trainer_id = data.get('trainer_id')
         time_slots = data.get('time_slots', [])
         
-        print(f"DEBUG: trainer_id={trainer_id}, time_slots={time_slots}")
-        
         if not trainer_id or not time_slots:
             return JsonResponse({'error': 'Не указан тренер или временные слоты'}, status=400)
         
-        # Получаем профиль пользователя и тренера
         try:
             user_profile = request.user.profile
-            trainer = Trainer.objects.get(id=trainer_id)
-        except (UserProfile.DoesNotExist, Trainer.DoesNotExist):
+        except UserProfile.DoesNotExist:
             return JsonResponse({'error': 'Пользователь или тренер не найден'}, status=404)
         
-        created_records = []
+        # Разбор и проверка всех слотов до обращения к записям
+        now = timezone.now()
         errors = []
-        
+        requested = {}
         for slot_datetime_str in time_slots:
             try:
-                # Парсим дату и время (формат: "2025-12-14T16:30:00")
-                # Время приходит в локальном часовом поясе (Europe/Moscow) без указания часового пояса
-                # Удаляем 'Z' или часовой пояс, если есть
-                if '+' in slot_datetime_str:
-                    # Удаляем часовой пояс (например, "+03:00")
-                    clean_datetime_str = slot_datetime_str.split('+')[0]
-                elif 'Z' in slot_datetime_str:
-                    # Удаляем 'Z' (UTC маркер)
-                    clean_datetime_str = slot_datetime_str.replace('Z', '')
-                else:
-                    clean_datetime_str = slot_datetime_str
-                
-                # Парсим как naive datetime (без часового пояса)
-                slot_datetime = datetime.fromisoformat(clean_datetime_str)
-                
-                # Интерпретируем как локальное время (Europe/Moscow) и делаем aware
-                if timezone.is_naive(slot_datetime):
-                    # Используем локальный часовой пояс сервера (Europe/Moscow)
-                    slot_datetime = timezone.make_aware(slot_datetime)
-                
-                # Проверяем, что дата в будущем
-                if slot_datetime <= timezone.now():
-                    errors.append(f'Нельзя записаться на прошедшее время: {slot_datetime_str}')
-                    continue
-                
-                # Проверяем ограничение на месяц вперед
-                from datetime import timedelta
-                max_date = timezone.now() + timedelta(days=30)
-                if slot_datetime > max_date:
-                    # Форматируем дату для более понятного сообщения
-                    local_max_date = timezone.localtime(max_date)
-                    local_slot_date = timezone.localtime(slot_datetime)
-                    # Используем русские названия месяцев
-                    months_ru = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
-                                'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря']
-                    max_date_str = f"{local_max_date.day} {months_ru[local_max_date.month - 1]} {local_max_date.year}"
-                    slot_date_str = f"{local_slot_date.day} {months_ru[local_slot_date.month - 1]} {local_slot_date.year}"
-                    errors.append(
-                        f'Нельзя записаться более чем на месяц вперед. '
-                        f'Максимальная дата записи: {max_date_str}. '
-                        f'Выбранная дата: {slot_date_str}'
-                    )
-                    continue
-                
-                # Проверяем уникальность: один пользователь не может записаться на одно время к одному тренеру дважды
-                existing_user_record = Record.objects.filter(
-                    user=user_profile,
-                    trainer=trainer,
-                    datetime=slot_datetime,
-                    status='scheduled'
-                ).exists()
-                
-                if existing_user_record:
-                    errors.append(f'Вы уже записаны на это время: {slot_datetime_str}')
-                    continue
-                
-                # Проверяем, что слот не занят другим пользователем
-                existing_record = Record.objects.filter(
-                    trainer=trainer,
-                    datetime=slot_datetime,
-                    status='scheduled'
-                ).exists()
-                
-                if existing_record:
-                    errors.append(f'Слот уже занят: {slot_datetime_str}')
-                    continue
-                
-                # Создаем запись
-                record = Record.objects.create(
-                    user=user_profile,
-                    trainer=trainer,
-                    datetime=slot_datetime,
-                    status='scheduled'
-                )
-                created_records.append(serialize_record(record))
-                
-            except Exception as e:
-                error_msg = f'Ошибка создания записи {slot_datetime_str}: {str(e)}'
-                print(f"DEBUG: {error_msg}")
-                errors.append(error_msg)
+                slot_datetime = _parse_slot(str(slot_datetime_str))
+            except ValueError as e:
+                errors.append(f'Ошибка создания записи {slot_datetime_str}: {str(e)}')
+                metrics.count_booking('invalid')
+                continue
+            
+            problem = _validate_slot(slot_datetime, slot_datetime_str, now)
+            if problem:
+                outcome, error = problem
+                errors.append(error)
+                metrics.count_booking(outcome)
+            elif slot_datetime not in requested:
+                requested[slot_datetime] = slot_datetime_str
+        
+        # Проверка пересечений и вставка одной транзакцией (см. fitness.booking)
+        trainer, new_records, booking_errors = book_slots(user_profile, trainer_id, requested)
+        if trainer is None:
+            return JsonResponse({'error': 'Пользователь или тренер не найден'}, status=404)
+        errors.extend(booking_errors)
+        metrics.count_booking('created', len(new_records))
+        metrics.count_booking('conflict', len(booking_errors))
+        
+        # Пользователь, тренер и его залы уже загружены - сериализация без запросов
+        created_records = load_relations(new_records, serialize_record)
+        created_records = [serialize_record(record) for record in created_records]
         
         if created_records:
             return JsonResponse({
@@ -663,6 +884,20 @@ def create_records(request):
                 'errors': errors
             }, status=400)
             
+    except TrainerBusy:
+        # Режим BOOKING_LOCK_MODE = 'trainer': тренера бронирует другой запрос, не ждём
+        metrics.count_booking('conflict', len(requested))
+        return JsonResponse({
+            'success': False,
+            'error': 'Расписание тренера сейчас обновляется. Попробуйте снова через несколько секунд.'
+        }, status=409)
+    except IntegrityError:
+        # Параллельная запись заняла слот между проверкой и вставкой
+        metrics.count_booking('conflict', len(requested))
+        return JsonResponse({
+            'success': False,
+            'error': 'Выбранное время только что заняли. Обновите расписание и попробуйте снова.'
+        }, status=409)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Неверный формат JSON'}, status=400)
     except Exception as e:
@@ -739,13 +974,12 @@ def create_gym_review(request):
             )
             message = 'Отзыв успешно создан'
         
-        # Обновляем рейтинг зала
-        gym.update_rating()
+        # Рейтинг зала обновляется сигналом (сумма и количество оценок через F())
         
         return JsonResponse({
             'success': True,
             'message': message,
-            'review': serialize_gym_review(existing_review)
+            'review': serialize_gym_review(load_relations([existing_review], serialize_gym_review)[0])
         }, status=201)
         
     except json.JSONDecodeError:
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -32,6 +33,10 @@ DEBUG = os.getenv('DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = []
 
+# Запрещать SQL-запросы внутри сериализаторов (fitness.serializers).
+# Включается в разработке и тестах, чтобы ловить незагруженные связи.
+SERIALIZERS_STRICT = os.getenv('SERIALIZERS_STRICT', 'False') == 'True'
+
 
 # Application definition
 
@@ -46,11 +51,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы замерять все остальные middleware и view
+    "fitness.timing.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # После аутентификации: профилирование по флагу доступно только сотрудникам
+    "fitness.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -91,6 +100,81 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# При нескольких воркерах нужен общий кэш, например:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        "LOCATION": os.getenv('CACHE_LOCATION', 'fitness'),
+    }
+}
+
+# Кэш ответов каталога (fitness.cache): включение и время жизни в секундах
+CATALOG_CACHE_ENABLED = os.getenv('CATALOG_CACHE_ENABLED', 'True') == 'True'
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))
+
+# Блокировки при бронировании (fitness.booking): 'slot' - неблокирующие advisory-блокировки
+# слотов (PostgreSQL), 'trainer' - SELECT ... FOR UPDATE NOWAIT строки тренера (занят - сразу 409)
+BOOKING_LOCK_MODE = os.getenv('BOOKING_LOCK_MODE', 'slot')
+
+# Байесовский рейтинг для сортировки (Gym/Trainer.ranking_score): априорная средняя
+# оценка и её вес в «виртуальных отзывах». После изменения: manage.py refresh_ranking_scores
+RANKING_PRIOR_MEAN = float(os.getenv('RANKING_PRIOR_MEAN', '4.0'))
+RANKING_PRIOR_WEIGHT = float(os.getenv('RANKING_PRIOR_WEIGHT', '5'))
+
+# Замеры запросов (fitness.timing): заголовки Server-Timing / X-Query-Count и лог
+# fitness.requests. SAMPLE_RATE - доля замеряемых запросов (0.0 - 1.0)
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'True') == 'True'
+REQUEST_TIMING_SAMPLE_RATE = float(os.getenv('REQUEST_TIMING_SAMPLE_RATE', '1.0'))
+
+# Профилирование запросов (fitness.profiling): заголовок X-Profile: 1 или ?_profile=1
+# от сотрудника, либо выборка по имени URL, например PROFILING_SAMPLE_RATES='{"trainer_detail": 0.01}'.
+# Профили сохраняются в PROFILING_ROOT и доступны в админке
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True') == 'True'
+PROFILING_SAMPLE_RATES = json.loads(os.getenv('PROFILING_SAMPLE_RATES', '{}'))
+PROFILING_INTERVAL_MS = float(os.getenv('PROFILING_INTERVAL_MS', '5'))
+PROFILING_ROOT = Path(os.getenv('PROFILING_ROOT', BASE_DIR / 'profiles'))
+
+# Метрики Prometheus (fitness.metrics, GET /metrics). При нескольких воркерах задайте
+# общий локальный каталог METRICS_DIR (очищается при деплое); METRICS_TOKEN - Bearer-токен,
+# без него вне DEBUG /metrics отвечает 403
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1.0'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Уменьшенные копии фото залов и тренеров (fitness.images): число потоков пула и
+# IMAGE_DERIVATIVES_ASYNC=False для обработки сразу после коммита (удобно при отладке)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+IMAGE_DERIVATIVES_ASYNC = os.getenv('IMAGE_DERIVATIVES_ASYNC', 'True') == 'True'
+
+# Колоночная выгрузка для аналитики (fitness.analytics, команда export_analytics, нужен pyarrow)
+ANALYTICS_EXPORT_ROOT = Path(os.getenv('ANALYTICS_EXPORT_ROOT', BASE_DIR / 'analytics'))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "fitness.requests": {
+            "handlers": ["console"],
+            "level": os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            "propagate": False,
+        },
+        "fitness.profiling": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -134,6 +218,22 @@ STATICFILES_DIRS = [BASE_DIR / "fitness" / "static"]
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Раздача файлов (fitness.files). В режиме FILES_PRODUCTION /static/ отдаётся из STATIC_ROOT
+# с хэшами содержимого в именах (collectstatic + compress_static при деплое).
+# FILES_OFFLOAD: '' (отдаёт Django), 'x-accel-redirect' (nginx) или 'x-sendfile' (Apache)
+FILES_PRODUCTION = os.getenv('FILES_PRODUCTION', str(not DEBUG)) == 'True'
+FILES_OFFLOAD = os.getenv('FILES_OFFLOAD', '')
+FILES_ACCEL_PREFIX = os.getenv('FILES_ACCEL_PREFIX', '/internal/')
+FILES_MAX_AGE = int(os.getenv('FILES_MAX_AGE', '3600'))
+# Загруженные файлы (/media/) через Django: в разработке или когда байты отдаёт веб-сервер
+# (FILES_OFFLOAD). Иначе /media/ должен обслуживать веб-сервер напрямую.
+FILES_SERVE_MEDIA = os.getenv('FILES_SERVE_MEDIA', str(DEBUG or bool(FILES_OFFLOAD))) == 'True'
+if FILES_PRODUCTION:
+    STORAGES = {
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage"},
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 